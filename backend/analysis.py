@@ -2,8 +2,11 @@
 import pandas as pd
 import numpy as np
 
+from kernels import TRADE_BUY, TRADE_SIGNAL_SELL
+from trade_ledger import trade_events, build_trade_ledger, trade_statistics, ledger_columns
 
-def analyze_performance(data, initial_capital_ref, config):
+
+def analyze_performance(data, initial_capital_ref, config, include_charts=True):
     final_portfolio_value = 0
     if not data.empty and 'Portfolio_Value' in data.columns:
         final_portfolio_value = data['Portfolio_Value'].iloc[-1]
@@ -44,92 +47,53 @@ def analyze_performance(data, initial_capital_ref, config):
         annualized_return = ((1 + total_return / 100) ** (365.0 / days) - 1) * 100
 
     max_drawdown = 0
-    if not data.empty and 'Portfolio_Value' in data.columns:
+    portfolio_values = data['Portfolio_Value'].to_numpy(dtype=float) if 'Portfolio_Value' in data.columns else None
+    if not data.empty and portfolio_values is not None:
         # Max drawdown for portfolio_value that starts at 0 and grows (is PnL)
-        # Drawdown is from the peak PnL achieved.
-        # (Current PnL - Peak PnL) / (Initial Investment for that peak OR Peak PnL itself if >0)
-        # Using simple (Current - Peak) / Peak (if Peak > 0)
-        peak_pnl = data['Portfolio_Value'].cummax()
-        drawdown_val = data['Portfolio_Value'] - peak_pnl  # This is absolute drawdown
-
-        # Relative drawdown: drawdown_val / peak_pnl (if peak_pnl > 0)
-        # Or drawdown_val / (total_invested_at_peak_time)
-        # For simplicity with PnL curve:
-        relative_drawdown = pd.Series(index=data.index, dtype=float).fillna(0.0)
-        # Calculate drawdown only where peak_pnl is positive, otherwise drawdown is 0 or undefined.
-        # If using total_invested_by_strategy as base:
-        # Base for drawdown % = total_invested_by_strategy if > 0 else initial_capital_ref if >0 else 1 (to avoid /0)
+        # Drawdown is from the peak PnL achieved, relative to positive peaks: (Current - Peak) / Peak
         drawdown_base = total_invested_by_strategy if total_invested_by_strategy > 0 else (
             initial_capital_ref if initial_capital_ref > 0 else 0)
 
         if drawdown_base > 0:
-            # Drawdown relative to the capital that generated the peak.
-            # This is complex. Let's use a simpler (value - peak)/peak for positive peaks.
-            positive_peak_indices = peak_pnl > 0
-            relative_drawdown[positive_peak_indices] = (data['Portfolio_Value'][positive_peak_indices] - peak_pnl[
-                positive_peak_indices]) / peak_pnl[positive_peak_indices]
-            max_drawdown = relative_drawdown.min() * 100
-        elif np.any(data['Portfolio_Value'] < 0):  # If PnL goes negative
-            max_drawdown = (data['Portfolio_Value'].min() / config.get('first_investment_amount',
-                                                                       1)) * 100 if config.get(
-                'first_investment_amount', 0) > 0 else data['Portfolio_Value'].min()
+            max_drawdown = max_relative_drawdown(portfolio_values) * 100
+        elif (portfolio_values < 0).any():  # If PnL goes negative
+            lowest = portfolio_values.min()
+            first_investment = config.get('first_investment_amount', 0)
+            max_drawdown = lowest / first_investment * 100 if first_investment > 0 else lowest
         else:
             max_drawdown = 0.0
 
-    monthly_returns_series = pd.Series(dtype=float)
-    yearly_returns_series = pd.Series(dtype=float)
-    if not data.empty and 'Portfolio_Value' in data.columns:
-        # To calculate meaningful percentage returns, we need a basis.
-        # If portfolio is PnL from 0, use daily PnL changes relative to cumulative investment.
-        # Daily return = daily_change_in_PnL / cumulative_investment_at_start_of_day
-        # This is more involved. For now, use pct_change on PnL if PnL is mostly positive.
-        pv_for_returns = data['Portfolio_Value']
-        # Shift to make values positive for pct_change if it starts near 0. Or use diff / previous_cumulative_investment.
-        # If many values are zero or negative, pct_change is problematic.
-        # Let's use diff() for absolute changes, then normalize by cumulative investment.
-        daily_pnl_change = data['Portfolio_Value'].diff().fillna(0)
-        cumulative_investment_shifted = data['Cumulative_Investment'].shift(1).fillna(0)  # Investment at start of day
-
-        # Avoid division by zero if no investment yet for that day
-        valid_investment_base = cumulative_investment_shifted > 0
-        daily_returns_pct = pd.Series(index=data.index, dtype=float).fillna(0.0)
-        daily_returns_pct[valid_investment_base] = daily_pnl_change[valid_investment_base] / \
-                                                   cumulative_investment_shifted[valid_investment_base]
-
-        if not daily_returns_pct.empty:
-            # Resample these daily % returns to get aggregate monthly/yearly returns
-            # This requires compounding, not just resampling pct_change.
-            # Simplified: (1+r1)(1+r2)... For monthly, resample daily returns, then compound.
-            # Or, stick to simpler Portfolio_Value.pct_change if it's mostly positive after some trades.
-            pv_positive_for_returns = data['Portfolio_Value'][
-                data['Portfolio_Value'] > 0]  # Use only positive part for pct_change
-            if not pv_positive_for_returns.empty:
-                monthly_returns_series = pv_positive_for_returns.resample('ME').last().pct_change().fillna(0)
-                yearly_returns_series = pv_positive_for_returns.resample('YE').last().pct_change().fillna(0)
-
     metrics = {
         'totalReturn': round(total_return, 2),
         'annualizedReturn': round(annualized_return, 2),
         'maxDrawdown': round(max_drawdown, 2),
     }
+    if not include_charts:
+        return {'metrics': metrics}
+
+    monthly_returns = ([], [])
+    yearly_returns = ([], [])
+    if not data.empty and portfolio_values is not None:
+        # Period returns from the last positive PnL of each month/year (non-positive PnL has no meaningful pct change)
+        monthly_returns = period_returns(data.index, portfolio_values, 'M')
+        yearly_returns = period_returns(data.index, portfolio_values, 'Y')
 
     # Chart data prep remains largely the same, just ensure keys match frontend
-    asset_price_dates = data.index.strftime('%Y-%m-%d').tolist() if not data.empty else []
+    # 四条曲线共用同一日期轴，只格式化一次
+    curve_dates = data.index.strftime('%Y-%m-%d').tolist() if not data.empty else []
+    asset_price_dates = curve_dates
     asset_price_values = data['Close'].round(2).tolist() if not data.empty else []
-    portfolio_curve_dates = data.index.strftime('%Y-%m-%d').tolist() if not data.empty else []
+    portfolio_curve_dates = curve_dates
     portfolio_curve_values = data['Portfolio_Value'].round(
         2).tolist() if not data.empty and 'Portfolio_Value' in data.columns else []
-    asset_benchmark_dates = data.index.strftime('%Y-%m-%d').tolist() if not data.empty else []
+    asset_benchmark_dates = curve_dates
     asset_benchmark_values = data['Asset_Benchmark_Value'].round(
         2).tolist() if not data.empty and 'Asset_Benchmark_Value' in data.columns else []
-    market_benchmark_dates = data.index.strftime('%Y-%m-%d').tolist() if not data.empty else []
+    market_benchmark_dates = curve_dates
     market_benchmark_values = data['Market_Benchmark_Value'].round(
         2).tolist() if not data.empty and 'Market_Benchmark_Value' in data.columns else []
-    monthly_ret_dates = monthly_returns_series.index.strftime(
-        '%Y-%m').tolist() if not monthly_returns_series.empty else []
-    monthly_ret_values = (monthly_returns_series * 100).round(2).tolist() if not monthly_returns_series.empty else []
-    yearly_ret_dates = yearly_returns_series.index.strftime('%Y').tolist() if not yearly_returns_series.empty else []
-    yearly_ret_values = (yearly_returns_series * 100).round(2).tolist() if not yearly_returns_series.empty else []
+    monthly_ret_dates, monthly_ret_values = monthly_returns
+    yearly_ret_dates, yearly_ret_values = yearly_returns
 
     chart_data = {
         'asset_price_curve': {'dates': asset_price_dates, 'values': asset_price_values},
@@ -142,43 +106,146 @@ def analyze_performance(data, initial_capital_ref, config):
         'benchmarkAssetName': config.get('benchmarkAssetName', config.get('benchmarkTicker'))
     }
 
-    # Trade markers logic remains the same (using point.portfolio_value and point.asset_price)
     buy_points = []
     sell_points = []
-    if not data.empty and 'Signal' in data.columns:
+    trades = None
+    if not data.empty and 'Trade_Action' in data.columns:
+        buy_points, sell_points, trades = executed_trades(data, curve_dates, portfolio_values)
+    elif not data.empty and 'Signal' in data.columns:
         strategy_name_from_config = config.get('strategy', {}).get('name')
         is_fixed_frequency_strategy = 'InvestmentAmount' in data.columns and strategy_name_from_config == 'fixed_frequency'
-
-        if data['Signal'].iloc[0] == 1:
-            buy_points.append({
-                'date': data.index[0].strftime('%Y-%m-%d'),
-                'portfolio_value': round(data['Portfolio_Value'].iloc[0], 2),
-                'asset_price': round(data['Close'].iloc[0], 2)
-            })
-
-        for i in range(1, len(data)):
-            current_signal = data['Signal'].iloc[i]
-            prev_data_signal = data['Signal'].iloc[i - 1]
-            current_date_str = data.index[i].strftime('%Y-%m-%d')
-            current_portfolio_value = round(data['Portfolio_Value'].iloc[i], 2)
-            current_asset_price = round(data['Close'].iloc[i], 2)
-
-            if is_fixed_frequency_strategy:
-                if current_signal == 1 and data['InvestmentAmount'].iloc[i] > 0:
-                    buy_points.append({'date': current_date_str, 'portfolio_value': current_portfolio_value,
-                                       'asset_price': current_asset_price})
-            else:
-                if current_signal == 1 and prev_data_signal <= 0:
-                    buy_points.append({'date': current_date_str, 'portfolio_value': current_portfolio_value,
-                                       'asset_price': current_asset_price})
-                elif current_signal == -1 and prev_data_signal >= 0:
-                    sell_points.append({'date': current_date_str, 'portfolio_value': current_portfolio_value,
-                                        'asset_price': current_asset_price})
-
-        buy_points = [dict(t) for t in {tuple(sorted(d.items())) for d in buy_points}]
-        sell_points = [dict(t) for t in {tuple(sorted(d.items())) for d in sell_points}]
-        buy_points.sort(key=lambda x: x['date'])
-        sell_points.sort(key=lambda x: x['date'])
+        investment = data['InvestmentAmount'].to_numpy() if is_fixed_frequency_strategy else None
+        buy_mask, sell_mask = trade_marker_masks(data['Signal'].to_numpy(), investment)
+        buy_points = _marker_points(buy_mask, curve_dates, portfolio_values, data['Close'].to_numpy(dtype=float))
+        sell_points = _marker_points(sell_mask, curve_dates, portfolio_values, data['Close'].to_numpy(dtype=float))
 
     chart_data['trade_markers'] = {'buy_points': buy_points, 'sell_points': sell_points}
-    return {'metrics': metrics, 'chart_data': chart_data}
\ No newline at end of file
+    results = {'metrics': metrics, 'chart_data': chart_data}
+    if trades is not None:
+        results['trades'] = ledger_columns(trades)
+        results['trade_stats'] = trade_statistics(
+            trades, initial_capital_ref if initial_capital_ref > 0 else total_invested_by_strategy)
+    return results
+
+
+def executed_trades(data, dates, portfolio_values):
+    """
+    由模拟内核输出的实际成交 (Trade_Action/Commission 列) 生成买卖点和成交记录，返回 (买点, 卖点, 成交记录)。
+    data 不能为空，dates 为格式化后的日期轴。
+    """
+    action = data['Trade_Action'].to_numpy()
+    close = data['Close'].to_numpy(dtype=float)
+    buy_points = _marker_points(action == TRADE_BUY, dates, portfolio_values, close)
+    sell_points = _marker_points(action >= TRADE_SIGNAL_SELL, dates, portfolio_values, close)
+    events = trade_events(data.index, action, close, data['cash_flow'].to_numpy(), data['shares_held'].to_numpy(),
+                          data['Commission'].to_numpy())
+    return buy_points, sell_points, build_trade_ledger(events, len(data) - 1, close[-1])
+
+
+def max_relative_drawdown(portfolio_values):
+    """(当前 - 历史峰值) / 历史峰值 的最小值，只在峰值为正时计算，其余为 0。"""
+    peak = np.maximum.accumulate(portfolio_values)
+    positive = peak > 0
+    if not positive.any():
+        return 0.0
+    drawdown = (portfolio_values[positive] - peak[positive]) / peak[positive]
+    return min(float(drawdown.min()), 0.0)
+
+
+def period_returns(index, portfolio_values, frequency):
+    """
+    按月 ('M') 或年 ('Y') 计算收益率，返回 (周期标签, 收益率百分比)。
+    取每个周期最后一个正的盈亏值计算环比；没有正值的周期沿用上一周期的值 (收益率为 0)。
+    """
+    positive = portfolio_values > 0
+    if not positive.any():
+        return [], []
+    unit = 'datetime64[M]' if frequency == 'M' else 'datetime64[Y]'
+    periods = index.to_numpy()[positive].astype(unit).astype(np.int64)
+    values = portfolio_values[positive]
+
+    # 每个周期的最后一个值，再铺到从首个到最后一个周期的连续周期上
+    last_in_period = np.flatnonzero(np.append(periods[1:] != periods[:-1], True))
+    filled = np.empty(periods[-1] - periods[0] + 1)
+    filled.fill(np.nan)
+    filled[periods[last_in_period] - periods[0]] = values[last_in_period]
+    filled = filled[np.maximum.accumulate(np.where(np.isnan(filled), 0, np.arange(len(filled))))]
+
+    returns = np.zeros(len(filled))
+    returns[1:] = filled[1:] / filled[:-1] - 1
+    labels = np.arange(periods[0], periods[-1] + 1).astype(unit).astype(str).tolist()
+    return labels, np.round(returns * 100, 2).tolist()
+
+
+def trade_marker_masks(signal, investment=None):
+    """
+    返回 (买点, 卖点) 布尔数组。
+    定投 (传入 investment): 信号为 1 且实际投入金额大于 0 的交易日为买点；
+    其他策略: 信号由非多头变为 1 为买点，由非空头变为 -1 为卖点。首个交易日信号为 1 时总是买点。
+    """
+    signal = np.asarray(signal)
+    buy = np.zeros(len(signal), dtype=bool)
+    sell = np.zeros(len(signal), dtype=bool)
+    if len(signal) == 0:
+        return buy, sell
+    current, previous = signal[1:], signal[:-1]
+    if investment is not None:
+        buy[1:] = (current == 1) & (np.asarray(investment)[1:] > 0)
+    else:
+        buy[1:] = (current == 1) & (previous <= 0)
+        sell[1:] = (current == -1) & (previous >= 0)
+    buy[0] = signal[0] == 1
+    return buy, sell
+
+
+def _marker_points(mask, dates, portfolio_values, close):
+    index = np.flatnonzero(mask)
+    values = np.round(portfolio_values[index], 2).tolist()
+    prices = np.round(close[index], 2).tolist()
+    return [{'date': dates[i], 'portfolio_value': value, 'asset_price': price}
+            for i, value, price in zip(index.tolist(), values, prices)]
+
+
+def performance_metrics_matrix(portfolio_values, cumulative_investment, first_investment, days, initial_capital_ref):
+    """
+    按列计算 totalReturn/annualizedReturn/maxDrawdown，口径与 analyze_performance 相同。
+    portfolio_values/cumulative_investment: (交易日, 列)，first_investment: (列,)，days: 标量或每列一个值。
+    """
+    k = portfolio_values.shape[1]
+    if portfolio_values.shape[0] == 0:
+        zeros = np.zeros(k)
+        return {'totalReturn': zeros, 'annualizedReturn': zeros, 'maxDrawdown': zeros}
+
+    final_portfolio_value = portfolio_values[-1]
+    total_invested = cumulative_investment[-1]
+    if initial_capital_ref > 0:
+        total_return = final_portfolio_value / initial_capital_ref * 100
+        has_base = np.ones(k, dtype=bool)
+    else:
+        has_base = total_invested > 0
+        total_return = np.zeros(k)
+        total_return[has_base] = final_portfolio_value[has_base] / total_invested[has_base] * 100
+
+    annualized_return = np.zeros(k)
+    days = np.broadcast_to(np.asarray(days, dtype=float), (k,))
+    annualize = has_base & (days > 0)
+    with np.errstate(invalid='ignore'):
+        annualized_return[annualize] = ((1 + total_return[annualize] / 100) ** (365.0 / days[annualize]) - 1) * 100
+
+    peak = np.maximum.accumulate(portfolio_values, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative_drawdown = np.where(peak > 0, (portfolio_values - peak) / peak, 0.0)
+    drawdown_base = (total_invested > 0) | (initial_capital_ref > 0)
+    lowest = portfolio_values.min(axis=0)
+    max_drawdown = np.where(
+        drawdown_base, relative_drawdown.min(axis=0) * 100,
+        np.where(lowest < 0,
+                 np.where(first_investment > 0, lowest / np.where(first_investment > 0, first_investment, 1) * 100,
+                          lowest),
+                 0.0))
+
+    return {
+        'totalReturn': np.round(total_return, 2),
+        'annualizedReturn': np.round(annualized_return, 2),
+        'maxDrawdown': np.round(max_drawdown, 2),
+    }
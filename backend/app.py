@@ -5,16 +5,268 @@ Flask主应用文件，提供API接口。
 这是前端与后端通信的桥梁。
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, g
 from flask_cors import CORS
 from backtest_engine import run_backtest
+from optimizer import run_optimization
+from portfolio import run_portfolio_backtest
+from incremental import run_incremental_backtest
+from intraday import run_intraday_backtest
+from walkforward import run_walk_forward
+from robustness import run_robustness
+from compare import run_comparison
+from strategies import describe_strategies
+from kernels import JIT_ENABLED
+from execution import describe_markets
+from jobs import JobManager, JobQueueFullError
+from result_cache import get_result_cache
+from utils import get_price_cache, get_price_data_many, PRICE_FETCH_WORKERS
+from response_format import validate_format, format_results, compress_payload
+from downsampling import downsample_results, parse_max_points
+from trade_ledger import with_trade_page, page_trades, export_trades, DEFAULT_PAGE_SIZE
+from warm_start import warm_start, save_snapshot, DEFAULT_SNAPSHOT_PATH
+from instrumentation import (StageProfiler, chain_progress, render_metrics, start_request_profile,
+                             dump_request_profile, PROMETHEUS_CONTENT_TYPE)
 from datetime import datetime, timedelta
+import os
+import time
 
 # 初始化Flask应用
 app = Flask(__name__)
 # 允许所有来源的跨域请求，这在开发阶段非常方便
 CORS(app)
 
+# 参数扫描的进程数上限和默认时间预算(秒)
+OPTIMIZE_MAX_WORKERS = int(os.environ.get('OPTIMIZE_MAX_WORKERS', os.cpu_count() or 1))
+OPTIMIZE_DEFAULT_TIME_BUDGET = float(os.environ.get('OPTIMIZE_TIME_BUDGET', 60))
+# 异步任务: 并发执行数、排队上限、结果保留时间(秒)
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_MAX_PENDING = int(os.environ.get('JOB_MAX_PENDING', 100))
+JOB_RESULT_TTL = float(os.environ.get('JOB_RESULT_TTL', 600))
+# 批量预取一次最多的代码数
+PREFETCH_MAX_TICKERS = int(os.environ.get('PREFETCH_MAX_TICKERS', 1000))
+
+
+def _apply_default_dates(config):
+    # 如果前端没有提供日期，可以设置一个默认值（例如，最近一年）
+    if 'startDate' not in config or 'endDate' not in config:
+        end_date = datetime.now()
+        start_date = end_date - timedelta(days=365)
+        config['startDate'] = start_date.strftime('%Y-%m-%d')
+        config['endDate'] = end_date.strftime('%Y-%m-%d')
+
+
+@app.after_request
+def _compress(response):
+    # 客户端声明支持 gzip/deflate 时压缩较大的响应
+    if (response.direct_passthrough or not 200 <= response.status_code < 300
+            or 'Content-Encoding' in response.headers):
+        return response
+    data, encoding = compress_payload(response.get_data(), request.headers.get('Accept-Encoding', ''))
+    if encoding:
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+        response.headers['Content-Length'] = str(len(data))
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+@app.before_request
+def _start_request_profile():
+    # 配置了 PROFILE_DIR 时，带 X-Profile 请求头的请求会被 cProfile 分析并写入文件
+    if request.headers.get('X-Profile'):
+        g.request_profile = start_request_profile()
+
+
+@app.after_request
+def _dump_request_profile(response):
+    profile = g.pop('request_profile', None)
+    if profile is not None:
+        response.headers['X-Profile-File'] = dump_request_profile(profile, request.endpoint or 'unknown')
+    return response
+
+
+@app.teardown_request
+def _discard_request_profile(exc):
+    profile = g.pop('request_profile', None)
+    if profile is not None:
+        profile.disable()
+
+
+def _response_format(config=None):
+    """响应格式: 查询参数 format 或请求体中的 responseFormat，默认 json。"""
+    body_format = (config or {}).pop('responseFormat', None)
+    response_format = request.args.get('format') or body_format or 'json'
+    validate_format(response_format)
+    return response_format
+
+
+def _max_points(config=None):
+    """曲线降采样的目标点数: 查询参数 maxPoints 或请求体中的 maxPoints，缺省时返回完整分辨率。"""
+    body_max_points = (config or {}).pop('maxPoints', None)
+    return parse_max_points(request.args.get('maxPoints') or body_max_points)
+
+
+def _debug_requested(config=None):
+    """查询参数 debug=1 或请求体中的 debug: true 时在响应中附加 debug.timings。"""
+    body_debug = (config or {}).pop('debug', None)
+    return request.args.get('debug', '').lower() in ('1', 'true', 'timings') or body_debug is True
+
+
+def _respond(results, response_format, max_points=None, profiler=None, debug=False):
+    if profiler is not None:
+        profiler.start('serializing')
+    results = with_trade_page(downsample_results(results, max_points))
+    if debug and profiler is not None and isinstance(results, dict):
+        # 序列化阶段本身只出现在 Server-Timing 响应头和 /metrics 中
+        results = {**results, 'debug': {'timings': profiler.timings()}}
+    body, mimetype = format_results(results, response_format)
+    response = Response(body, mimetype=mimetype) if isinstance(body, bytes) else jsonify(body)
+    if profiler is not None:
+        profiler.finish()
+        response.headers['Server-Timing'] = profiler.server_timing()
+    return response
+
+
+def _run_backtest_request(config, progress=None):
+    # 对关键参数进行基础校验
+    if 'ticker' not in config or 'strategy' not in config:
+        raise ValueError('缺少 ticker 或 strategy 配置。')
+    _apply_default_dates(config)
+    return run_backtest(config, progress=progress)
+
+
+def _run_optimize_request(config, progress=None):
+    if 'ticker' not in config or 'strategy' not in config:
+        raise ValueError('缺少 ticker 或 strategy 配置。')
+    param_grid = config.pop('paramGrid', None)
+    if not isinstance(param_grid, dict):
+        raise ValueError('缺少 paramGrid 参数范围配置。')
+
+    _apply_default_dates(config)
+    max_workers = min(int(config.pop('maxWorkers', OPTIMIZE_MAX_WORKERS)), OPTIMIZE_MAX_WORKERS)
+    time_budget = float(config.pop('timeBudget', OPTIMIZE_DEFAULT_TIME_BUDGET))
+    sort_by = config.pop('sortBy', 'totalReturn')
+    top = config.pop('top', None)
+    return run_optimization(config, param_grid, max_workers=max(max_workers, 1), time_budget=time_budget,
+                            sort_by=sort_by, top=int(top) if top else None, progress=progress)
+
+
+def _run_walk_forward_request(config, progress=None):
+    if 'ticker' not in config or 'strategy' not in config:
+        raise ValueError('缺少 ticker 或 strategy 配置。')
+    param_grid = config.pop('paramGrid', None)
+    if not isinstance(param_grid, dict):
+        raise ValueError('缺少 paramGrid 参数范围配置。')
+    if 'trainBars' not in config or 'testBars' not in config:
+        raise ValueError('缺少 trainBars 或 testBars 窗口长度配置。')
+
+    _apply_default_dates(config)
+    train_bars = int(config.pop('trainBars'))
+    test_bars = int(config.pop('testBars'))
+    step_bars = config.pop('stepBars', None)
+    anchored = bool(config.pop('anchored', False))
+    max_workers = min(int(config.pop('maxWorkers', OPTIMIZE_MAX_WORKERS)), OPTIMIZE_MAX_WORKERS)
+    time_budget = float(config.pop('timeBudget', OPTIMIZE_DEFAULT_TIME_BUDGET))
+    sort_by = config.pop('sortBy', 'totalReturn')
+    return run_walk_forward(config, param_grid, train_bars, test_bars,
+                            step_bars=int(step_bars) if step_bars else None, anchored=anchored,
+                            sort_by=sort_by, max_workers=max(max_workers, 1), time_budget=time_budget,
+                            progress=progress)
+
+
+def _run_robustness_request(config, progress=None):
+    if 'ticker' not in config or 'strategy' not in config:
+        raise ValueError('缺少 ticker 或 strategy 配置。')
+    _apply_default_dates(config)
+    horizon_bars = config.pop('horizonBars', None)
+    max_workers = min(int(config.pop('maxWorkers', OPTIMIZE_MAX_WORKERS)), OPTIMIZE_MAX_WORKERS)
+    time_budget = float(config.pop('timeBudget', OPTIMIZE_DEFAULT_TIME_BUDGET))
+    return run_robustness(config, paths=int(config.pop('paths', 1000)), method=config.pop('method', 'bootstrap'),
+                          horizon_bars=int(horizon_bars) if horizon_bars else None,
+                          block_size=int(config.pop('blockSize', 20)),
+                          commission_jitter=float(config.pop('commissionJitter', 0)),
+                          slippage=float(config.pop('slippage', 0)), seed=int(config.pop('seed', 0)),
+                          max_workers=max(max_workers, 1), time_budget=time_budget, progress=progress)
+
+
+def _run_compare_request(config, progress=None):
+    if 'ticker' not in config:
+        raise ValueError('缺少 ticker 配置。')
+    strategies = config.pop('strategies', None)
+    _apply_default_dates(config)
+    max_workers = config.pop('maxWorkers', None)
+    return run_comparison(config, strategies, max_workers=max(int(max_workers), 1) if max_workers else None,
+                          progress=progress)
+
+
+def _run_portfolio_request(config, progress=None):
+    if not isinstance(config.get('assets'), list):
+        raise ValueError('缺少 assets 资产列表配置。')
+    _apply_default_dates(config)
+    return run_portfolio_backtest(config, progress=progress)
+
+
+def _run_incremental_request(config, progress=None):
+    if 'ticker' not in config or 'strategy' not in config:
+        raise ValueError('缺少 ticker 或 strategy 配置。')
+    checkpoint = config.pop('checkpoint', None)
+    _apply_default_dates(config)
+    return run_incremental_backtest(config, checkpoint, progress=progress)
+
+
+def _run_intraday_request(config, progress=None):
+    if 'ticker' not in config or 'strategy' not in config:
+        raise ValueError('缺少 ticker 或 strategy 配置。')
+    _apply_default_dates(config)
+    return run_intraday_backtest(config, progress=progress)
+
+
+def _run_prefetch_request(config, progress=None):
+    tickers = config.get('tickers')
+    if not isinstance(tickers, list) or not tickers:
+        raise ValueError('缺少 tickers 代码列表。')
+    if len(tickers) > PREFETCH_MAX_TICKERS:
+        raise ValueError(f"一次最多预取 {PREFETCH_MAX_TICKERS} 个代码。")
+    _apply_default_dates(config)
+    max_workers = min(int(config.get('maxWorkers', PRICE_FETCH_WORKERS)), PRICE_FETCH_WORKERS)
+    tickers = [str(ticker).strip().upper() for ticker in tickers]
+    started = time.perf_counter()
+    loaded, errors = get_price_data_many(tickers, config['startDate'], config['endDate'],
+                                         max_workers=max(max_workers, 1), progress=progress)
+    return {
+        'loaded': {ticker: {'name': name, 'bars': len(df),
+                            'firstDate': df.index[0].strftime('%Y-%m-%d') if len(df) else None,
+                            'lastDate': df.index[-1].strftime('%Y-%m-%d') if len(df) else None}
+                   for ticker, (df, name) in loaded.items()},
+        'errors': errors,
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def _profiled_job(job_type, runner):
+    # 异步任务同样按阶段计时，汇总到 /metrics
+    def run(config, progress=None):
+        with StageProfiler(f"job_{job_type}") as profiler:
+            return runner(config, progress=chain_progress(progress, profiler))
+    return run
+
+
+job_manager = JobManager({
+    'backtest': _profiled_job('backtest', _run_backtest_request),
+    'optimize': _profiled_job('optimize', _run_optimize_request),
+    'walkforward': _profiled_job('walkforward', _run_walk_forward_request),
+    'robustness': _profiled_job('robustness', _run_robustness_request),
+    'compare': _profiled_job('compare', _run_compare_request),
+    'portfolio': _profiled_job('portfolio', _run_portfolio_request),
+    'incremental': _profiled_job('incremental', _run_incremental_request),
+    'intraday': _profiled_job('intraday', _run_intraday_request),
+    'prefetch': _profiled_job('prefetch', _run_prefetch_request),
+}, max_workers=JOB_WORKERS, result_ttl=JOB_RESULT_TTL, max_pending=JOB_MAX_PENDING)
+
+# 设置了 WARM_START_SNAPSHOT 时，启动时载入价格和结果缓存的预热快照
+warm_start_summary = warm_start()
+
 
 @app.route('/api/backtest', methods=['POST'])
 def backtest_endpoint():
@@ -28,22 +280,15 @@ def backtest_endpoint():
         if not config:
             return jsonify({'error': '请求体为空或非JSON格式。'}), 400
 
-        # 对关键参数进行基础校验
-        if 'ticker' not in config or 'strategy' not in config:
-            return jsonify({'error': '缺少 ticker 或 strategy 配置。'}), 400
-
-        # 如果前端没有提供日期，可以设置一个默认值（例如，最近一年）
-        if 'startDate' not in config or 'endDate' not in config:
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=365)
-            config['startDate'] = start_date.strftime('%Y-%m-%d')
-            config['endDate'] = end_date.strftime('%Y-%m-%d')
+        # 校验参数并调用核心回测引擎
+        response_format = _response_format(config)
+        max_points = _max_points(config)
+        debug = _debug_requested(config)
+        with StageProfiler('backtest', track_memory=debug) as profiler:
+            results = _run_backtest_request(config, progress=profiler)
 
-        # 调用核心回测引擎
-        results = run_backtest(config)
-
-        # 将结果以JSON格式返回给前端
-        return jsonify(results)
+            # 将结果以JSON格式(或请求的紧凑格式)返回给前端
+            return _respond(results, response_format, max_points, profiler, debug)
 
     except ValueError as e:
         # 捕获已知的、可以友好提示给用户的错误（如无效代码，配置错误）
@@ -57,6 +302,363 @@ def backtest_endpoint():
         return jsonify({'error': '服务器内部发生错误，请稍后再试或联系管理员。'}), 500
 
 
+@app.route('/api/optimize', methods=['POST'])
+def optimize_endpoint():
+    """
+    参数扫描 API 端点。
+    请求体为普通回测配置，外加:
+      paramGrid: {参数名: 取值列表 或 {start, stop, step}}，takeProfit/stopLoss 也可作为参数
+      maxWorkers: 进程数 (不超过服务器上限)，timeBudget: 时间预算(秒)
+      sortBy: 排序指标，top: 只返回前 N 个结果
+    """
+    try:
+        config = request.get_json()
+
+        if not config:
+            return jsonify({'error': '请求体为空或非JSON格式。'}), 400
+
+        debug = _debug_requested(config)
+        with StageProfiler('optimize', track_memory=debug) as profiler:
+            results = _run_optimize_request(config, progress=profiler)
+            return _respond(results, 'json', profiler=profiler, debug=debug)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"参数扫描发生未预料的错误: {e}", exc_info=True)
+        return jsonify({'error': '服务器内部发生错误，请稍后再试或联系管理员。'}), 500
+
+
+@app.route('/api/walkforward', methods=['POST'])
+def walk_forward_endpoint():
+    """
+    走步分析 API 端点: 在每个样本内窗口上扫描参数，用最优参数回测紧随其后的样本外窗口。
+    请求体为普通回测配置，外加:
+      paramGrid: 与 /api/optimize 相同，trainBars/testBars: 样本内/样本外窗口的 K 线数
+      stepBars: 窗口每次前移的 K 线数 (默认等于 testBars)，anchored: 为 true 时样本内窗口始终从第一根 K 线开始
+      sortBy: 样本内选优指标，maxWorkers: 进程数，timeBudget: 时间预算(秒)
+    """
+    try:
+        config = request.get_json()
+
+        if not config:
+            return jsonify({'error': '请求体为空或非JSON格式。'}), 400
+
+        debug = _debug_requested(config)
+        with StageProfiler('walkforward', track_memory=debug) as profiler:
+            results = _run_walk_forward_request(config, progress=profiler)
+            return _respond(results, 'json', profiler=profiler, debug=debug)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"走步分析发生未预料的错误: {e}", exc_info=True)
+        return jsonify({'error': '服务器内部发生错误，请稍后再试或联系管理员。'}), 500
+
+
+@app.route('/api/robustness', methods=['POST'])
+def robustness_endpoint():
+    """
+    蒙特卡洛稳健性分析 API 端点: 在重采样的价格路径上运行策略，返回指标分布和权益曲线分位数带。
+    请求体为普通回测配置，外加:
+      paths: 路径数，method: 'bootstrap' (分块自助重采样收益率) 或 'random_start' (随机起点截取原序列)
+      horizonBars: 每条路径的 K 线数，blockSize: 自助重采样的块长度
+      commissionJitter: 佣金随机扰动幅度 (0-1)，slippage: 滑点成本比例的上限，seed: 随机种子
+      maxWorkers: 进程数，timeBudget: 时间预算(秒)，超时后按已完成的路径统计
+    """
+    try:
+        config = request.get_json()
+
+        if not config:
+            return jsonify({'error': '请求体为空或非JSON格式。'}), 400
+
+        debug = _debug_requested(config)
+        with StageProfiler('robustness', track_memory=debug) as profiler:
+            results = _run_robustness_request(config, progress=profiler)
+            return _respond(results, 'json', profiler=profiler, debug=debug)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"稳健性分析发生未预料的错误: {e}", exc_info=True)
+        return jsonify({'error': '服务器内部发生错误，请稍后再试或联系管理员。'}), 500
+
+
+@app.route('/api/compare', methods=['POST'])
+def compare_endpoint():
+    """
+    多策略对比 API 端点: 同一资产、同一时间段上一次运行多个策略，价格和基准只加载、计算一次。
+    请求体为普通回测配置 (不含 strategy)，外加:
+      strategies: [{'name', 'params', 'label', 'takeProfit', 'stopLoss', 'commission'}, ...]，后三项可选，覆盖公共配置
+      maxWorkers: 并行线程数
+    所有曲线共用响应中的 dates 日期轴。
+    """
+    try:
+        config = request.get_json()
+
+        if not config:
+            return jsonify({'error': '请求体为空或非JSON格式。'}), 400
+
+        debug = _debug_requested(config)
+        with StageProfiler('compare', track_memory=debug) as profiler:
+            results = _run_compare_request(config, progress=profiler)
+            return _respond(results, 'json', profiler=profiler, debug=debug)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"策略对比发生未预料的错误: {e}", exc_info=True)
+        return jsonify({'error': '服务器内部发生错误，请稍后再试或联系管理员。'}), 500
+
+
+@app.route('/api/portfolio', methods=['POST'])
+def portfolio_endpoint():
+    """
+    多资产组合回测 API 端点。
+    请求体: assets (代码与目标权重列表)、rebalance (再平衡频率)、initialCapital、commission、benchmarkTicker、
+    maxPoints (可选，曲线降采样点数)。
+    """
+    try:
+        config = request.get_json()
+
+        if not config:
+            return jsonify({'error': '请求体为空或非JSON格式。'}), 400
+
+        max_points = _max_points(config)
+        debug = _debug_requested(config)
+        with StageProfiler('portfolio', track_memory=debug) as profiler:
+            results = _run_portfolio_request(config, progress=profiler)
+            return _respond(results, 'json', max_points, profiler, debug)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"组合回测发生未预料的错误: {e}", exc_info=True)
+        return jsonify({'error': '服务器内部发生错误，请稍后再试或联系管理员。'}), 500
+
+
+@app.route('/api/backtest/incremental', methods=['POST'])
+def incremental_backtest_endpoint():
+    """
+    增量回测 API 端点，用于定时更新已保存的策略。
+    请求体为普通回测配置，外加 checkpoint (可选，上次响应中的检查点，由调用方保存)；
+    只计算检查点之后的新 K 线，返回指标和新的检查点。支持的策略见 incremental.INCREMENTAL_STRATEGIES。
+    """
+    try:
+        config = request.get_json()
+
+        if not config:
+            return jsonify({'error': '请求体为空或非JSON格式。'}), 400
+
+        debug = _debug_requested(config)
+        with StageProfiler('incremental', track_memory=debug) as profiler:
+            results = _run_incremental_request(config, progress=profiler)
+            return _respond(results, 'json', profiler=profiler, debug=debug)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"增量回测发生未预料的错误: {e}", exc_info=True)
+        return jsonify({'error': '服务器内部发生错误，请稍后再试或联系管理员。'}), 500
+
+
+@app.route('/api/backtest/intraday', methods=['POST'])
+def intraday_backtest_endpoint():
+    """
+    分钟线回测 API 端点。请求体为普通回测配置，startDate/endDate 可以带时间 ('2024-01-02 09:30')；
+    分钟线需要先用 minute_store.py 导入。支持的策略见 incremental.INCREMENTAL_STRATEGIES。
+    """
+    try:
+        config = request.get_json()
+
+        if not config:
+            return jsonify({'error': '请求体为空或非JSON格式。'}), 400
+
+        debug = _debug_requested(config)
+        with StageProfiler('intraday', track_memory=debug) as profiler:
+            results = _run_intraday_request(config, progress=profiler)
+            return _respond(results, 'json', profiler=profiler, debug=debug)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"分钟线回测发生未预料的错误: {e}", exc_info=True)
+        return jsonify({'error': '服务器内部发生错误，请稍后再试或联系管理员。'}), 500
+
+
+@app.route('/api/prices/prefetch', methods=['POST'])
+def prefetch_endpoint():
+    """
+    批量预取价格数据到本地缓存 (如选股前预取全部成分股)，之后的回测直接命中缓存。
+    请求体: tickers (代码列表)、startDate、endDate、maxWorkers (可选，并发数)。
+    个别代码获取失败不影响其他代码，失败原因在 errors 中返回；代码较多时建议以 'prefetch' 异步任务提交。
+    """
+    try:
+        config = request.get_json()
+
+        if not config:
+            return jsonify({'error': '请求体为空或非JSON格式。'}), 400
+
+        debug = _debug_requested(config)
+        with StageProfiler('prefetch', track_memory=debug, first_stage='loading_data') as profiler:
+            results = _run_prefetch_request(config)
+            return _respond(results, 'json', profiler=profiler, debug=debug)
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"预取价格数据发生未预料的错误: {e}", exc_info=True)
+        return jsonify({'error': '服务器内部发生错误，请稍后再试或联系管理员。'}), 500
+
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job_endpoint():
+    """
+    提交异步任务，立即返回任务 ID (202)。
+    请求体: {'type': 'backtest' | 'optimize' | 'walkforward' | 'robustness' | 'compare' | 'portfolio' | 'incremental' | 'intraday' | 'prefetch', 'config': {...}}，config 与对应同步接口的请求体相同。
+    """
+    try:
+        body = request.get_json()
+
+        if not body or not isinstance(body.get('config'), dict):
+            return jsonify({'error': '请求体为空或缺少 config 配置。'}), 400
+
+        # 格式和降采样在查询结果时指定
+        body['config'].pop('responseFormat', None)
+        body['config'].pop('maxPoints', None)
+        body['config'].pop('debug', None)
+        job = job_manager.submit(body.get('type', 'backtest'), body['config'])
+        return jsonify(job), 202
+
+    except JobQueueFullError as e:
+        return jsonify({'error': str(e)}), 503
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        app.logger.error(f"提交任务时发生未预料的错误: {e}", exc_info=True)
+        return jsonify({'error': '服务器内部发生错误，请稍后再试或联系管理员。'}), 500
+
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job_endpoint(job_id):
+    """
+    查询任务状态、进度百分比；任务完成后包含 result。
+    ?format= 指定 result 的编码，?maxPoints= 对曲线降采样 (不带该参数再次查询即为完整分辨率)。
+    """
+    try:
+        response_format = _response_format()
+        max_points = _max_points()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在或结果已过期。'}), 404
+    if 'result' in job:
+        job['result'] = with_trade_page(downsample_results(job['result'], max_points))
+    if 'result' in job and response_format != 'json':
+        if response_format == 'msgpack':
+            return _respond(job, response_format)
+        job['result'] = format_results(job['result'], response_format)[0]
+    return jsonify(job)
+
+
+@app.route('/api/results/<result_id>', methods=['GET'])
+def get_result_endpoint(result_id):
+    """
+    按回测响应中的 resultId 从结果缓存取回结果，默认为完整分辨率。
+    用于图表先显示降采样曲线、需要细节时再取完整数据；支持 ?format= 与 ?maxPoints=。
+    """
+    try:
+        response_format = _response_format()
+        max_points = _max_points()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    results = get_result_cache().find(result_id)
+    if results is None:
+        return jsonify({'error': '结果不存在或已过期，请重新运行回测。'}), 404
+    return _respond(results, response_format, max_points)
+
+
+@app.route('/api/results/<result_id>/trades', methods=['GET'])
+def get_result_trades_endpoint(result_id):
+    """
+    分页取回回测的成交记录 (列式): ?offset=&limit= (默认 0 与 100)；
+    ?format=csv 或 ?format=parquet 时导出全部记录为文件。
+    """
+    results = get_result_cache().find(result_id)
+    if results is None:
+        return jsonify({'error': '结果不存在或已过期，请重新运行回测。'}), 404
+    trades = results.get('trades')
+    if trades is None:
+        return jsonify({'error': '该结果没有成交记录。'}), 404
+    try:
+        export_format = request.args.get('format')
+        if export_format:
+            body, mimetype = export_trades(trades, export_format)
+            return Response(body, mimetype=mimetype, headers={
+                'Content-Disposition': f'attachment; filename=trades_{result_id[:12]}.{export_format}'})
+        page = page_trades(trades, request.args.get('offset', 0), request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({**page, 'stats': results.get('trade_stats')})
+
+
+@app.route('/api/strategies', methods=['GET'])
+def strategies_endpoint():
+    """已注册的策略及其参数声明 (类型、默认值、取值范围)，以及逐根 K 线内核是否已由 numba 编译。"""
+    return jsonify({'strategies': describe_strategies(), 'jit': JIT_ENABLED})
+
+
+@app.route('/api/markets', methods=['GET'])
+def markets_endpoint():
+    """成交模型的市场预设 (整手、税费、涨跌停、T+1、滑点)，回测配置中用 execution: {'market': ...} 选择并可覆盖各项。"""
+    return jsonify({'markets': describe_markets()})
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats_endpoint():
+    """价格缓存与结果缓存的命中率、节省的计算时间等监控数据。"""
+    return jsonify({
+        'priceCache': get_price_cache().stats(),
+        'resultCache': get_result_cache().stats(),
+        'jobs': job_manager.stats(),
+        'warmStart': warm_start_summary,
+    })
+
+
+@app.route('/api/cache/snapshot', methods=['POST'])
+def cache_snapshot_endpoint():
+    """
+    用本进程内存中最近使用的价格和回测结果生成预热快照，写入 WARM_START_SNAPSHOT。
+    可选请求体: {'tickers': 最多代码数, 'results': 最多结果数}。
+    """
+    if not DEFAULT_SNAPSHOT_PATH:
+        return jsonify({'error': '服务器未配置 WARM_START_SNAPSHOT。'}), 400
+    options = request.get_json(silent=True) or {}
+    try:
+        limits = {name: int(options[name]) for name in ('tickers', 'results') if name in options}
+    except (TypeError, ValueError):
+        return jsonify({'error': 'tickers 和 results 必须是整数。'}), 400
+    try:
+        summary = save_snapshot(DEFAULT_SNAPSHOT_PATH, get_price_cache(), get_result_cache(),
+                                **{'max_' + name: value for name, value in limits.items()})
+    except OSError as e:
+        app.logger.error(f"写入预热快照失败: {e}", exc_info=True)
+        return jsonify({'error': '写入预热快照失败。'}), 500
+    return jsonify(summary)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus 文本格式: 各阶段耗时/CPU/内存直方图、请求数，以及缓存和任务队列的统计。"""
+    body = render_metrics({
+        'price_cache': get_price_cache().stats(),
+        'result_cache': get_result_cache().stats(),
+        'jobs': job_manager.stats(),
+    })
+    return Response(body, content_type=PROMETHEUS_CONTENT_TYPE)
+
+
 # 使得这个脚本可以直接通过 `python app.py` 运行
 if __name__ == '__main__':
     # debug=True 会在代码变动后自动重启服务，并提供详细的错误追溯
@@ -1,33 +1,446 @@
 # backend/backtest_engine.py
-from utils import get_price_data_and_name
-from strategies import generate_signals
-from analysis import analyze_performance
+from utils import get_price_data_and_names, get_price_data_version, add_price_refresh_listener
+from result_cache import get_result_cache, result_key
+from strategies import get_strategy, generate_signals, generate_signal_matrix
+from analysis import analyze_performance, performance_metrics_matrix
+from kernels import (position_kernel, JIT_ENABLED, TRADE_BUY, TRADE_SIGNAL_SELL, TRADE_TAKE_PROFIT,
+                     TRADE_STOP_LOSS)
+from execution import ExecutionModel, DEFAULT_EXECUTION, trading_days
 import pandas as pd
 import numpy as np  # Ensure numpy is imported
+import time
 
+# 价格数据刷新后，依赖该代码的回测结果缓存随之失效
+add_price_refresh_listener(lambda ticker: get_result_cache().invalidate_ticker(ticker))
 
-def run_backtest(config):
+
+def run_backtest(config, mode='vectorized', progress=None, use_cache=True):
+    """
+    progress: 可选回调 progress(百分比, 阶段名)，供异步任务汇报进度。
+    use_cache: 相同配置且价格数据未更新时直接返回缓存的结果；
+    缓存的结果带有 resultId，可通过结果缓存再次取回完整分辨率的数据。
+    """
     ticker = config['ticker']
     start_date = config['startDate']
     end_date = config['endDate']
-    initial_capital_ref = float(config.get('initialCapital', 0))
-    strategy_name = config['strategy']['name']
-    strategy_params = config['strategy'].get('params', {})
-    commission_config = config.get('commission', {})
     benchmark_ticker = config.get('benchmarkTicker')
-    take_profit_pct = config.get('takeProfit', None)
-    stop_loss_pct = config.get('stopLoss', None)
 
-    data, asset_name = get_price_data_and_name(ticker, start_date, end_date)
+    _report(progress, 0, 'loading_data')
+    # 资产与基准并发获取
+    loaded = get_price_data_and_names([ticker] + ([benchmark_ticker] if benchmark_ticker else []),
+                                      start_date, end_date)
+    data, asset_name = loaded[0]
     config['assetName'] = asset_name
 
     benchmark_data_df = None
     if benchmark_ticker:
-        benchmark_data_df, benchmark_name = get_price_data_and_name(benchmark_ticker, start_date, end_date)
+        benchmark_data_df, benchmark_name = loaded[1]
         config['benchmarkAssetName'] = benchmark_name
 
+    if not use_cache:
+        return run_backtest_on_data(config, data, benchmark_data_df, mode=mode, progress=progress)
+
+    _report(progress, 30, 'checking_cache')
+    tickers = [ticker] + ([benchmark_ticker] if benchmark_ticker else [])
+    cache = get_result_cache()
+    key = result_key(config, {t: get_price_data_version(t) for t in tickers}, mode)
+    results = cache.get(key, tickers)
+    if results is not None:
+        return results
+
+    started = time.perf_counter()
+    results = run_backtest_on_data(config, data, benchmark_data_df, mode=mode, progress=progress)
+    results['resultId'] = key
+    cache.put(key, tickers, results, time.perf_counter() - started)
+    return results
+
+
+def run_backtest_on_data(config, data, benchmark_data_df=None, mode='vectorized', include_charts=True,
+                         progress=None):
+    """
+    在已加载的价格数据上运行回测 (参数扫描等场景可复用同一份数据)。
+    include_charts=False 时只计算指标，不生成图表数据。
+    """
+    initial_capital_ref = float(config.get('initialCapital', 0))
+    benchmark_ticker = config.get('benchmarkTicker')
+
+    _report(progress, 40, 'generating_signals')
+    data, first_investment_amount_for_benchmark = simulate_strategy(config, data, mode=mode, progress=progress)
+
+    # --- Asset Benchmark (Buy & Hold of the asset itself) ---
+    if not data.empty and data['Close'].iloc[0] != 0:
+        data['Asset_Benchmark_Value'] = benchmark_values(data['Close'], initial_capital_ref,
+                                                         first_investment_amount_for_benchmark)
+    else:
+        data['Asset_Benchmark_Value'] = 0.0
+
+    data = _add_market_benchmark(data, benchmark_data_df if benchmark_ticker else None, initial_capital_ref,
+                                 first_investment_amount_for_benchmark)
+
+    config['first_investment_amount'] = first_investment_amount_for_benchmark  # Pass to analysis
+
+    _report(progress, 80, 'analyzing')
+    results = analyze_performance(data, initial_capital_ref, config, include_charts=include_charts)
+    return results
+
+
+def simulate_strategy(config, data, mode='vectorized', progress=None):
+    """生成信号并模拟持仓，返回 (带 Signal/Portfolio_Value/Cumulative_Investment 等列的 data 副本, 首笔投入金额)。"""
+    strategy_name = config['strategy']['name']
+    strategy_params = config['strategy'].get('params', {})
     data = generate_signals(data.copy(), strategy_name, strategy_params)
 
+    _report(progress, 55, 'simulating')
+    simulate = _SIMULATORS.get(mode)
+    if simulate is None:
+        raise ValueError(f"未知的模拟模式: '{mode}'")
+    return simulate(data, strategy_name, strategy_params, float(config.get('initialCapital', 0)),
+                    config.get('commission', {}), config.get('takeProfit', None), config.get('stopLoss', None),
+                    ExecutionModel.from_config(config))
+
+
+def benchmark_values(prices, initial_capital_ref, first_investment_amount_for_benchmark):
+    """
+    按与策略市值相同的口径计算基准 (买入并持有 prices) 的市值，prices 的第一个值不能为 0。
+    设置了参考资金时按参考资金买入；否则按策略首笔投入金额买入并减去该金额 (与从 0 现金开始的盈亏可比)。
+    """
+    first_price = prices.iloc[0]
+    if initial_capital_ref > 0:
+        return (prices / first_price) * initial_capital_ref
+    elif first_investment_amount_for_benchmark > 0:  # If ref=0, scale by first strategy investment
+        # Value = (current_price / first_price) * first_investment_amount - first_investment_amount
+        # This makes it comparable to portfolio_value which is PnL from 0
+        shares_equiv_benchmark = first_investment_amount_for_benchmark / first_price
+        return (shares_equiv_benchmark * prices) - first_investment_amount_for_benchmark
+    return 0.0  # No investment made by strategy, B&H also 0 PnL
+
+
+def align_benchmark_prices(index, benchmark_data_df):
+    """把大盘基准收盘价对齐到 index 的日期上 (缺失的日期用前后最近的价格填充)；没有基准数据时返回 None。"""
+    if benchmark_data_df is None or benchmark_data_df.empty:
+        return None
+    close = benchmark_data_df['Close']
+    if isinstance(close, pd.DataFrame):
+        close = close.iloc[:, 0]
+    return close.reindex(index).ffill().bfill().rename('Market_Benchmark_Price')
+
+
+def _report(progress, percent, stage):
+    if progress is not None:
+        progress(percent, stage)
+
+
+def _add_market_benchmark(data, benchmark_data_df, initial_capital_ref, first_investment_amount_for_benchmark):
+    """把大盘基准收盘价对齐到 data 的日期上，并按与策略相同的口径计算 Market_Benchmark_Value。"""
+    # --- Market Benchmark (e.g., S&P 500) ---
+    market_prices = align_benchmark_prices(data.index, benchmark_data_df)
+    if market_prices is None:
+        data['Market_Benchmark_Value'] = 0.0
+        return data
+    data['Market_Benchmark_Price'] = market_prices
+    if not market_prices.empty and not pd.isna(market_prices.iloc[0]) and market_prices.iloc[0] != 0:
+        data['Market_Benchmark_Value'] = benchmark_values(market_prices, initial_capital_ref,
+                                                          first_investment_amount_for_benchmark)
+    else:
+        data['Market_Benchmark_Value'] = 0.0  # Default to 0 if market price is NaN or 0
+    return data
+
+
+def run_backtest_matrix(config, data, param_sets):
+    """
+    一次回测多组参数: 信号矩阵的每一列对应 param_sets 中的一组参数，
+    所有列在同一次逐日循环中按列向量化模拟。返回与 param_sets 顺序一致的指标列表。
+    param_sets 中的 takeProfit/stopLoss 按列生效，其余为策略参数 (包括每列的买入金额 amount)。
+    成交模型 (config['execution']) 对所有列相同，成交条件按每种买入金额各计算一次。
+    """
+    initial_capital_ref = float(config.get('initialCapital', 0))
+    strategy_name = config['strategy']['name']
+    base_params = config['strategy'].get('params', {})
+    strategy = get_strategy(strategy_name)
+    # 校验每组参数并补全默认值 (与单次回测相同)，任一组无效时抛出 ValueError
+    strategy_param_sets = [strategy.validate({**base_params, **{k: v for k, v in params.items()
+                                                                 if k not in ('takeProfit', 'stopLoss')}})
+                           for params in param_sets]
+    signals = generate_signal_matrix(data, strategy_name, strategy_param_sets)
+    take_profit = [params.get('takeProfit', config.get('takeProfit')) for params in param_sets]
+    stop_loss = [params.get('stopLoss', config.get('stopLoss')) for params in param_sets]
+
+    close = data['Close'].to_numpy(dtype=float).reshape(len(data))
+    amounts = np.array([float(params['amount']) for params in strategy_param_sets])
+    execution = ExecutionModel.from_config(config)
+    days = (data.index[-1] - data.index[0]).days if not data.empty else 0
+    rows = [None] * len(param_sets)
+    # 买入金额不同的组合分开模拟 (信号矩阵模拟器的买入金额对所有列相同)
+    for amount in np.unique(amounts):
+        group = np.flatnonzero(amounts == amount)
+        result = simulate_signal_matrix(close, signals[:, group], amount, config.get('commission', {}),
+                                        [take_profit[j] for j in group], [stop_loss[j] for j in group],
+                                        execution=execution, fills=_fill_arrays(execution, data, close, amount))
+        metrics = performance_metrics_matrix(result['portfolio_value'], result['cumulative_investment'],
+                                             result['first_investment'], days, initial_capital_ref)
+        for position, j in enumerate(group):
+            rows[j] = {name: values[position] for name, values in metrics.items()}
+    return rows
+
+
+def simulate_signal_matrix(close, signals, buy_amount, commission_config, take_profit=None, stop_loss=None,
+                           commission_scale=None, slippage=None, execution=None, fills=None):
+    """
+    信号矩阵版状态机 (适用于 sma_cross/dma_cross 等信号型策略)。
+    close: (交易日,)，或 (交易日, 列) 即每列一条价格路径；signals: (交易日, 列)。
+    take_profit/stop_loss 可为标量或每列一个值，None 表示不启用。
+    commission_scale/slippage 可为标量或每列一个值: 佣金乘以 commission_scale，另按成交额收取 slippage 比例的滑点成本。
+    execution: 成交模型 (execution.ExecutionModel)，fills 为其 fill_arrays 的结果 (省略时按 close 计算)。
+    逐日循环，每天对所有列做向量运算；结果与逐列调用 _simulation_kernel 一致。
+    """
+    n, k = signals.shape
+    close = np.asarray(close, dtype=float)
+    prices = np.broadcast_to(close if close.ndim == 2 else close[:, None], (n, k))
+    take_profit = _per_column(take_profit, k)
+    stop_loss = _per_column(stop_loss, k)
+    commission_params = _commission_params(commission_config)
+    if execution is not None and execution.is_default:
+        execution = fills = None
+    if execution is not None and fills is None:
+        fills = execution.fill_arrays(close, order_amount=buy_amount)
+    if JIT_ENABLED and commission_scale is None and slippage is None:
+        # 编译后的状态机逐列运行比逐日的列向量运算更快
+        return _simulate_columns(prices, signals, buy_amount, commission_params, take_profit, stop_loss,
+                                 execution, fills)
+    if execution is not None:
+        return _simulate_matrix_execution(prices, signals, float(buy_amount), commission_params, take_profit,
+                                          stop_loss, commission_scale, slippage, execution, fills)
+    # 价格共用且成本不扰动时 (参数扫描) 价格和买入佣金都是标量，逐日循环中不必按列取值
+    per_path = close.ndim == 2
+    perturbed = commission_scale is not None or slippage is not None
+    if perturbed:
+        commission_scale = _per_column(1.0 if commission_scale is None else commission_scale, k)
+        slippage = _per_column(0.0 if slippage is None else slippage, k)
+    buy_amount = float(buy_amount)
+    buy_commission = _commission_vector(np.array([buy_amount]), commission_params)[0]
+    if perturbed:
+        buy_commission = buy_commission * commission_scale + buy_amount * slippage
+    can_buy = buy_amount > buy_commission
+
+    cash = np.zeros(k)
+    shares = np.zeros(k)
+    entry_price = np.zeros(k)
+    last_signal = np.zeros(k, dtype=np.int8)
+    invested = np.zeros(k)
+    first_investment = np.zeros(k)
+    out_cash = np.empty((n, k))
+    out_shares = np.empty((n, k))
+    out_invested = np.empty((n, k))
+    out_signal = signals.copy()
+
+    for i in range(n):
+        price = close[i]
+        original_signal = signals[i]
+        holding = shares > 0
+
+        # SL/TP Logic: NaN 阈值的比较结果恒为 False
+        forced_exit = holding & ((price >= entry_price * (1 + take_profit)) | (price <= entry_price * (1 - stop_loss)))
+        actual_signal = np.where(forced_exit, -1, original_signal)
+        out_signal[i] = actual_signal
+
+        sell = (actual_signal == -1) & holding
+        if sell.any():
+            trade_value = shares[sell] * (price[sell] if per_path else price)
+            commission = _commission_vector(trade_value, commission_params)
+            if perturbed:
+                commission = commission * commission_scale[sell] + trade_value * slippage[sell]
+            cash[sell] += trade_value - commission
+            shares[sell] = 0
+            entry_price[sell] = 0
+
+        buy = (actual_signal == 1) & (last_signal <= 0)
+        if perturbed:
+            buy &= can_buy
+        if (perturbed or can_buy) and buy.any():
+            buy_price = price[buy] if per_path else price
+            shares_to_buy = (buy_amount - (buy_commission[buy] if perturbed else buy_commission)) / buy_price
+            held = shares[buy]
+            entry_price[buy] = np.where(held > 0, (held * entry_price[buy] + shares_to_buy * buy_price) /
+                                        (held + shares_to_buy), buy_price)
+            shares[buy] = held + shares_to_buy
+            cash[buy] -= buy_amount
+            invested[buy] += buy_amount
+            first_investment[buy & (first_investment == 0)] = buy_amount
+
+        out_cash[i] = cash
+        out_shares[i] = shares
+        out_invested[i] = invested
+        last_signal = original_signal
+
+    return {
+        'signal': out_signal,
+        'cash_flow': out_cash,
+        'shares_held': out_shares,
+        'portfolio_value': out_cash + out_shares * prices,
+        'cumulative_investment': out_invested,
+        'first_investment': first_investment,
+    }
+
+
+def _simulate_matrix_execution(prices, signals, buy_amount, commission_params, take_profit, stop_loss,
+                               commission_scale, slippage, execution, fills):
+    """
+    带成交模型的信号矩阵状态机，规则与 kernels.position_kernel 相同 (整手、税费、涨跌停、T+1、未成交买单顺延)。
+    成交价和能否成交取自预先算好的 fills，逐日对所有列做向量运算。
+    """
+    n, k = signals.shape
+    columns = {name: np.broadcast_to(values if values.ndim == 2 else values[:, None], (n, k))
+               for name, values in fills.items() if name != 'day'}
+    day = fills['day']
+    lot_size, stamp_duty, transfer_fee, t_plus_one = execution.params()
+    commission_scale = _per_column(1.0 if commission_scale is None else commission_scale, k)
+    slippage = _per_column(0.0 if slippage is None else slippage, k)
+
+    def costs(trade_values, rate, select):
+        fees = _commission_vector(trade_values, commission_params) * commission_scale[select]
+        return fees + trade_values * (slippage[select] + rate)
+
+    every = np.ones(k, dtype=bool)
+    buy_fees = costs(np.full(k, buy_amount), transfer_fee, every)
+
+    cash = np.zeros(k)
+    shares = np.zeros(k)
+    entry_price = np.zeros(k)
+    last_signal = np.zeros(k, dtype=np.int8)
+    invested = np.zeros(k)
+    first_investment = np.zeros(k)
+    pending = np.zeros(k, dtype=bool)
+    last_buy_day = np.full(k, np.nan)
+    out_cash = np.empty((n, k))
+    out_shares = np.empty((n, k))
+    out_invested = np.empty((n, k))
+    out_signal = signals.copy()
+
+    for i in range(n):
+        price = prices[i]
+        original_signal = signals[i]
+        holding = shares > 0
+
+        forced_exit = holding & ((price >= entry_price * (1 + take_profit)) | (price <= entry_price * (1 - stop_loss)))
+        actual_signal = np.where(forced_exit, -1, original_signal)
+        out_signal[i] = actual_signal
+
+        sell_signal = actual_signal == -1
+        pending &= ~sell_signal
+        sell = sell_signal & holding & columns['sell_ok'][i]
+        if t_plus_one:
+            sell &= ~(day[i] <= last_buy_day)
+        if sell.any():
+            trade_value = shares[sell] * columns['sell_price'][i][sell]
+            cash[sell] += trade_value - costs(trade_value, stamp_duty + transfer_fee, sell)
+            shares[sell] = 0
+            entry_price[sell] = 0
+
+        attempt = ((actual_signal == 1) & (last_signal <= 0)) | pending
+        pending = attempt & ~columns['buy_ok'][i]
+        buy = attempt & columns['buy_ok'][i]
+        if buy.any():
+            fill_price = columns['buy_price'][i][buy]
+            fees = buy_fees[buy]
+            if lot_size > 0:
+                shares_to_buy = np.floor((buy_amount - fees) / fill_price / lot_size) * lot_size
+                notional = shares_to_buy * fill_price
+                spent = notional + costs(notional, transfer_fee, buy)
+            else:
+                shares_to_buy = (buy_amount - fees) / fill_price
+                spent = np.full(len(fill_price), buy_amount)
+            filled = (buy_amount > fees) & (shares_to_buy > 0)
+            bought = np.flatnonzero(buy)[filled]
+            shares_to_buy, fill_price, spent = shares_to_buy[filled], fill_price[filled], spent[filled]
+            held = shares[bought]
+            entry_price[bought] = np.where(held > 0, (held * entry_price[bought] + shares_to_buy * fill_price) /
+                                           (held + shares_to_buy), fill_price)
+            shares[bought] = held + shares_to_buy
+            cash[bought] -= spent
+            invested[bought] += spent
+            first_investment[bought] = np.where(first_investment[bought] == 0, spent, first_investment[bought])
+            last_buy_day[bought] = day[i]
+
+        out_cash[i] = cash
+        out_shares[i] = shares
+        out_invested[i] = invested
+        last_signal = original_signal
+
+    return {
+        'signal': out_signal,
+        'cash_flow': out_cash,
+        'shares_held': out_shares,
+        'portfolio_value': out_cash + out_shares * prices,
+        'cumulative_investment': out_invested,
+        'first_investment': first_investment,
+    }
+
+
+def _simulate_columns(prices, signals, buy_amount, commission_params, take_profit, stop_loss, execution=None,
+                      fills=None):
+    n, k = signals.shape
+    out_signal = np.array(signals, dtype=np.int64, order='F')
+    out_cash = np.empty((n, k), order='F')
+    out_shares = np.empty((n, k), order='F')
+    out_invested = np.empty((n, k), order='F')
+    first_investment = np.zeros(k)
+    no_investment = np.zeros(n)
+    per_path = prices.strides[1] != 0
+    if fills is None and not per_path:
+        fills = DEFAULT_EXECUTION.fill_arrays(prices[:, 0])  # 各列共用
+    for j in range(k):
+        if fills is None:
+            column_fills = None
+        elif per_path:
+            column_fills = {name: values if values.ndim == 1 else values[:, j] for name, values in fills.items()}
+        else:
+            column_fills = fills
+        state = _simulation_kernel(prices[:, j], out_signal[:, j].copy(), no_investment, False, buy_amount,
+                                   commission_params, take_profit[j], stop_loss[j], _initial_state(),
+                                   out_signal[:, j], out_cash[:, j], out_shares[:, j], out_invested[:, j],
+                                   execution=execution, fills=column_fills)
+        first_investment[j] = state['first_investment']
+    return {
+        'signal': out_signal.astype(signals.dtype),
+        'cash_flow': out_cash,
+        'shares_held': out_shares,
+        'portfolio_value': out_cash + out_shares * prices,
+        'cumulative_investment': out_invested,
+        'first_investment': first_investment,
+    }
+
+
+def _per_column(value, k):
+    if value is None or np.isscalar(value):
+        return np.full(k, np.nan if value is None else float(value))
+    return np.array([np.nan if v is None else float(v) for v in value])
+
+
+def _commission_vector(trade_values, commission_params):
+    comm_type, comm_rate, comm_min_fee, comm_fee = commission_params
+    if comm_type == 'percentage':
+        return np.maximum(trade_values * comm_rate, comm_min_fee)
+    return np.full(trade_values.shape, comm_fee)
+
+
+def _calculate_commission(trade_value, config):
+    comm_type = config.get('type', 'none')
+    if comm_type == 'percentage':
+        rate = float(config.get('rate', 0.0003))
+        min_fee = float(config.get('min_fee', 5.0))
+        return max(trade_value * rate, min_fee)
+    elif comm_type == 'fixed':
+        return float(config.get('fee', 5.0))
+    return 0
+
+def _simulate_reference(data, strategy_name, strategy_params, initial_capital_ref, commission_config,
+                        take_profit_pct, stop_loss_pct, execution=DEFAULT_EXECUTION):
+    """
+    逐行参考实现 (原始的 .iloc/.loc 循环)。
+    速度较慢，仅用于与数组内核逐日对比结果；只支持默认成交模型。
+    """
+    if not execution.is_default:
+        raise ValueError("逐行参考实现不支持成交模型 (execution)，请使用 vectorized 模式。")
     cash = 0
     shares = 0
     portfolio_values = []
@@ -40,18 +453,23 @@ def run_backtest(config):
     # Store cash and shares for analysis if needed later for PnL calculation
     data['cash_flow'] = 0.0
     data['shares_held'] = 0.0
+    trade_actions = [0] * len(data)
+    trade_commissions = [0.0] * len(data)
 
     for i in range(len(data)):
         price = data['Close'].iloc[i]
         original_signal = data['Signal'].iloc[i]
         actual_signal_for_day = original_signal
+        exit_reason = TRADE_SIGNAL_SELL
 
         # SL/TP Logic
         if shares > 0 and current_position_entry_price is not None:
             if take_profit_pct is not None and price >= current_position_entry_price * (1 + take_profit_pct):
                 actual_signal_for_day = -1
+                exit_reason = TRADE_TAKE_PROFIT
             elif stop_loss_pct is not None and price <= current_position_entry_price * (1 - stop_loss_pct):
                 actual_signal_for_day = -1
+                exit_reason = TRADE_STOP_LOSS
 
         if actual_signal_for_day == -1 and original_signal != -1:
             data.loc[data.index[i], 'Signal'] = -1
@@ -74,6 +492,7 @@ def run_backtest(config):
                     shares += shares_to_buy
                     cash -= amount_to_invest
                     current_iter_investment = amount_to_invest
+                    trade_actions[i], trade_commissions[i] = TRADE_BUY, commission
                     if first_investment_amount_for_benchmark == 0:
                         first_investment_amount_for_benchmark = amount_to_invest
 
@@ -99,6 +518,7 @@ def run_backtest(config):
                     shares += shares_to_buy
                     cash -= hypothetical_buy_amount
                     current_iter_investment = hypothetical_buy_amount
+                    trade_actions[i], trade_commissions[i] = TRADE_BUY, commission
                     if first_investment_amount_for_benchmark == 0:
                         first_investment_amount_for_benchmark = hypothetical_buy_amount
 
@@ -108,6 +528,7 @@ def run_backtest(config):
                 cash += trade_value - commission
                 shares = 0
                 current_position_entry_price = None
+                trade_actions[i], trade_commissions[i] = exit_reason, commission
 
         data.loc[data.index[i], 'cash_flow'] = cash
         data.loc[data.index[i], 'shares_held'] = shares
@@ -127,66 +548,116 @@ def run_backtest(config):
 
     data['Portfolio_Value'] = portfolio_values
     data['Cumulative_Investment'] = actual_invested_capital_history[1:]  # Store for analysis
+    data['Trade_Action'] = np.array(trade_actions, dtype=np.int8)
+    data['Commission'] = np.array(trade_commissions, dtype=float)
 
-    # --- Asset Benchmark (Buy & Hold of the asset itself) ---
-    if not data.empty and data['Close'].iloc[0] != 0:
-        asset_first_price = data['Close'].iloc[0]
-        if initial_capital_ref > 0:
-            data['Asset_Benchmark_Value'] = (data['Close'] / asset_first_price) * initial_capital_ref
-        elif first_investment_amount_for_benchmark > 0:  # If ref=0, scale by first strategy investment
-            # Value = (current_price / first_price) * first_investment_amount - first_investment_amount
-            # This makes it comparable to portfolio_value which is PnL from 0
-            # Asset B&H value = (shares_bought_with_first_investment * current_price) - first_investment_amount
-            shares_equiv_asset_benchmark = first_investment_amount_for_benchmark / asset_first_price
-            data['Asset_Benchmark_Value'] = (shares_equiv_asset_benchmark * data[
-                'Close']) - first_investment_amount_for_benchmark
-        else:  # No investment made by strategy, B&H also 0 PnL
-            data['Asset_Benchmark_Value'] = 0.0
-    else:
-        data['Asset_Benchmark_Value'] = 0.0
+    return data, first_investment_amount_for_benchmark
 
-    # --- Market Benchmark (e.g., S&P 500) ---
-    if benchmark_ticker and benchmark_data_df is not None and not benchmark_data_df.empty:
-        benchmark_data_df = benchmark_data_df.rename(columns={'Close': 'Market_Benchmark_Price'})
-        # Ensure 'Market_Benchmark_Price' is present after join, otherwise create it with NaN
-        if 'Market_Benchmark_Price' not in data.columns:
-            data = data.join(benchmark_data_df['Market_Benchmark_Price'],
-                             how='left')  # .ffill().bfill() # ffill then bfill
-        else:  # if it was already there (e.g. from a previous failed attempt to join)
-            data['Market_Benchmark_Price'] = data['Market_Benchmark_Price'].fillna(
-                benchmark_data_df['Market_Benchmark_Price'])
-
-        data['Market_Benchmark_Price'] = data['Market_Benchmark_Price'].ffill().bfill()  # Fill NaNs after join
-
-        if 'Market_Benchmark_Price' in data.columns and not data['Market_Benchmark_Price'].empty and not pd.isna(
-                data['Market_Benchmark_Price'].iloc[0]) and data['Market_Benchmark_Price'].iloc[0] != 0:
-            market_first_price = data['Market_Benchmark_Price'].iloc[0]
-            if initial_capital_ref > 0:
-                data['Market_Benchmark_Value'] = (data[
-                                                      'Market_Benchmark_Price'] / market_first_price) * initial_capital_ref
-            elif first_investment_amount_for_benchmark > 0:  # If ref=0, scale by first strategy investment
-                shares_equiv_market_benchmark = first_investment_amount_for_benchmark / market_first_price
-                data['Market_Benchmark_Value'] = (shares_equiv_market_benchmark * data[
-                    'Market_Benchmark_Price']) - first_investment_amount_for_benchmark
-            else:  # No investment made by strategy, so market benchmark also 0 PnL
-                data['Market_Benchmark_Value'] = 0.0
-        else:
-            data['Market_Benchmark_Value'] = 0.0  # Default to 0 if market price is NaN or 0
+
+def _simulate_vectorized(data, strategy_name, strategy_params, initial_capital_ref, commission_config,
+                         take_profit_pct, stop_loss_pct, execution=DEFAULT_EXECUTION):
+    """
+    数组版模拟: 一次性取出 Close/Signal/InvestmentAmount，在 NumPy 数组上运行持仓状态机，
+    最后整列写回 DataFrame。结果与 _simulate_reference 逐日一致。
+    """
+    n = len(data)
+    close = data['Close'].to_numpy(dtype=float).reshape(n)
+    signal = data['Signal'].to_numpy()
+    if 'InvestmentAmount' in data.columns:
+        investment = data['InvestmentAmount'].to_numpy(dtype=float)
     else:
-        data['Market_Benchmark_Value'] = 0.0
+        investment = np.zeros(n)
 
-    config['first_investment_amount'] = first_investment_amount_for_benchmark  # Pass to analysis
+    is_fixed_frequency = strategy_name == 'fixed_frequency'
+    buy_amount = strategy_params.get('amount', 1000)  # Default if not specified for signal strategies
+    if strategy_name == 'buy_and_hold':
+        buy_amount = initial_capital_ref if initial_capital_ref > 0 else strategy_params.get('amount', 1000)
 
-    results = analyze_performance(data, initial_capital_ref, config)
-    return results
+    out_signal = signal.copy()
+    out_cash = np.zeros(n)
+    out_shares = np.zeros(n)
+    out_invested = np.zeros(n)
+    out_action = np.zeros(n, dtype=np.int8)
+    out_commission = np.zeros(n)
+    fills = _fill_arrays(execution, data, close, investment if is_fixed_frequency else buy_amount)
+    state = _simulation_kernel(close, signal, investment, is_fixed_frequency,
+                               float(buy_amount), _commission_params(commission_config),
+                               take_profit_pct, stop_loss_pct, _initial_state(),
+                               out_signal, out_cash, out_shares, out_invested, out_action, out_commission,
+                               execution, fills)
 
+    data['Signal'] = out_signal
+    data['cash_flow'] = out_cash
+    data['shares_held'] = out_shares
+    data['Portfolio_Value'] = out_cash + out_shares * close
+    data['Cumulative_Investment'] = out_invested
+    data['Trade_Action'] = out_action
+    data['Commission'] = out_commission
+    return data, state['first_investment']
 
-def _calculate_commission(trade_value, config):
+
+def _fill_arrays(execution, data, close, order_amount):
+    """按 data 的日期和成交量 (有 Volume 列时) 计算成交条件；默认成交模型不需要日期。"""
+    if execution.is_default:
+        return execution.fill_arrays(close)
+    volume = data['Volume'].to_numpy(dtype=float) if 'Volume' in data.columns else None
+    return execution.fill_arrays(close, volume, order_amount, trading_days(data.index))
+
+
+def _initial_state():
+    # 持仓状态: 现金(负数代表累计投入)、持股数、持仓均价、上一日原始信号、累计投入、首笔投入金额、
+    # 未成交的买单金额、最近一次买入的交易日序号
+    return {'cash': 0.0, 'shares': 0.0, 'entry_price': None, 'last_signal': 0,
+            'cumulative_investment': 0.0, 'first_investment': 0, 'pending_buy': 0.0, 'last_buy_day': None}
+
+
+def _commission_params(config):
+    """把佣金配置拆成 (类型, 费率, 最低收费, 固定费用)，供数组内核使用。"""
     comm_type = config.get('type', 'none')
     if comm_type == 'percentage':
-        rate = float(config.get('rate', 0.0003))
-        min_fee = float(config.get('min_fee', 5.0))
-        return max(trade_value * rate, min_fee)
+        return comm_type, float(config.get('rate', 0.0003)), float(config.get('min_fee', 5.0)), 0.0
     elif comm_type == 'fixed':
-        return float(config.get('fee', 5.0))
-    return 0
\ No newline at end of file
+        return comm_type, 0.0, 0.0, float(config.get('fee', 5.0))
+    return comm_type, 0.0, 0.0, 0.0
+
+
+def _simulation_kernel(close, signal, investment, is_fixed_frequency, buy_amount, commission_params,
+                       take_profit_pct, stop_loss_pct, state, out_signal, out_cash, out_shares, out_invested,
+                       out_action=None, out_commission=None, execution=None, fills=None):
+    """
+    持仓/现金状态机 (kernels.position_kernel，可由 numba 编译)。输入为按日排列的序列，输出写入预先分配的数组。
+    state 为起始状态，返回模拟结束时的状态。不需要成交记录时 out_action/out_commission 可省略。
+    execution 为成交模型 (默认不启用任何规则)，fills 为其 fill_arrays 的结果，省略时按 close 计算。
+    """
+    if out_action is None:
+        out_action = np.empty(len(out_cash), dtype=np.int8)
+    if out_commission is None:
+        out_commission = np.empty(len(out_cash))
+    execution = execution or DEFAULT_EXECUTION
+    if fills is None:
+        fills = execution.fill_arrays(close, order_amount=buy_amount)
+    comm_type, comm_rate, comm_min_fee, comm_fee = commission_params
+    lot_size, stamp_duty, transfer_fee, t_plus_one = execution.params()
+    values = [state['cash'], state['shares'], np.nan if state['entry_price'] is None else state['entry_price'],
+              state['last_signal'], state['cumulative_investment'], state['first_investment'],
+              state.get('pending_buy', 0.0), _nan_if_none(state.get('last_buy_day'))]
+    position_kernel(close, signal, investment, fills['buy_price'], fills['sell_price'], fills['buy_ok'],
+                    fills['sell_ok'], fills['day'], bool(is_fixed_frequency), float(buy_amount),
+                    comm_type == 'percentage', comm_rate, comm_min_fee, comm_fee, lot_size, stamp_duty, transfer_fee,
+                    t_plus_one, _nan_if_none(take_profit_pct), _nan_if_none(stop_loss_pct), values, out_signal,
+                    out_cash, out_shares, out_invested, out_action, out_commission)
+    cash, shares, entry_price, last_signal, invested, first_investment, pending_buy, last_buy_day = values
+    return {'cash': cash, 'shares': shares, 'entry_price': None if entry_price != entry_price else entry_price,
+            'last_signal': int(last_signal), 'cumulative_investment': invested,
+            'first_investment': first_investment if first_investment != 0 else 0, 'pending_buy': pending_buy,
+            'last_buy_day': None if last_buy_day != last_buy_day else int(last_buy_day)}
+
+
+def _nan_if_none(value):
+    return np.nan if value is None else float(value)
+
+
+_SIMULATORS = {
+    'vectorized': _simulate_vectorized,
+    'reference': _simulate_reference,
+}
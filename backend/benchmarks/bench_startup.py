@@ -0,0 +1,78 @@
+# backend/benchmarks/bench_startup.py
+"""
+启动耗时检查: 在新的解释器中导入 app (或 --module 指定的模块)，取多次中最快一次的导入耗时，
+并检查 akshare/yfinance 等数据源库没有在导入时被加载。超过时间预算或加载了这些库时退出码为 1。
+用法 (在 backend 目录下):
+  python benchmarks/bench_startup.py [--budget 3.0] [--repeat 5] [--module app] [--top 10]
+--top 列出 python -X importtime 统计的累计耗时最多的顶层模块。预算与机器相关，可用环境变量 STARTUP_IMPORT_BUDGET 设置。
+tests/test_startup.py 在测试中运行同样的检查。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGET = float(os.environ.get('STARTUP_IMPORT_BUDGET', 3.0))
+# 只在第一次向数据源请求时才应导入的模块
+LAZY_MODULES = ('akshare', 'yfinance')
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - started
+print(json.dumps({{'seconds': elapsed, 'loaded': [name for name in {lazy!r} if name in sys.modules]}}))
+"""
+
+
+def measure(module, importtime=False):
+    """在子进程中导入 module，返回 ({'seconds', 'loaded'}, -X importtime 的输出)。预热快照不在此时载入。"""
+    env = {key: value for key, value in os.environ.items() if key != 'WARM_START_SNAPSHOT'}
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + [
+        '-c', _PROBE.format(module=module, lazy=LAZY_MODULES)]
+    completed = subprocess.run(command, cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1]), completed.stderr
+
+
+def slowest_imports(importtime_output, top):
+    """解析 -X importtime 的输出，返回累计耗时最多的顶层模块 [(模块, 秒)]。"""
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if cumulative.strip().isdigit() and not name.startswith('  '):
+            rows.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(rows, key=lambda row: row[1], reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='启动耗时检查')
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET, help='导入耗时预算 (秒)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--top', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    runs = [measure(args.module)[0] for _ in range(args.repeat)]
+    best = min(run['seconds'] for run in runs)
+    loaded = sorted({name for run in runs for name in run['loaded']})
+    print(f"import {args.module}: {best * 1e3:.1f} ms (最快 / {args.repeat} 次)，预算 {args.budget * 1e3:.0f} ms")
+    if args.top:
+        for name, seconds in slowest_imports(measure(args.module, importtime=True)[1], args.top):
+            print(f"  {name:<30} {seconds * 1e3:>8.1f} ms")
+
+    failed = False
+    if loaded:
+        print(f"导入时加载了应延迟导入的模块: {', '.join(loaded)}")
+        failed = True
+    if best > args.budget:
+        print(f"导入耗时超过预算 {(best / args.budget - 1) * 100:+.1f}%")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,211 @@
+# backend/benchmarks/run_benchmarks.py
+"""
+回测基准测试: 在合成数据上离线运行 run_backtest_on_data，记录耗时 (含各阶段) 与内存峰值。
+用法 (在 backend 目录下):
+  python benchmarks/run_benchmarks.py                         # 运行并写入 benchmarks/results/latest.json
+  python benchmarks/run_benchmarks.py --save-baseline         # 同时把本次结果保存为基线
+  python benchmarks/run_benchmarks.py --compare               # 与基线比较，耗时或内存退化超过阈值时退出码为 1
+  python benchmarks/run_benchmarks.py --sizes 1000 10000 --kinds gbm --strategies sma_cross
+gbm 数据上运行所有策略与变体的组合；regime/gaps 数据只运行各策略的 plain 变体 (--full-matrix 可全部运行)。
+基线与机器相关，应在同一台机器上生成和比较。
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+
+from backtest_engine import run_backtest_on_data  # noqa: E402
+from synthetic import PRICE_KINDS, make_price_frame  # noqa: E402
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, 'results', 'latest.json')
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, 'baseline.json')
+# 耗时/内存超过基线的比例阈值；耗时差小于 MIN_SECONDS_DELTA 的视为噪声
+DEFAULT_TIME_TOLERANCE = 0.25
+DEFAULT_MEMORY_TOLERANCE = 0.15
+MIN_SECONDS_DELTA = 0.005
+# 每个用例最多重复的次数和累计耗时上限(秒)，取最快一次
+MAX_REPEAT = 5
+REPEAT_TIME_LIMIT = 1.0
+
+STRATEGIES = {
+    'buy_and_hold': {},
+    'fixed_frequency': {'frequency': 'W', 'amount': 1000},
+    'sma_cross': {'period': 20},
+    'dma_cross': {'fast': 10, 'slow': 30},
+    'trailing_stop': {'period': 20, 'trail': 0.1},
+}
+VARIANTS = {
+    'plain': {},
+    'sl_tp': {'takeProfit': 0.2, 'stopLoss': 0.1},
+    'benchmark': {'benchmarkTicker': 'BENCH'},
+    'sl_tp_benchmark': {'takeProfit': 0.2, 'stopLoss': 0.1, 'benchmarkTicker': 'BENCH'},
+}
+# run_backtest_on_data 的进度阶段，用于拆分各阶段耗时
+STAGES = ('generating_signals', 'simulating', 'analyzing')
+
+
+def benchmark_cases(sizes, kinds, strategies, variants, full_matrix=False):
+    for bars in sizes:
+        for kind in kinds:
+            for strategy in strategies:
+                for variant in variants:
+                    if kind == 'gbm' or full_matrix or variant == 'plain':
+                        yield bars, kind, strategy, variant
+
+
+def case_config(strategy, variant):
+    return {
+        'ticker': 'SYNTH',
+        'initialCapital': 100000,
+        'strategy': {'name': strategy, 'params': dict(STRATEGIES[strategy])},
+        'commission': {'type': 'percentage', 'rate': 0.0003, 'min_fee': 5},
+        **VARIANTS[variant],
+    }
+
+
+def run_case(config, data, benchmark_data):
+    """运行一次回测，返回 (总耗时, {阶段: 耗时})。"""
+    marks = []
+    started = time.perf_counter()
+    run_backtest_on_data(dict(config), data, benchmark_data,
+                         progress=lambda percent, stage: marks.append((stage, time.perf_counter())))
+    finished = time.perf_counter()
+    stages = {}
+    boundaries = [mark for mark in marks if mark[0] in STAGES] + [('end', finished)]
+    for (stage, at), (_, until) in zip(boundaries, boundaries[1:]):
+        stages[stage] = until - at
+    return finished - started, stages
+
+
+def measure(config, data, benchmark_data):
+    """取多次运行中最快的一次；内存峰值在单独的 tracemalloc 运行中测量 (tracemalloc 会拖慢计时)。"""
+    runs = [run_case(config, data, benchmark_data)]
+    while len(runs) < MAX_REPEAT and sum(run[0] for run in runs) < REPEAT_TIME_LIMIT:
+        runs.append(run_case(config, data, benchmark_data))
+    seconds, stages = min(runs, key=lambda run: run[0])
+
+    tracemalloc.start()
+    try:
+        run_backtest_on_data(dict(config), data, benchmark_data)
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'seconds': round(seconds, 6),
+        'usPerBar': round(seconds / len(data) * 1e6, 4),
+        'stages': {stage: round(value, 6) for stage, value in stages.items()},
+        'peakMB': round(peak_bytes / 2 ** 20, 3),
+        'repeats': len(runs),
+    }
+
+
+def run_suite(sizes, kinds, strategies, variants, full_matrix=False, seed=0, log=print):
+    results = {}
+    frames = {}
+    for bars, kind, strategy, variant in benchmark_cases(sizes, kinds, strategies, variants, full_matrix):
+        if (bars, kind) not in frames:
+            frames.clear()  # 只保留当前规模的数据，避免 1M 根 K 线的数据常驻内存
+            # 生产环境的价格数据只有 Close 列
+            frames[(bars, kind)] = (make_price_frame(kind, bars, seed)[['Close']],
+                                    make_price_frame(kind, bars, seed + 1)[['Close']])
+        data, benchmark_data = frames[(bars, kind)]
+        config = case_config(strategy, variant)
+        name = f"backtest/{kind}/{bars}/{strategy}/{variant}"
+        result = measure(config, data, benchmark_data if 'benchmarkTicker' in config else None)
+        results[name] = {'bars': bars, 'kind': kind, 'strategy': strategy, 'variant': variant, **result}
+        log(f"{name:<55} {result['seconds'] * 1e3:>10.2f} ms {result['usPerBar']:>8.3f} us/bar "
+            f"{result['peakMB']:>9.2f} MB")
+    return results
+
+
+def compare(results, baseline, time_tolerance=DEFAULT_TIME_TOLERANCE, memory_tolerance=DEFAULT_MEMORY_TOLERANCE):
+    """返回退化列表 [(用例名, 指标, 基线值, 本次值)]；基线中没有的用例不参与比较。"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if (result['seconds'] > base['seconds'] * (1 + time_tolerance)
+                and result['seconds'] - base['seconds'] > MIN_SECONDS_DELTA):
+            regressions.append((name, 'seconds', base['seconds'], result['seconds']))
+        if result['peakMB'] > base['peakMB'] * (1 + memory_tolerance):
+            regressions.append((name, 'peakMB', base['peakMB'], result['peakMB']))
+    return regressions
+
+
+def environment_info():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCHMARK_DIR, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def _write_json(path, payload):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='回测基准测试')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--kinds', nargs='+', choices=PRICE_KINDS, default=list(PRICE_KINDS))
+    parser.add_argument('--strategies', nargs='+', choices=list(STRATEGIES), default=list(STRATEGIES))
+    parser.add_argument('--variants', nargs='+', choices=list(VARIANTS), default=list(VARIANTS))
+    parser.add_argument('--full-matrix', action='store_true', help='所有数据类型都运行全部变体')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true', help='与基线比较，退化时退出码为 1')
+    parser.add_argument('--time-tolerance', type=float, default=DEFAULT_TIME_TOLERANCE)
+    parser.add_argument('--memory-tolerance', type=float, default=DEFAULT_MEMORY_TOLERANCE)
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.sizes, args.kinds, args.strategies, args.variants, args.full_matrix, args.seed)
+    payload = {'environment': environment_info(), 'results': results}
+    _write_json(args.output, payload)
+    print(f"结果已写入 {args.output}")
+    if args.save_baseline:
+        _write_json(args.baseline, payload)
+        print(f"基线已保存到 {args.baseline}")
+
+    if args.compare:
+        if not os.path.exists(args.baseline):
+            print(f"基线文件不存在: {args.baseline}")
+            return 2
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.time_tolerance, args.memory_tolerance)
+        for name, metric, base, current in regressions:
+            print(f"退化: {name} {metric} {base} -> {current} ({(current / base - 1) * 100:+.1f}%)")
+        if regressions:
+            return 1
+        print(f"与基线相比没有超过阈值的退化 ({len(set(results) & set(baseline))} 个用例)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,125 @@
+# backend/benchmarks/synthetic.py
+"""
+可复现的合成行情数据 (同一 seed 总是生成相同的数据)，供基准测试离线使用。
+  gbm:    几何布朗运动
+  regime: 牛熊两种状态随机切换的几何布朗运动
+  gaps:   带随机休市日和长假 (每年一次连续 5 个交易日) 的日历，节后开盘有较大跳空
+K 线数量不超过 MAX_DAILY_BARS 时生成日线，更多时生成 A 股交易时段的分钟线 (每天 240 根)，
+否则 100k 根以上的日线会超出 pandas 纳秒时间戳的范围。
+"""
+import numpy as np
+import pandas as pd
+
+PRICE_KINDS = ('gbm', 'regime', 'gaps')
+CALENDAR_END = '2024-12-31'
+MAX_DAILY_BARS = 60000
+TRADING_DAYS_PER_YEAR = 252
+# 分钟线时间戳 (距 09:00 的分钟数): 09:31-11:30, 13:01-15:00
+SESSION_MINUTES = np.concatenate([np.arange(31, 151), np.arange(241, 361)])
+
+
+def trading_calendar(bars, bar=None, holiday_rate=0.0, closures=False, seed=0):
+    """
+    返回以 CALENDAR_END 结束、长度为 bars 的交易时间索引。
+    bar: '1d' 或 '1min'，默认按数量自动选择；holiday_rate: 工作日随机休市的比例；
+    closures: 每 TRADING_DAYS_PER_YEAR 个工作日休市连续 5 天。
+    """
+    bar = bar or ('1d' if bars <= MAX_DAILY_BARS else '1min')
+    if bar not in ('1d', '1min'):
+        raise ValueError(f"不支持的 K 线周期: '{bar}'")
+    per_day = 1 if bar == '1d' else len(SESSION_MINUTES)
+    days_needed = -(-bars // per_day)
+
+    rng = np.random.default_rng(seed)
+    candidates = pd.bdate_range(end=CALENDAR_END, periods=int(days_needed * 1.2) + 50)
+    keep = rng.random(len(candidates)) >= holiday_rate
+    if closures:
+        position = np.arange(len(candidates))[::-1]  # 从 CALENDAR_END 往前数
+        keep &= position % TRADING_DAYS_PER_YEAR >= 5
+    days = candidates[keep][-days_needed:]
+    if len(days) < days_needed:
+        raise ValueError("休市比例过高，无法生成足够的交易日。")
+
+    if bar == '1d':
+        return days[-bars:]
+    stamps = (days.to_numpy()[:, None] + np.timedelta64(9, 'h')
+              + SESSION_MINUTES.astype('timedelta64[m]')[None, :]).ravel()
+    return pd.DatetimeIndex(stamps[-bars:])
+
+
+def bars_per_year(index):
+    if len(index) > 1 and (index[1:] - index[:-1]).min() < pd.Timedelta(days=1):
+        return TRADING_DAYS_PER_YEAR * len(SESSION_MINUTES)
+    return TRADING_DAYS_PER_YEAR
+
+
+def gbm_log_returns(n, rng, annual_drift=0.08, annual_volatility=0.25, periods_per_year=TRADING_DAYS_PER_YEAR):
+    dt = 1.0 / periods_per_year
+    return rng.normal((annual_drift - annual_volatility ** 2 / 2) * dt, annual_volatility * np.sqrt(dt), n)
+
+
+def regime_log_returns(n, rng, regimes=((0.25, 0.15), (-0.30, 0.40)), switch_probability=0.01,
+                       periods_per_year=TRADING_DAYS_PER_YEAR):
+    """
+    regimes: [(年化收益, 年化波动)]，每根 K 线以 switch_probability 的概率切换到另一个状态。
+    状态序列由几何分布的持续时间拼接而成，不逐根循环。
+    """
+    durations = rng.geometric(switch_probability, size=max(int(n * switch_probability * 2), 1) + 10)
+    while durations.sum() < n:
+        durations = np.concatenate([durations, rng.geometric(switch_probability, size=len(durations))])
+    steps = np.concatenate([[0], rng.integers(1, len(regimes), size=len(durations) - 1)])
+    states = np.repeat(np.cumsum(steps) % len(regimes), durations)[:n]
+
+    drift = np.array([mu for mu, _ in regimes])
+    volatility = np.array([sigma for _, sigma in regimes])
+    dt = 1.0 / periods_per_year
+    return rng.normal((drift[states] - volatility[states] ** 2 / 2) * dt, volatility[states] * np.sqrt(dt))
+
+
+def ohlc_frame(index, log_returns, rng, start_price=100.0, gap_volatility=None):
+    """
+    由逐根对数收益构造 OHLC: 开盘相对上一收盘有一段跳空 (隔夜收益)，其余为盘中收益。
+    gap_volatility: 可选数组，每根 K 线开盘跳空的标准差；默认不区分跳空与盘中。
+    """
+    n = len(index)
+    overnight = np.zeros(n)
+    if gap_volatility is not None:
+        overnight = rng.normal(0.0, 1.0, n) * gap_volatility
+    close = start_price * np.exp(np.cumsum(log_returns + overnight))
+    previous_close = np.concatenate([[start_price], close[:-1]])
+    open_ = previous_close * np.exp(overnight)
+    wick = np.abs(rng.normal(0.0, np.abs(log_returns).mean() + 1e-9, (2, n)))
+    return pd.DataFrame({
+        'Open': open_,
+        'High': np.maximum(open_, close) * np.exp(wick[0]),
+        'Low': np.minimum(open_, close) * np.exp(-wick[1]),
+        'Close': close,
+    }, index=index)
+
+
+def make_price_frame(kind, bars, seed=0, bar=None):
+    """按数据类型生成 bars 根 K 线的 OHLC DataFrame。"""
+    if kind not in PRICE_KINDS:
+        raise ValueError(f"未知的数据类型: '{kind}'")
+    rng = np.random.default_rng(seed)
+    if kind == 'gaps':
+        index = trading_calendar(bars, bar, holiday_rate=0.02, closures=True, seed=seed)
+    else:
+        index = trading_calendar(bars, bar, seed=seed)
+    periods_per_year = bars_per_year(index)
+
+    if kind == 'regime':
+        return ohlc_frame(index, regime_log_returns(bars, rng, periods_per_year=periods_per_year), rng)
+    log_returns = gbm_log_returns(bars, rng, periods_per_year=periods_per_year)
+    if kind == 'gbm':
+        return ohlc_frame(index, log_returns, rng)
+
+    # 新交易日的第一根 K 线有隔夜跳空；中间隔了休市日的，跳空更大
+    days = index.to_numpy().astype('datetime64[D]')
+    gap_volatility = np.zeros(bars)
+    session_open = np.concatenate([[False], days[1:] != days[:-1]])
+    gap_volatility[session_open] = 0.005
+    skipped = np.zeros(bars, dtype=bool)
+    skipped[1:] = session_open[1:] & (np.busday_count(days[:-1], days[1:]) > 1)
+    gap_volatility[skipped] = 0.03
+    return ohlc_frame(index, log_returns, rng, gap_volatility=gap_volatility)
@@ -0,0 +1,134 @@
+# backend/compare.py
+"""
+多策略对比: 在同一资产、同一时间段上一次运行多个策略。
+价格和大盘基准只加载一次，基准对齐和基准市值曲线只计算一次；各策略在线程池中并行，共用同一份价格数据
+(模拟内核在 numba 下释放 GIL)。所有曲线共用一条日期轴。
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils import get_price_data_and_names
+from backtest_engine import simulate_strategy, benchmark_values, align_benchmark_prices, _report
+from analysis import analyze_performance, period_returns, executed_trades
+from trade_ledger import trade_statistics
+from strategies import get_strategy
+
+MAX_STRATEGIES = 20
+# 单个策略的配置中可以覆盖的回测参数
+STRATEGY_OVERRIDES = ('takeProfit', 'stopLoss', 'commission', 'execution')
+
+
+def run_comparison(config, strategies, max_workers=None, progress=None):
+    """
+    config 为普通回测配置 (不含 strategy)，strategies: [{'name', 'params', 'label', 'takeProfit', 'stopLoss'}, ...]。
+    返回 {'dates', 'assetPrice', 'benchmarks', 'strategies', ...}。设置了 initialCapital 时两条基准曲线对所有策略相同，
+    放在顶层 benchmarks 中；否则基准按各策略的首笔投入金额计算，放在各策略的 benchmarks 中 (顶层为 None)。
+    """
+    if not isinstance(strategies, list) or not strategies:
+        raise ValueError("缺少 strategies 策略列表。")
+    if len(strategies) > MAX_STRATEGIES:
+        raise ValueError(f"一次最多对比 {MAX_STRATEGIES} 个策略。")
+    configs = []
+    for entry in strategies:
+        if not isinstance(entry, dict) or 'name' not in entry:
+            raise ValueError("strategies 中的每一项都需要 name。")
+        strategy = get_strategy(entry['name'])
+        params = strategy.validate(entry.get('params', {}))
+        strategy_config = {**config, 'strategy': {'name': entry['name'], 'params': params}}
+        strategy_config.update({key: entry[key] for key in STRATEGY_OVERRIDES if key in entry})
+        configs.append((entry.get('label') or strategy.label, strategy_config))
+    initial_capital_ref = float(config.get('initialCapital', 0))
+    started = time.perf_counter()
+
+    _report(progress, 0, 'loading_data')
+    benchmark_ticker = config.get('benchmarkTicker')
+    loaded = get_price_data_and_names([config['ticker']] + ([benchmark_ticker] if benchmark_ticker else []),
+                                      config['startDate'], config['endDate'])
+    data, asset_name = loaded[0]
+    config['assetName'] = asset_name
+    if data.empty:
+        raise ValueError("所选时间范围内没有价格数据。")
+    data = data[['Close']]
+
+    # 共享部分: 日期轴、资产价格、对齐后的大盘价格
+    dates = data.index.strftime('%Y-%m-%d').tolist()
+    close = data['Close']
+    market_prices = None
+    if benchmark_ticker:
+        benchmark_data_df, config['benchmarkAssetName'] = loaded[1]
+        market_prices = align_benchmark_prices(data.index, benchmark_data_df)
+        if market_prices is not None and (pd.isna(market_prices.iloc[0]) or market_prices.iloc[0] == 0):
+            market_prices = None
+    shared = initial_capital_ref > 0
+    benchmarks = _benchmarks(close, market_prices, initial_capital_ref, 0) if shared else None
+
+    _report(progress, 10, 'simulating')
+    max_workers = min(max_workers or os.cpu_count() or 1, len(configs))
+    done = []
+
+    def run(item):
+        label, strategy_config = item
+        result = _run_strategy(strategy_config, data, dates, close, market_prices, initial_capital_ref, shared)
+        done.append(label)
+        _report(progress, 10 + 85 * len(done) / len(configs), 'simulating')
+        return {'label': label, 'name': strategy_config['strategy']['name'],
+                'params': strategy_config['strategy']['params'], **result}
+
+    if max_workers == 1:
+        results = [run(item) for item in configs]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='compare') as executor:
+            results = list(executor.map(run, configs))
+
+    return {
+        'dates': dates,
+        'assetPrice': close.round(2).tolist(),
+        'assetName': asset_name,
+        'benchmarkAssetName': config.get('benchmarkAssetName', benchmark_ticker),
+        'benchmarks': benchmarks,
+        'strategies': results,
+        'elapsedSeconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def _run_strategy(config, data, dates, close, market_prices, initial_capital_ref, shared):
+    """在共享的价格数据上运行一个策略，返回指标、市值曲线、买卖点、逐笔统计和月度/年度收益。"""
+    data, first_investment = simulate_strategy(config, data)
+    config['first_investment_amount'] = first_investment
+    metrics = analyze_performance(data, initial_capital_ref, config, include_charts=False)['metrics']
+    portfolio_values = data['Portfolio_Value'].to_numpy(dtype=float)
+    buy_points, sell_points, trades = executed_trades(data, dates, portfolio_values)
+    capital_base = initial_capital_ref if initial_capital_ref > 0 else data['Cumulative_Investment'].iloc[-1]
+    monthly_dates, monthly_values = period_returns(data.index, portfolio_values, 'M')
+    yearly_dates, yearly_values = period_returns(data.index, portfolio_values, 'Y')
+    result = {
+        'metrics': metrics,
+        'portfolio': np.round(portfolio_values, 2).tolist(),
+        'trade_markers': {'buy_points': buy_points, 'sell_points': sell_points},
+        'trade_stats': trade_statistics(trades, capital_base),
+        'monthly_returns': {'dates': monthly_dates, 'values': monthly_values},
+        'yearly_returns': {'dates': yearly_dates, 'values': yearly_values},
+    }
+    if not shared:
+        result['benchmarks'] = _benchmarks(close, market_prices, initial_capital_ref, first_investment)
+    return result
+
+
+def _benchmarks(close, market_prices, initial_capital_ref, first_investment):
+    """{'asset', 'market'} 两条基准市值曲线，口径与单策略回测的 Asset/Market_Benchmark_Value 相同。"""
+    return {'asset': _curve(close, initial_capital_ref, first_investment),
+            'market': _curve(market_prices, initial_capital_ref, first_investment) if market_prices is not None
+            else None}
+
+
+def _curve(prices, initial_capital_ref, first_investment):
+    if prices.iloc[0] == 0:
+        return [0.0] * len(prices)
+    values = benchmark_values(prices, initial_capital_ref, first_investment)
+    if np.isscalar(values):
+        return [float(values)] * len(prices)
+    return values.round(2).tolist()
@@ -0,0 +1,97 @@
+# backend/downsampling.py
+"""
+曲线降采样 (Largest-Triangle-Three-Buckets)。
+长历史或分钟数据的曲线在服务端按 maxPoints 降采样；所有曲线共用同一组采样点，
+买卖点日期、最大回撤的峰值和谷底、首尾两点始终保留。
+"""
+import numpy as np
+
+from response_format import CURVE_KEYS
+
+MIN_MAX_POINTS = 10
+
+
+def lttb_indices(values, n_out):
+    """返回 LTTB 选出的下标 (升序，包含首尾)。n_out 不小于序列长度时返回全部下标。"""
+    values = np.nan_to_num(np.asarray(values, dtype=float))
+    n = len(values)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # 第一个和最后一个点单独保留，其余点均分为 n_out - 2 个桶
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for b in range(n_out - 2):
+        start, end = edges[b], edges[b + 1]
+        next_start, next_end = end, edges[b + 2] if b + 2 < len(edges) else n
+        avg_x = (next_start + next_end - 1) / 2.0
+        avg_y = values[next_start:next_end].mean()
+        candidates = np.arange(start, end)
+        # 以上一个选中点 a、候选点、下一个桶的均值点构成三角形，取面积最大的候选点
+        area = np.abs((a - avg_x) * (values[start:end] - values[a]) - (a - candidates) * (avg_y - values[a]))
+        a = start + int(area.argmax())
+        selected[b + 1] = a
+    return selected
+
+
+def drawdown_extremes(values):
+    """返回最大回撤的 (峰值下标, 谷底下标)。"""
+    values = np.nan_to_num(np.asarray(values, dtype=float))
+    if len(values) == 0:
+        return ()
+    trough = int((values - np.maximum.accumulate(values)).argmin())
+    peak = int(values[:trough + 1].argmax())
+    return peak, trough
+
+
+def downsample_results(results, max_points):
+    """
+    返回曲线被降采样后的结果副本 (原结果不被修改)。
+    max_points 为每条曲线的目标点数；必须保留的点较多时实际点数可能超过该值。
+    """
+    chart_data = results.get('chart_data') if isinstance(results, dict) else None
+    if not chart_data or not max_points:
+        return results
+    dates = next((chart_data[key]['dates'] for key in CURVE_KEYS if chart_data.get(key, {}).get('dates')), [])
+    n = len(dates)
+    if n <= max_points:
+        return results
+
+    curves = [key for key in CURVE_KEYS if key in chart_data and len(chart_data[key]['values']) == n]
+    date_array = np.array(dates)
+    position = {date: i for i, date in enumerate(dates)}
+    required = {0, n - 1}
+    markers = chart_data.get('trade_markers', {})
+    for side in ('buy_points', 'sell_points'):
+        required.update(position[point['date']] for point in markers.get(side, []) if point['date'] in position)
+    if 'portfolio_curve' in curves:
+        required.update(drawdown_extremes(chart_data['portfolio_curve']['values']))
+
+    budget = max(max_points - len(required), 3 * len(curves)) // max(len(curves), 1)
+    selected = set(required)
+    for key in curves:
+        selected.update(lttb_indices(chart_data[key]['values'], budget).tolist())
+    index = np.array(sorted(selected))
+
+    sampled = dict(chart_data)
+    sampled_dates = date_array[index].tolist()
+    for key in curves:
+        values = np.asarray(chart_data[key]['values'])
+        sampled[key] = {'dates': sampled_dates, 'values': values[index].tolist()}
+    sampled['sampling'] = {'method': 'lttb', 'originalPoints': n, 'points': len(index)}
+    return {**results, 'chart_data': sampled}
+
+
+def parse_max_points(value):
+    if value is None or value == '':
+        return None
+    try:
+        max_points = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("maxPoints 必须为整数。")
+    if max_points < MIN_MAX_POINTS:
+        raise ValueError(f"maxPoints 不能小于 {MIN_MAX_POINTS}。")
+    return max_points
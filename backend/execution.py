@@ -0,0 +1,169 @@
+# backend/execution.py
+"""
+成交与交易成本模型: 整手交易、卖出印花税、双向过户费、涨跌停日无法成交、T+1 和按成交量估计的滑点，按市场预设配置。
+逐根 K 线的成交价、能否买入/卖出和交易日序号在模拟之前对整段价格序列一次性按数组计算 (fill_arrays)；
+持仓状态机 (kernels.position_kernel 和 backtest_engine.simulate_signal_matrix) 只按下标读取这些数组，
+整手取整和税费也在状态机内按数值运算完成，不逐笔调用 Python 函数。
+default 市场不启用任何规则，结果与不配置成交模型时逐位相同。
+"""
+import numpy as np
+import pandas as pd
+
+from trading_calendar import NS_PER_DAY
+
+# lotSize: 每手股数 (0 为可买小数股)；stampDuty: 卖出时按成交额收取的税费；transferFee: 双向按成交额收取的过户费；
+# priceLimit: 涨跌停幅度 (相对前一交易日收盘价，None 为不限)；tPlusOne: 当日买入的股票当日不能卖出；
+# slippage: 固定滑点比例；impact: 冲击系数，滑点另加 impact * 订单金额 / 当根 K 线成交额 (需要 Volume 列)；
+# maxSlippage: 滑点上限 (0 为不限)。
+MARKETS = {
+    'default': {'label': '不限制 (小数股、按收盘价成交)', 'lotSize': 0, 'stampDuty': 0.0, 'transferFee': 0.0,
+                'priceLimit': None, 'tPlusOne': False, 'slippage': 0.0, 'impact': 0.0, 'maxSlippage': 0.0},
+    'cn_a': {'label': 'A 股', 'lotSize': 100, 'stampDuty': 0.0005, 'transferFee': 0.00001, 'priceLimit': 0.1,
+             'tPlusOne': True, 'slippage': 0.0002, 'impact': 0.1, 'maxSlippage': 0.01},
+    'us': {'label': '美股', 'lotSize': 1, 'stampDuty': 0.0000278, 'transferFee': 0.0, 'priceLimit': None,
+           'tPlusOne': False, 'slippage': 0.0002, 'impact': 0.1, 'maxSlippage': 0.01},
+}
+# 可在 config['execution'] 中覆盖的规则及其取值范围
+RULES = {
+    'lotSize': (0, 1000000),
+    'stampDuty': (0.0, 0.1),
+    'transferFee': (0.0, 0.1),
+    'priceLimit': (0.001, 1.0),
+    'slippage': (0.0, 0.1),
+    'impact': (0.0, 100.0),
+    'maxSlippage': (0.0, 0.5),
+}
+# 判断涨跌停的容差: 复权价格或四舍五入到分的限价使涨跌幅略小于 priceLimit
+LIMIT_TOLERANCE = 0.001
+
+
+class ExecutionModel:
+    """某个市场的成交规则。用 from_config(config) 从回测配置的 execution 项创建。"""
+
+    def __init__(self, market='default', **overrides):
+        if market not in MARKETS:
+            raise ValueError(f"不支持的市场: '{market}'，可选: {', '.join(MARKETS)}")
+        rules = {**MARKETS[market], **overrides}
+        self.market = market
+        self.lot_size = int(rules['lotSize'])
+        self.stamp_duty = float(rules['stampDuty'])
+        self.transfer_fee = float(rules['transferFee'])
+        self.price_limit = None if rules['priceLimit'] is None else float(rules['priceLimit'])
+        self.t_plus_one = bool(rules['tPlusOne'])
+        self.slippage = float(rules['slippage'])
+        self.impact = float(rules['impact'])
+        self.max_slippage = float(rules['maxSlippage'])
+
+    @classmethod
+    def from_config(cls, config):
+        """config['execution'] 为 {'market': 'cn_a', 其余键覆盖该市场的默认规则}；未设置时为 default 市场。"""
+        execution = config.get('execution') or {}
+        if not isinstance(execution, dict):
+            raise ValueError("execution 必须是对象。")
+        overrides = {}
+        for name, value in execution.items():
+            if name == 'market':
+                continue
+            if name == 'tPlusOne':
+                if not isinstance(value, bool):
+                    raise ValueError("execution.tPlusOne 必须是布尔值。")
+                overrides[name] = value
+                continue
+            if name not in RULES:
+                raise ValueError(f"未知的成交规则: '{name}'")
+            if value is None and name == 'priceLimit':
+                overrides[name] = None
+                continue
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                raise ValueError(f"execution.{name} 必须是数字。")
+            low, high = RULES[name]
+            if not low <= value <= high:
+                raise ValueError(f"execution.{name} 必须在 {low} 到 {high} 之间。")
+            if name == 'lotSize' and value != int(value):
+                raise ValueError("execution.lotSize 必须是整数。")
+            overrides[name] = value
+        return cls(execution.get('market', 'default'), **overrides)
+
+    @property
+    def is_default(self):
+        """不改变成交价、不限制成交、不额外收费 (与不配置成交模型时相同)。"""
+        return (self.lot_size == 0 and self.stamp_duty == 0 and self.transfer_fee == 0 and self.price_limit is None
+                and not self.t_plus_one and self.slippage == 0 and self.impact == 0)
+
+    @property
+    def uses_volume(self):
+        return self.impact > 0
+
+    def params(self):
+        """状态机使用的标量规则: (每手股数, 卖出税费率, 过户费率, 是否 T+1)。"""
+        return float(self.lot_size), self.stamp_duty, self.transfer_fee, self.t_plus_one
+
+    def fill_arrays(self, close, volume=None, order_amount=0.0, days=None, previous_close=None):
+        """
+        按整段价格序列计算每根 K 线的成交条件，返回 {'buy_price', 'sell_price', 'buy_ok', 'sell_ok', 'day'}。
+        close: (K 线,) 或 (K 线, 路径)；volume: 与 close 对齐的成交量 (股)，None 时不计冲击成本；
+        order_amount: 标量或每根 K 线的订单金额，用于估计冲击成本 (卖出按相同金额估计)；
+        days: 每根 K 线所属交易日的序号 (见 trading_days)，None 时每根 K 线各为一个交易日；
+        previous_close: 第一根 K 线之前一个交易日的收盘价，用于判断第一个交易日是否涨跌停。
+        """
+        close = np.asarray(close, dtype=float)
+        n = close.shape[0]
+        days = np.arange(n, dtype=np.int64) if days is None else np.asarray(days, dtype=np.int64)
+        if self.is_default:
+            ok = np.ones(close.shape, dtype=bool)
+            return {'buy_price': close, 'sell_price': close, 'buy_ok': ok, 'sell_ok': ok, 'day': days}
+
+        rate = np.full(close.shape, self.slippage)
+        if self.uses_volume and volume is not None:
+            turnover = close * np.asarray(volume, dtype=float).reshape(close.shape[:1] + (1,) * (close.ndim - 1))
+            amount = np.asarray(order_amount, dtype=float)
+            if amount.ndim:
+                amount = amount.reshape(amount.shape[:1] + (1,) * (close.ndim - 1))
+            participation = np.divide(amount, turnover, out=np.zeros(close.shape), where=turnover > 0)
+            rate += self.impact * participation
+        if self.max_slippage > 0:
+            np.minimum(rate, self.max_slippage, out=rate)
+
+        buy_ok = np.ones(close.shape, dtype=bool)
+        sell_ok = np.ones(close.shape, dtype=bool)
+        if self.price_limit is not None and n:
+            change = close / _previous_day_close(close, days, previous_close) - 1
+            threshold = self.price_limit - LIMIT_TOLERANCE
+            # 收盘涨停时买不进，跌停时卖不出 (与 NaN 的比较结果为 False，即第一天默认可成交)
+            buy_ok = ~(change >= threshold)
+            sell_ok = ~(change <= -threshold)
+        return {'buy_price': close * (1 + rate), 'sell_price': close * (1 - rate), 'buy_ok': buy_ok,
+                'sell_ok': sell_ok, 'day': days}
+
+    def describe(self):
+        return {'market': self.market, 'lotSize': self.lot_size, 'stampDuty': self.stamp_duty,
+                'transferFee': self.transfer_fee, 'priceLimit': self.price_limit, 'tPlusOne': self.t_plus_one,
+                'slippage': self.slippage, 'impact': self.impact, 'maxSlippage': self.max_slippage}
+
+
+DEFAULT_EXECUTION = ExecutionModel()
+
+
+def describe_markets():
+    return [{'name': name, 'label': rules['label'], **ExecutionModel(name).describe()} for name, rules in MARKETS.items()]
+
+
+def trading_days(index):
+    """每根 K 线所属自然日的序号 (日线每根 K 线各为一天，分钟线同一天的 K 线序号相同)。"""
+    return pd.DatetimeIndex(index).asi8 // NS_PER_DAY
+
+
+def slice_fills(fills, start, end):
+    return {name: values[start:end] for name, values in fills.items()}
+
+
+def _previous_day_close(close, days, previous_close):
+    """每根 K 线对应的前一交易日收盘价 (涨跌停的基准)。"""
+    new_day = np.empty(len(days), dtype=bool)
+    new_day[0] = True
+    new_day[1:] = days[1:] != days[:-1]
+    day_number = np.cumsum(new_day) - 1
+    last_bar_of_day = np.append(np.flatnonzero(new_day)[1:] - 1, len(days) - 1)
+    first = np.full(close.shape[1:], np.nan if previous_close is None else float(previous_close))
+    closes = np.concatenate([first[None], close[last_bar_of_day[:-1]]])
+    return closes[day_number]
@@ -0,0 +1,490 @@
+# backend/incremental.py
+"""
+增量回测。
+定时更新时每次只多出几根 K 线，检查点保存模拟状态 (现金、持股、持仓均价、上一信号、累计投入)、
+均线累加器和回撤统计 (历史峰值、最大回撤)，新数据只处理新增的 K 线，指标与对完整历史重新回测完全一致。
+均线累加器按 pandas rolling().mean() 的算法 (Kahan 补偿求和) 逐根更新，结果与全量计算逐位相同。
+定投的买入日取决于整个周期内有哪些交易日，因此检查点保存当前周期开始时的状态，当前周期的 K 线每次重新模拟。
+"""
+import hashlib
+import json
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from utils import get_price_data_and_name
+from strategies import get_strategy, generate_signals
+from backtest_engine import _simulation_kernel, _initial_state, _commission_params, _report
+from result_cache import normalize_config
+from trading_calendar import SCHEDULE_FREQUENCIES, NS_PER_DAY, period_ids
+from trade_ledger import trade_events, concat_events, truncate_events, build_trade_ledger
+from execution import ExecutionModel, trading_days
+
+INCREMENTAL_STRATEGIES = ('buy_and_hold', 'fixed_frequency', 'sma_cross', 'dma_cross')
+CHECKPOINT_VERSION = 2
+
+
+class RollingMean:
+    """与 pandas Series.rolling(window).mean() (min_periods=window) 逐位一致的在线均值。"""
+
+    def __init__(self, window):
+        self.window = int(window)
+        self.values = deque()
+        self.sum = 0.0
+        self.compensation_add = 0.0
+        self.compensation_remove = 0.0
+        self.nobs = 0
+        self.negative_count = 0
+        self.same_value_count = 0
+        self.previous_value = None
+
+    def push(self, value):
+        """加入一个新值并返回当前均值，窗口未满时返回 NaN。"""
+        value = float(value)
+        if len(self.values) == self.window:
+            removed = self.values.popleft()
+            if removed == removed:
+                self.nobs -= 1
+                y = -removed - self.compensation_remove
+                t = self.sum + y
+                self.compensation_remove = t - self.sum - y
+                self.sum = t
+                if math.copysign(1.0, removed) < 0:
+                    self.negative_count -= 1
+        if self.previous_value is None:
+            self.previous_value = value
+        if value == value:
+            self.nobs += 1
+            y = value - self.compensation_add
+            t = self.sum + y
+            self.compensation_add = t - self.sum - y
+            self.sum = t
+            if math.copysign(1.0, value) < 0:
+                self.negative_count += 1
+            # 连续相同的值直接返回该值，避免浮点误差 (pandas GH#42064)
+            self.same_value_count = self.same_value_count + 1 if value == self.previous_value else 1
+            self.previous_value = value
+        self.values.append(value)
+
+        if self.nobs < self.window or self.nobs == 0:
+            return math.nan
+        mean = self.sum / self.nobs
+        if self.same_value_count >= self.nobs:
+            return self.previous_value
+        if self.negative_count == 0 and mean < 0:
+            return 0.0
+        if self.negative_count == self.nobs and mean > 0:
+            return 0.0
+        return mean
+
+    def to_dict(self):
+        state = {key: value for key, value in vars(self).items() if key != 'values'}
+        state['values'] = list(self.values)
+        return state
+
+    @classmethod
+    def from_dict(cls, state):
+        """从 to_dict 的结果恢复，只读取已知的字段；字段缺失或类型不对时抛出 KeyError/TypeError。"""
+        rolling = cls(state['window'])
+        for key, value in _restore_fields(state, vars(cls(rolling.window))).items():
+            if key == 'window':
+                continue
+            if key == 'values':
+                value = deque(_number_list(value))
+            setattr(rolling, key, value)
+        return rolling
+
+
+class IncrementalBacktest:
+    """
+    用法:
+        engine = IncrementalBacktest(config)
+        engine.update(data)            # data: 以日期为索引、含 Close 列的 DataFrame，可多次追加
+        engine.metrics()               # 与 run_backtest_on_data(config, 全部数据)['metrics'] 相同
+        engine.trade_ledger()          # 本实例处理过的 K 线上的成交记录
+        checkpoint = engine.checkpoint()
+        engine = IncrementalBacktest.from_checkpoint(checkpoint, config)
+    """
+
+    def __init__(self, config):
+        self.strategy_name = config['strategy']['name']
+        if self.strategy_name not in INCREMENTAL_STRATEGIES:
+            raise ValueError(f"策略 '{self.strategy_name}' 不支持增量回测。")
+        # 与普通回测相同按策略的参数声明校验，未提供的参数取默认值
+        self.strategy_params = get_strategy(self.strategy_name).validate(config['strategy'].get('params', {}))
+        if self.strategy_name == 'fixed_frequency':
+            # 重新模拟的周期与 trading_calendar 选择买入日的周期相同
+            self.frequency = self.strategy_params['frequency']
+            if self.frequency not in SCHEDULE_FREQUENCIES:
+                raise ValueError(f"定投频率 '{self.frequency}' 不支持增量回测。")
+        self.config_key = checkpoint_key(config)
+        self.initial_capital_ref = float(config.get('initialCapital', 0))
+        self.commission_params = _commission_params(config.get('commission', {}))
+        self.take_profit_pct = config.get('takeProfit', None)
+        self.stop_loss_pct = config.get('stopLoss', None)
+        self.execution = ExecutionModel.from_config(config)
+        self.buy_amount = float(self.strategy_params['amount'])
+        if self.strategy_name == 'buy_and_hold':
+            self.buy_amount = self.initial_capital_ref if self.initial_capital_ref > 0 else self.buy_amount
+
+        self.bars = 0
+        self.first_bar = None  # (日期, 收盘价)
+        self.last_bar = None
+        self.state = _initial_state()
+        self.stats = _initial_stats()
+        self.windows = self._strategy_windows()
+        self.rolling = {window: RollingMean(window) for window in self.windows}
+        # 定投: 当前周期开始前的状态和当前周期内的 K 线
+        self.period_state = None
+        self.period_bars = []
+        self.period_volumes = []
+        # 本实例模拟过的成交事件 (trade_ledger.trade_events)，不写入检查点
+        self.events = []
+
+    def update(self, data):
+        """
+        追加新的 K 线 (不晚于已处理最后日期的行会被忽略)，返回本次模拟的行。
+        定投策略返回的行包括当前周期内重新模拟的历史行。
+        """
+        close = data['Close']
+        if isinstance(close, pd.DataFrame):
+            close = close.iloc[:, 0]
+        if self.last_bar is not None:
+            close = close[close.index > self.last_bar[0]]
+        if close.empty:
+            return _rows([], [], [], [], {'cash': [], 'shares': [], 'invested': []})
+        dates = list(close.index)
+        prices = close.to_numpy(dtype=float).tolist()
+        volumes = None
+        if self.execution.uses_volume and 'Volume' in data.columns:
+            volumes = data['Volume'].reindex(close.index).to_numpy(dtype=float).tolist()
+        previous_close = self.last_bar[1] if self.last_bar is not None else None
+        if self.first_bar is None:
+            self.first_bar = (dates[0], prices[0])
+        position = self.bars
+        self.bars += len(dates)
+        self.last_bar = (dates[-1], prices[-1])
+
+        if self.strategy_name == 'fixed_frequency':
+            return self._update_fixed_frequency(dates, prices, volumes, previous_close)
+        signals = [self._next_signal(price, position + i) for i, price in enumerate(prices)]
+        return self._simulate(dates, prices, signals, [0.0] * len(prices), position, previous_close, volumes)
+
+    def metrics(self):
+        """与 analyze_performance 的 metrics 口径完全相同。"""
+        longest_window = max(self.windows, default=0)
+        if longest_window > self.bars:
+            raise ValueError("数据长度小于均线周期。")
+        if self.bars == 0:
+            return {'totalReturn': 0, 'annualizedReturn': 0, 'maxDrawdown': 0}
+
+        final_portfolio_value = np.float64(self.stats['portfolio_value'])
+        total_invested = self.state['cumulative_investment']
+        if self.initial_capital_ref > 0:
+            total_return = (final_portfolio_value / self.initial_capital_ref) * 100
+        elif total_invested > 0:
+            total_return = (final_portfolio_value / total_invested) * 100
+        else:
+            total_return = 0
+
+        days = (self.last_bar[0] - self.first_bar[0]).days
+        annualized_return = 0
+        if days > 0 and (self.initial_capital_ref > 0 or total_invested > 0):
+            annualized_return = ((1 + total_return / 100) ** (365.0 / days) - 1) * 100
+
+        if total_invested > 0 or self.initial_capital_ref > 0:
+            lowest_drawdown = self.stats['min_drawdown']
+            max_drawdown = (min(lowest_drawdown, 0.0) if lowest_drawdown is not None else 0.0) * 100
+        elif self.stats['min_value'] is not None and self.stats['min_value'] < 0:
+            lowest = np.float64(self.stats['min_value'])
+            first_investment = self.state['first_investment']
+            max_drawdown = lowest / first_investment * 100 if first_investment > 0 else lowest
+        else:
+            max_drawdown = 0.0
+        return {
+            'totalReturn': round(total_return, 2),
+            'annualizedReturn': round(annualized_return, 2),
+            'maxDrawdown': round(max_drawdown, 2),
+        }
+
+    def trade_ledger(self):
+        """
+        列式成交记录 (trade_ledger.build_trade_ledger)，下标为从 startDate 起的 K 线序号。
+        成交事件不保存在检查点中，从检查点恢复的实例只包含恢复之后模拟的成交。
+        """
+        if self.bars == 0:
+            return build_trade_ledger(concat_events([]), -1, np.nan)
+        return build_trade_ledger(concat_events(self.events), self.bars - 1, self.last_bar[1])
+
+    def checkpoint(self):
+        """可 JSON 序列化的检查点。"""
+        return {
+            'version': CHECKPOINT_VERSION,
+            'configKey': self.config_key,
+            'bars': self.bars,
+            'firstBar': _encode_bar(self.first_bar),
+            'lastBar': _encode_bar(self.last_bar),
+            'state': self.state,
+            'stats': self.stats,
+            'rolling': [rolling.to_dict() for rolling in self.rolling.values()],
+            'periodState': self.period_state,
+            'periodBars': [_encode_bar(bar) for bar in self.period_bars],
+            'periodVolumes': self.period_volumes,
+        }
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint, config):
+        if not isinstance(checkpoint, dict) or checkpoint.get('version') != CHECKPOINT_VERSION:
+            raise ValueError("检查点格式无效或版本不兼容。")
+        engine = cls(config)
+        if checkpoint.get('configKey') != engine.config_key:
+            raise ValueError("检查点与当前回测配置不一致。")
+        # 检查点由调用方保存和回传，逐项校验后只恢复已知的字段
+        try:
+            engine._restore(checkpoint)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"检查点格式无效: {e}") from e
+        return engine
+
+    def _restore(self, checkpoint):
+        bars = checkpoint['bars']
+        if isinstance(bars, bool) or not isinstance(bars, int) or bars < 0:
+            raise ValueError("bars 必须是非负整数")
+        self.bars = bars
+        self.first_bar = _decode_bar(checkpoint['firstBar'])
+        self.last_bar = _decode_bar(checkpoint['lastBar'])
+        if (self.last_bar is None) != (bars == 0) or (self.first_bar is None) != (bars == 0):
+            raise ValueError("firstBar/lastBar 与 bars 不一致")
+        self.state = _restore_fields(checkpoint['state'], _initial_state())
+        self.stats = _restore_fields(checkpoint['stats'], _initial_stats())
+        rolling = [RollingMean.from_dict(state) for state in checkpoint['rolling']]
+        self.rolling = {item.window: item for item in rolling}
+        if sorted(self.rolling) != self.windows or len(rolling) != len(self.windows):
+            raise ValueError("均线累加器与策略参数不一致")
+        period_state = checkpoint['periodState']
+        self.period_state = None if period_state is None else {
+            'state': _restore_fields(period_state['state'], _initial_state()),
+            'stats': _restore_fields(period_state['stats'], _initial_stats()),
+            'previousClose': _number_or_none(period_state['previousClose']),
+        }
+        self.period_bars = [_decode_bar(bar) for bar in checkpoint['periodBars']]
+        if None in self.period_bars or (self.period_bars and self.period_state is None):
+            raise ValueError("periodBars 无效")
+        self.period_volumes = [_number_or_none(volume) for volume in checkpoint['periodVolumes']]
+        if len(self.period_volumes) != len(self.period_bars):
+            raise ValueError("periodVolumes 与 periodBars 长度不一致")
+
+    def _strategy_windows(self):
+        if self.strategy_name == 'sma_cross':
+            return [self.strategy_params['period']]
+        if self.strategy_name == 'dma_cross':
+            return sorted({self.strategy_params['fast'], self.strategy_params['slow']})
+        return []
+
+    def _next_signal(self, price, position):
+        # 与 strategies.py 中各策略的信号规则相同
+        means = {window: rolling.push(price) for window, rolling in self.rolling.items()}
+        if self.strategy_name == 'sma_cross':
+            fast, slow = price, means[self.strategy_params['period']]
+        elif self.strategy_name == 'dma_cross':
+            fast = means[self.strategy_params['fast']]
+            slow = means[self.strategy_params['slow']]
+        else:  # buy_and_hold: 只在第一根 K 线买入
+            return 1 if position == 0 else 0
+        if fast > slow:
+            return 1
+        if fast < slow:
+            return -1
+        return 0
+
+    def _update_fixed_frequency(self, dates, prices, volumes, previous_close):
+        rows = []
+        start = 0
+        periods = self._period_ids(dates)
+        current = self._period_ids([self.period_bars[-1][0]])[0] if self.period_bars else None
+        while start < len(dates):
+            period = periods[start]
+            if period != current:
+                # 进入新周期: 上一周期的买入日已确定，记录周期开始前的状态和前一根 K 线的收盘价 (判断涨跌停)
+                if self.period_bars:
+                    previous_close = self.period_bars[-1][1]
+                self.period_bars = []
+                self.period_volumes = []
+                self.period_state = {'state': dict(self.state), 'stats': dict(self.stats),
+                                     'previousClose': previous_close}
+                current = period
+            end = start
+            while end < len(dates) and periods[end] == period:
+                end += 1
+            self.period_bars.extend(zip(dates[start:end], prices[start:end]))
+            self.period_volumes.extend(volumes[start:end] if volumes is not None else [None] * (end - start))
+            rows.append(self._resimulate_period(self.bars - len(dates) + end - len(self.period_bars)))
+            start = end
+        return pd.concat(rows) if len(rows) > 1 else rows[0]
+
+    def _period_ids(self, dates):
+        return period_ids(pd.DatetimeIndex(dates).asi8 // NS_PER_DAY, self.frequency).tolist()
+
+    def _resimulate_period(self, offset):
+        """从当前周期开始前的状态重新计算本周期的定投信号并模拟。offset 为本周期第一根 K 线的序号。"""
+        self.state = dict(self.period_state['state'])
+        self.stats = dict(self.period_state['stats'])
+        dates = [date for date, _ in self.period_bars]
+        prices = [price for _, price in self.period_bars]
+        # strategy_fixed_frequency 会跳过目标日早于第一根 K 线的周期，因此把第一根 K 线也放进去
+        frame_bars = self.period_bars if self.period_bars[0] == self.first_bar else [self.first_bar] + self.period_bars
+        frame = pd.DataFrame({'Close': [price for _, price in frame_bars]},
+                             index=pd.DatetimeIndex([date for date, _ in frame_bars]))
+        frame = generate_signals(frame, self.strategy_name, self.strategy_params).iloc[-len(dates):]
+        # 本周期之前模拟出的成交作废
+        self.events = [truncate_events(concat_events(self.events), dates[0])]
+        volumes = None if None in self.period_volumes else self.period_volumes
+        return self._simulate(dates, prices, frame['Signal'].tolist(),
+                              frame['InvestmentAmount'].to_numpy(dtype=float).tolist(), offset,
+                              self.period_state['previousClose'], volumes)
+
+    def _simulate(self, dates, prices, signals, investment, offset, previous_close=None, volumes=None):
+        n = len(prices)
+        fills = None
+        if not self.execution.is_default:
+            order_amount = investment if self.strategy_name == 'fixed_frequency' else self.buy_amount
+            fills = self.execution.fill_arrays(prices, volumes, order_amount, trading_days(dates), previous_close)
+        out_signal = np.array(signals)
+        out = {'cash': np.zeros(n), 'shares': np.zeros(n), 'invested': np.zeros(n)}
+        action = np.zeros(n, dtype=np.int8)
+        commission = np.zeros(n)
+        before = self.state
+        self.state = _simulation_kernel(prices, signals, investment, self.strategy_name == 'fixed_frequency',
+                                        self.buy_amount, self.commission_params, self.take_profit_pct,
+                                        self.stop_loss_pct, self.state, out_signal, out['cash'], out['shares'],
+                                        out['invested'], action, commission, self.execution, fills)
+        self.events.append(trade_events(dates, action, prices, out['cash'], out['shares'], commission,
+                                        before['cash'], before['shares'], offset))
+        portfolio_values = out['cash'] + out['shares'] * np.array(prices)
+        _update_stats(self.stats, portfolio_values.tolist())
+        return _rows(dates, prices, out_signal, investment, out, portfolio_values)
+
+
+def _initial_stats():
+    # 最后一根 K 线的市值、历史峰值、(当前 - 峰值) / 峰值 的最小值、最低市值
+    return {'portfolio_value': None, 'peak': None, 'min_drawdown': None, 'min_value': None}
+
+
+def _update_stats(stats, portfolio_values):
+    # 与 analysis.max_relative_drawdown 的计算顺序相同，保证结果逐位一致
+    peak = stats['peak']
+    min_drawdown = stats['min_drawdown']
+    min_value = stats['min_value']
+    for value in portfolio_values:
+        peak = value if peak is None or value > peak else peak
+        if peak > 0:
+            drawdown = (value - peak) / peak
+            min_drawdown = drawdown if min_drawdown is None or drawdown < min_drawdown else min_drawdown
+        min_value = value if min_value is None or value < min_value else min_value
+    stats['peak'] = peak
+    stats['min_drawdown'] = min_drawdown
+    stats['min_value'] = min_value
+    if portfolio_values:
+        stats['portfolio_value'] = portfolio_values[-1]
+
+
+def _rows(dates, prices, signals, investment, out, portfolio_values=()):
+    return pd.DataFrame({
+        'Close': prices,
+        'Signal': signals,
+        'InvestmentAmount': investment,
+        'cash_flow': out['cash'],
+        'shares_held': out['shares'],
+        'Portfolio_Value': portfolio_values if len(portfolio_values) else np.zeros(len(prices)),
+        'Cumulative_Investment': out['invested'],
+    }, index=pd.DatetimeIndex(dates, name='Date'))
+
+
+def _encode_bar(bar):
+    return None if bar is None else [bar[0].isoformat(), bar[1]]
+
+
+def _decode_bar(bar):
+    if bar is None:
+        return None
+    date, price = bar
+    if not isinstance(date, str):
+        raise TypeError("K 线日期必须是字符串")
+    return pd.Timestamp(date), _number(price)
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TypeError(f"{value!r} 不是数字")
+    return value
+
+
+def _number_or_none(value):
+    return None if value is None else _number(value)
+
+
+def _number_list(values):
+    if not isinstance(values, list):
+        raise TypeError("必须是数组")
+    return [_number(value) for value in values]
+
+
+def _restore_fields(saved, template):
+    """按 template 的字段从 saved 中取值 (忽略其他字段)；值为数字，template 中为 None 的字段也可以为 None。"""
+    if not isinstance(saved, dict):
+        raise TypeError("必须是对象")
+    fields = {}
+    for key, default in template.items():
+        value = saved[key]
+        if key == 'values':
+            fields[key] = value
+        elif default is None:
+            fields[key] = _number_or_none(value)
+        else:
+            fields[key] = _number(value)
+    return fields
+
+
+def checkpoint_key(config):
+    """检查点对应的配置: 除 endDate 外的规范化配置的哈希 (endDate 每次更新都会后移)。"""
+    payload = {k: v for k, v in normalize_config(config).items() if k not in ('endDate', 'checkpoint')}
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def run_incremental_backtest(config, checkpoint=None, progress=None):
+    """
+    从检查点继续回测到 config['endDate']，只读取和模拟检查点之后的 K 线。
+    检查点最后一根 K 线的收盘价与价格缓存中不一致 (历史数据被修正) 时从 startDate 重新计算。
+    返回 {'metrics', 'checkpoint', 'newBars', 'totalBars', 'lastDate', 'resumed'}。
+    """
+    _report(progress, 0, 'loading_data')
+    # 先创建引擎: 策略参数无效时在读取价格数据之前报错
+    fresh = IncrementalBacktest(config)
+    engine = IncrementalBacktest.from_checkpoint(checkpoint, config) if checkpoint else None
+    if engine is not None:
+        last_date, last_close = engine.last_bar
+        data, asset_name = get_price_data_and_name(config['ticker'], last_date.strftime('%Y-%m-%d'),
+                                                   config['endDate'])
+        close = data['Close'].to_numpy(dtype=float).reshape(len(data))
+        if data.empty or data.index[0] != last_date or close[0] != last_close:
+            engine = None
+    if engine is None:
+        data, asset_name = get_price_data_and_name(config['ticker'], config['startDate'], config['endDate'])
+        engine = fresh
+    config['assetName'] = asset_name
+
+    _report(progress, 50, 'simulating')
+    bars_before = engine.bars
+    engine.update(data)
+    _report(progress, 90, 'analyzing')
+    return {
+        'metrics': engine.metrics(),
+        'checkpoint': engine.checkpoint(),
+        'newBars': engine.bars - bars_before,
+        'totalBars': engine.bars,
+        'lastDate': engine.last_bar[0].strftime('%Y-%m-%d') if engine.last_bar else None,
+        'resumed': bars_before > 0,
+    }
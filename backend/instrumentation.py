@@ -0,0 +1,257 @@
+# backend/instrumentation.py
+"""
+回测流水线的分阶段计时。
+StageProfiler 与回测的 progress(百分比, 阶段名) 回调兼容：每次回调结束上一个阶段、开始下一个阶段，
+记录墙钟时间、CPU 时间 (当前线程) 和可选的内存峰值，并汇总到 Prometheus 文本格式的直方图中。
+内存峰值依赖 tracemalloc (开销较大)，只在请求了调试信息或设置 METRICS_TRACK_MEMORY 时开启；
+tracemalloc 是进程级的，并发请求时各阶段的内存峰值只是近似值。
+"""
+import cProfile
+import os
+import re
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = tuple(2 ** 20 * mb for mb in (1, 4, 16, 64, 256, 1024))
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+TRACK_MEMORY_ALWAYS = os.environ.get('METRICS_TRACK_MEMORY', '').lower() in ('1', 'true', 'yes')
+PROFILE_DIR = os.environ.get('PROFILE_DIR') or None  # 设置后才响应 X-Profile 请求头
+
+_tracemalloc_lock = threading.Lock()
+_tracemalloc_users = 0
+_tracemalloc_owned = False  # 由本模块开启的 tracemalloc 才由本模块关闭
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets, label_names):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        self._series = {}  # 标签值 -> [各桶计数, 总和, 次数]
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.setdefault(labels, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            for bound, bucket_count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{label_text},le="{_format_number(bound)}"}} {bucket_count}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {_format_number(total)}")
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, documentation, label_names):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            lines.append(f"{self.name}{{{label_text}}} {_format_number(value)}")
+        return lines
+
+
+stage_seconds = Histogram('backtest_stage_seconds', '各阶段的墙钟时间(秒)', SECONDS_BUCKETS, ('endpoint', 'stage'))
+stage_cpu_seconds = Histogram('backtest_stage_cpu_seconds', '各阶段的线程 CPU 时间(秒)', SECONDS_BUCKETS,
+                              ('endpoint', 'stage'))
+stage_peak_bytes = Histogram('backtest_stage_peak_bytes', '各阶段的内存分配峰值(字节，需开启内存跟踪)', BYTES_BUCKETS,
+                             ('endpoint', 'stage'))
+request_seconds = Histogram('backtest_request_seconds', '请求总耗时(秒)', SECONDS_BUCKETS, ('endpoint',))
+requests_total = Counter('backtest_requests_total', '按结果分类的请求数', ('endpoint', 'status'))
+METRICS = (stage_seconds, stage_cpu_seconds, stage_peak_bytes, request_seconds, requests_total)
+
+
+class StageProfiler:
+    """
+    用法:
+        with StageProfiler('backtest', track_memory=True) as profiler:
+            run_backtest(config, progress=profiler)
+            profiler.start('serializing')
+            ...
+        profiler.timings()
+    """
+
+    def __init__(self, endpoint, track_memory=False, first_stage='preparing'):
+        self.endpoint = endpoint
+        self.track_memory = track_memory or TRACK_MEMORY_ALWAYS
+        self.first_stage = first_stage
+        self.stages = []  # {'stage', 'wall', 'cpu', 'peak_bytes'}
+        self.failed = False
+        self._current = None
+        self._finished = False
+
+    def __enter__(self):
+        if self.track_memory:
+            _acquire_tracemalloc()
+        self.start(self.first_stage)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.failed = self.failed or exc_type is not None
+        self.finish()
+        return False
+
+    def __call__(self, percent, stage):
+        # 兼容 progress(百分比, 阶段名) 回调；同一阶段的重复汇报 (如参数扫描的进度) 不拆分
+        if self._current is None or self._current[0] != stage:
+            self.start(stage)
+
+    def start(self, stage):
+        if self._finished:
+            return
+        self._close_current()
+        if self.track_memory:
+            tracemalloc.reset_peak()
+        self._current = (stage, time.perf_counter(), time.thread_time())
+
+    def finish(self):
+        """结束计时并记入直方图；重复调用无效。"""
+        if self._finished:
+            return
+        self._close_current()
+        self._finished = True
+        if self.track_memory:
+            _release_tracemalloc()
+        for stage in self.stages:
+            labels = (self.endpoint, stage['stage'])
+            stage_seconds.observe(labels, stage['wall'])
+            stage_cpu_seconds.observe(labels, stage['cpu'])
+            if stage['peak_bytes'] is not None:
+                stage_peak_bytes.observe(labels, stage['peak_bytes'])
+        request_seconds.observe((self.endpoint,), self.total_seconds())
+        requests_total.inc((self.endpoint, 'error' if self.failed else 'ok'))
+
+    def total_seconds(self):
+        return sum(stage['wall'] for stage in self.stages)
+
+    def timings(self):
+        """响应中 debug.timings 的内容 (毫秒 / MB)。"""
+        return {
+            'totalMs': round(self.total_seconds() * 1e3, 3),
+            'cpuMs': round(sum(stage['cpu'] for stage in self.stages) * 1e3, 3),
+            'stages': [{
+                'stage': stage['stage'],
+                'wallMs': round(stage['wall'] * 1e3, 3),
+                'cpuMs': round(stage['cpu'] * 1e3, 3),
+                'peakMB': round(stage['peak_bytes'] / 2 ** 20, 3) if stage['peak_bytes'] is not None else None,
+            } for stage in self.stages],
+        }
+
+    def server_timing(self):
+        """Server-Timing 响应头 (浏览器开发者工具可直接显示)。"""
+        return ', '.join(f"{stage['stage']};dur={stage['wall'] * 1e3:.2f}" for stage in self.stages)
+
+    def _close_current(self):
+        if self._current is None:
+            return
+        stage, wall_start, cpu_start = self._current
+        peak_bytes = tracemalloc.get_traced_memory()[1] if self.track_memory else None
+        self.stages.append({'stage': stage, 'wall': time.perf_counter() - wall_start,
+                            'cpu': time.thread_time() - cpu_start, 'peak_bytes': peak_bytes})
+        self._current = None
+
+
+def chain_progress(*callbacks):
+    """把多个 progress 回调合并为一个，None 被忽略。"""
+    callbacks = [callback for callback in callbacks if callback is not None]
+
+    def progress(percent, stage):
+        for callback in callbacks:
+            callback(percent, stage)
+    return progress
+
+
+def render_metrics(extra_gauges=None):
+    """
+    Prometheus 文本格式。
+    extra_gauges: {前缀: stats 字典}，其中的数值作为 gauge 输出 (如价格缓存、结果缓存的统计)。
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for prefix, stats in (extra_gauges or {}).items():
+        for key, value in sorted(stats.items()):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                name = f"{prefix}_{_snake_case(key)}"
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {_format_number(value)}")
+    return '\n'.join(lines) + '\n'
+
+
+def start_request_profile():
+    """开始对当前线程做 cProfile；未配置 PROFILE_DIR 或已有分析器在运行时返回 None。"""
+    if PROFILE_DIR is None:
+        return None
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        return None
+    return profile
+
+
+def dump_request_profile(profile, endpoint):
+    """停止分析并写入 PROFILE_DIR，返回文件名 (可用 snakeviz / pstats 查看)。"""
+    profile.disable()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    filename = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{re.sub(r'[^0-9A-Za-z_-]', '_', endpoint)}.prof"
+    profile.dump_stats(os.path.join(PROFILE_DIR, filename))
+    return filename
+
+
+def _acquire_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        if _tracemalloc_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracemalloc_owned = True
+        _tracemalloc_users += 1
+
+
+def _release_tracemalloc():
+    global _tracemalloc_users, _tracemalloc_owned
+    with _tracemalloc_lock:
+        _tracemalloc_users -= 1
+        if _tracemalloc_users == 0 and _tracemalloc_owned:
+            tracemalloc.stop()
+            _tracemalloc_owned = False
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _snake_case(name):
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower()
@@ -0,0 +1,135 @@
+# backend/jobs.py
+"""
+异步任务队列。
+长时间的回测在有界线程池中执行，提交后立即返回任务 ID，前端轮询任务状态、进度和结果。
+完成的任务在 result_ttl 秒后被清除；相同的请求在执行期间只会运行一次。
+"""
+import copy
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+INTERNAL_ERROR_MESSAGE = '服务器内部发生错误，请稍后再试或联系管理员。'
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+
+
+class JobQueueFullError(Exception):
+    """排队中的任务已达上限。"""
+
+
+class JobManager:
+    def __init__(self, runners, max_workers=2, result_ttl=600, max_pending=100):
+        """
+        runners: {任务类型: fn(config, progress)}，progress(百分比, 阶段名) 用于汇报进度。
+        """
+        self.runners = runners
+        self.result_ttl = result_ttl
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='backtest-job')
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._active_by_key = {}
+
+    def submit(self, job_type, config):
+        """提交任务并返回任务快照；与执行中的任务完全相同的请求会直接返回已有任务。"""
+        if job_type not in self.runners:
+            raise ValueError(f"未知的任务类型: '{job_type}'")
+        key = job_key(job_type, config)
+        with self._lock:
+            self._evict_expired()
+            active_id = self._active_by_key.get(key)
+            if active_id is not None:
+                return self._snapshot(self._jobs[active_id])
+            pending = sum(1 for job in self._jobs.values() if job['status'] in (QUEUED, RUNNING))
+            if pending >= self.max_pending:
+                raise JobQueueFullError("任务队列已满，请稍后再试。")
+            job = {
+                'id': uuid.uuid4().hex, 'type': job_type, 'key': key, 'status': QUEUED,
+                'progress': 0, 'stage': 'queued', 'result': None, 'error': None, 'error_kind': None,
+                'created_at': time.time(), 'started_at': None, 'finished_at': None,
+            }
+            self._jobs[job['id']] = job
+            self._active_by_key[key] = job['id']
+        self._executor.submit(self._run, job['id'], copy.deepcopy(config))
+        return self._snapshot(job)
+
+    def get(self, job_id, include_result=True):
+        with self._lock:
+            self._evict_expired()
+            job = self._jobs.get(job_id)
+            return self._snapshot(job, include_result) if job else None
+
+    def stats(self):
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, SUCCEEDED: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job['status']] += 1
+            return counts
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, job_id, config):
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(status=RUNNING, stage='running', started_at=time.time())
+
+        def progress(percent, stage):
+            with self._lock:
+                job['progress'] = max(job['progress'], min(int(percent), 99))
+                job['stage'] = stage
+
+        try:
+            result = self.runners[job['type']](config, progress)
+        except ValueError as e:
+            # 配置或数据问题，可直接提示给用户
+            with self._lock:
+                job.update(status=FAILED, stage='failed', error=str(e), error_kind='invalid')
+        except Exception as e:
+            logger.error(f"任务 {job_id} 发生未预料的错误: {e}", exc_info=True)
+            with self._lock:
+                job.update(status=FAILED, stage='failed', error=INTERNAL_ERROR_MESSAGE, error_kind='internal')
+        else:
+            with self._lock:
+                job.update(status=SUCCEEDED, stage='done', progress=100, result=result)
+        finally:
+            with self._lock:
+                job['finished_at'] = time.time()
+                if self._active_by_key.get(job['key']) == job_id:
+                    del self._active_by_key[job['key']]
+
+    def _evict_expired(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job['finished_at'] is not None and now - job['finished_at'] > self.result_ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def _snapshot(self, job, include_result=True):
+        snapshot = {
+            'id': job['id'], 'type': job['type'], 'status': job['status'],
+            'progress': job['progress'], 'stage': job['stage'],
+            'createdAt': job['created_at'], 'startedAt': job['started_at'], 'finishedAt': job['finished_at'],
+        }
+        if job['status'] == FAILED:
+            snapshot['error'] = job['error']
+            snapshot['errorKind'] = job['error_kind']
+        if include_result and job['status'] == SUCCEEDED:
+            snapshot['result'] = job['result']
+        return snapshot
+
+
+def job_key(job_type, config):
+    """任务去重键: 任务类型加规范化 (键排序) 后的配置 JSON 的哈希。"""
+    canonical = json.dumps(config, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(f"{job_type}:{canonical}".encode('utf-8')).hexdigest()
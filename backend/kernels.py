@@ -0,0 +1,228 @@
+# backend/kernels.py
+"""
+逐根 K 线的计算内核: 持仓/止盈止损状态机，以及路径依赖策略 (如移动止损) 的信号。
+内核按 Numba nopython 模式的约束编写: 只使用数值标量和一维数组，跨 K 线的状态保存在数组中。
+安装了 numba (可选依赖) 时用 njit 编译为本地代码 (nogil，可在多个线程中并行运行)；未安装或设置 BACKTEST_JIT=0 时以纯 Python 运行，
+此时只读输入先转换为 list (纯 Python 按下标读取 list 比读取 ndarray 快得多)，两种方式的结果逐位相同。
+"""
+import functools
+import inspect
+import os
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:  # numba 是可选依赖
+    numba = None
+
+JIT_ENABLED = numba is not None and os.environ.get('BACKTEST_JIT', '1').lower() not in ('0', 'false', 'no')
+
+# position_kernel 的状态数组: 现金、持股数、持仓均价 (NaN 为空仓)、上一原始信号、累计投入、首笔投入金额、
+# 未成交的买单金额 (涨停未买入，之后的 K 线继续尝试)、最近一次买入的交易日序号 (NaN 为没有买入)
+STATE_SIZE = 8
+# position_kernel 输出的每根 K 线的成交类型: 无成交、买入、按信号卖出、止盈卖出、止损卖出
+TRADE_NONE = 0
+TRADE_BUY = 1
+TRADE_SIGNAL_SELL = 2
+TRADE_TAKE_PROFIT = 3
+TRADE_STOP_LOSS = 4
+
+
+class Kernel:
+    """
+    jit 装饰后的内核。
+    inputs: 只读数组参数名；states: 调用方传入 list、内核原地修改的状态参数名。其余数组参数为预先分配的输出。
+    """
+
+    def __init__(self, function, inputs, states):
+        functools.update_wrapper(self, function)
+        self.python = function
+        self.compiled = numba.njit(cache=True, nogil=True)(function) if JIT_ENABLED else None
+        names = list(inspect.signature(function).parameters)
+        self._inputs = [names.index(name) for name in inputs]
+        self._states = [names.index(name) for name in states]
+
+    def __call__(self, *args):
+        args = list(args)
+        if self.compiled is None:
+            for i in self._inputs:
+                if isinstance(args[i], np.ndarray):
+                    args[i] = args[i].tolist()
+            return self.python(*args)
+
+        for i in self._inputs:
+            args[i] = np.ascontiguousarray(args[i])
+        states = {i: args[i] for i in self._states}
+        for i in self._states:
+            args[i] = np.array(states[i], dtype=np.float64)
+        result = self.compiled(*args)
+        for i, values in states.items():
+            values[:] = args[i].tolist()
+        return result
+
+
+def jit(inputs=(), states=()):
+    def decorator(function):
+        return Kernel(function, inputs, states)
+    return decorator
+
+
+@jit(inputs=('close', 'signal', 'investment', 'buy_price', 'sell_price', 'buy_ok', 'sell_ok', 'day'),
+     states=('state',))
+def position_kernel(close, signal, investment, buy_price, sell_price, buy_ok, sell_ok, day, is_fixed_frequency,
+                    buy_amount, percentage_commission, comm_rate, comm_min_fee, comm_fee, lot_size, stamp_duty,
+                    transfer_fee, t_plus_one, take_profit, stop_loss, state, out_signal, out_cash, out_shares,
+                    out_invested, out_action, out_commission):
+    """
+    持仓/现金状态机。take_profit/stop_loss 为 NaN 表示不启用 (与 NaN 的比较结果恒为 False)。
+    buy_price/sell_price/buy_ok/sell_ok/day 为 execution.fill_arrays 预先算好的成交价、能否成交和交易日序号；
+    lot_size > 0 时买入股数向下取整到整手，卖出收取 stamp_duty，买卖都收取 transfer_fee。
+    涨停未能买入的订单在之后的 K 线继续尝试 (按信号买入的订单在出现卖出信号时取消)；
+    跌停或 T+1 不能卖出时持仓保留，卖出信号或止盈止损条件在之后的 K 线重新判断。
+    state 为起始状态 (见 STATE_SIZE)，模拟结束时原地更新。
+    out_action/out_commission: 每根 K 线实际成交的类型 (TRADE_*) 和费用 (佣金及税费)，供 trade_ledger 生成成交记录。
+    """
+    cash = state[0]
+    shares = state[1]
+    entry_price = state[2]
+    last_signal = state[3]
+    invested = state[4]
+    first_investment = state[5]
+    pending = state[6]
+    last_buy_day = state[7]
+
+    for i in range(len(close)):
+        price = close[i]
+        original_signal = signal[i]
+        actual_signal = original_signal
+        exit_reason = TRADE_SIGNAL_SELL
+        out_action[i] = TRADE_NONE
+        out_commission[i] = 0.0
+
+        # SL/TP Logic (entry_price == entry_price 即不是 NaN)
+        if shares > 0 and entry_price == entry_price:
+            if price >= entry_price * (1 + take_profit):
+                actual_signal = -1
+                exit_reason = TRADE_TAKE_PROFIT
+            elif price <= entry_price * (1 - stop_loss):
+                actual_signal = -1
+                exit_reason = TRADE_STOP_LOSS
+        if actual_signal == -1 and original_signal != -1:
+            out_signal[i] = -1
+
+        amount = 0.0
+        if is_fixed_frequency:
+            if original_signal == 1 and investment[i] > 0:
+                amount = investment[i]
+            amount += pending
+        elif actual_signal == 1 and last_signal <= 0:
+            amount = buy_amount
+        elif actual_signal == -1:
+            pending = 0.0
+            # T+1: 最近一次买入的当天不能卖出 (last_buy_day 为 NaN 时比较结果为 False)
+            if shares > 0 and sell_ok[i] and not (t_plus_one and day[i] <= last_buy_day):  # Sell
+                trade_value = shares * sell_price[i]
+                if percentage_commission:
+                    commission = max(trade_value * comm_rate, comm_min_fee)
+                else:
+                    commission = comm_fee
+                commission += trade_value * (stamp_duty + transfer_fee)
+                cash += trade_value - commission
+                shares = 0.0
+                entry_price = np.nan
+                out_action[i] = exit_reason
+                out_commission[i] = commission
+        elif pending > 0:
+            amount = pending
+
+        if amount > 0:  # Buy
+            pending = 0.0
+            if not buy_ok[i]:
+                pending = amount
+            else:
+                fill_price = buy_price[i]
+                if percentage_commission:
+                    commission = max(amount * comm_rate, comm_min_fee)
+                else:
+                    commission = comm_fee
+                commission += amount * transfer_fee
+                spent = amount
+                if lot_size > 0:
+                    # 向下取整到整手，按实际成交额重新计算费用；不足一手的金额不投入
+                    shares_to_buy = np.floor((amount - commission) / fill_price / lot_size) * lot_size
+                    notional = shares_to_buy * fill_price
+                    if percentage_commission:
+                        commission = max(notional * comm_rate, comm_min_fee)
+                    else:
+                        commission = comm_fee
+                    commission += notional * transfer_fee
+                    spent = notional + commission
+                else:
+                    shares_to_buy = (amount - commission) / fill_price
+                if amount > commission and shares_to_buy > 0:
+                    if shares > 0 and entry_price == entry_price:
+                        total_shares_after_buy = shares + shares_to_buy
+                        new_total_value = shares * entry_price + shares_to_buy * fill_price
+                        entry_price = (new_total_value / total_shares_after_buy if total_shares_after_buy > 0
+                                       else fill_price)
+                    else:
+                        entry_price = fill_price
+                    shares += shares_to_buy
+                    cash -= spent
+                    invested += spent
+                    if first_investment == 0:
+                        first_investment = spent
+                    last_buy_day = day[i]
+                    out_action[i] = TRADE_BUY
+                    out_commission[i] = commission
+
+        out_cash[i] = cash
+        out_shares[i] = shares
+        out_invested[i] = invested
+        last_signal = original_signal
+
+    state[0] = cash
+    state[1] = shares
+    state[2] = entry_price
+    state[3] = last_signal
+    state[4] = invested
+    state[5] = first_investment
+    state[6] = pending
+    state[7] = last_buy_day
+
+
+@jit(inputs=('close',))
+def trailing_stop_kernel(close, period, trail, out_signal):
+    """
+    均线突破 + 移动止损: 收盘价上穿 period 日均线时买入，持仓期间跟踪最高收盘价，
+    从最高价回落超过 trail 或收盘价跌破均线时卖出；卖出后须再次上穿均线才重新买入。
+    持仓期间信号为 1，卖出当日为 -1，空仓观望为 0。
+    """
+    window_sum = 0.0
+    holding = False
+    previous_above = False
+    peak = 0.0
+    for i in range(len(close)):
+        price = close[i]
+        window_sum += price
+        if i >= period:
+            window_sum -= close[i - period]
+        if i < period - 1:
+            out_signal[i] = 0
+            continue
+        above = price > window_sum / period
+        if holding:
+            peak = max(peak, price)
+            if price <= peak * (1 - trail) or not above:
+                holding = False
+                out_signal[i] = -1
+            else:
+                out_signal[i] = 1
+        elif above and not previous_above and i >= period:
+            holding = True
+            peak = price
+            out_signal[i] = 1
+        else:
+            out_signal[i] = 0
+        previous_above = above
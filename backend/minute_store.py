@@ -0,0 +1,243 @@
+# backend/minute_store.py
+"""
+分钟线列式存储。
+分钟线每个代码几年就有数百万行，不能像日线那样整段放进 SQLite 再读成一个 DataFrame。
+本存储按自然月分块，每块每列一个 .npy 文件 (时间戳 int64 纳秒，其余列 float64)，读取时以内存映射方式
+逐块返回，只映射需要的列；回测按块流式处理，内存占用只与块大小有关。
+
+目录结构:
+  <root>/<file>/manifest.json           {ticker, seq, chunks: [{month, dir, start, end, bars}]}，按时间升序
+  <root>/<file>/<month>.<seq>/Time.npy  datetime64[ns]，块内升序且不重复
+  <root>/<file>/<month>.<seq>/Close.npy 以及 Open/High/Low/Volume (数据源提供时)
+写入某个月时生成新的块目录，再原子替换 manifest，读取方不会看到写了一半的块；同一代码同一时间只有一个写入进程。
+用法 (在 backend 目录下):
+  python minute_store.py import 600000 bars.csv                                   # 导入 CSV (时间列 + OHLCV 列)
+  python minute_store.py fetch 600000 --start "2024-01-02 09:30" --end "2024-01-31 15:00"  # 从 akshare 获取
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from price_store import StoreLockedError
+
+MANIFEST = 'manifest.json'
+WRITER_LOCK = 'writer.lock'
+TIME_COLUMN = 'Time'
+COLUMNS = ('Open', 'High', 'Low', 'Close', 'Volume')
+# 导入 CSV 时每次读取的行数
+IMPORT_CHUNK_ROWS = 200000
+
+
+class MinuteBarStore:
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self._manifests = {}  # 代码 -> ((inode, mtime_ns), manifest)
+
+    def iter_frames(self, ticker, start, end, columns=('Close',)):
+        """
+        按时间顺序逐块返回 [start, end) 内的 DataFrame (Date 索引，只含 columns 列)，数据是内存映射文件的只读视图。
+        start/end 为 pd.Timestamp。读取期间某块被改写时从该块重新读取最新版本。
+        """
+        cursor = start
+        retries = 0
+        while cursor < end:
+            chunk = next((c for c in self._chunks(ticker) if c['end'] >= cursor.value and c['start'] < end.value),
+                         None)
+            if chunk is None:
+                return
+            try:
+                frame = self._load(ticker, chunk, columns)
+            except OSError:
+                # 块已被替换: 重新读取 manifest
+                retries += 1
+                if retries > 3:
+                    raise
+                with self._lock:
+                    self._manifests.pop(ticker, None)
+                continue
+            retries = 0
+            times = frame.index.asi8
+            lo = np.searchsorted(times, cursor.value, side='left')
+            hi = np.searchsorted(times, end.value, side='left')
+            if hi > lo:
+                yield frame.iloc[lo:hi]
+            cursor = pd.Timestamp(chunk['end'] + 1)
+
+    def info(self, ticker):
+        """{bars, chunks, firstTime, lastTime}，代码不存在时返回 None。"""
+        chunks = self._chunks(ticker)
+        if not chunks:
+            return None
+        return {'bars': sum(c['bars'] for c in chunks), 'chunks': len(chunks),
+                'firstTime': pd.Timestamp(chunks[0]['start']).isoformat(),
+                'lastTime': pd.Timestamp(chunks[-1]['end']).isoformat()}
+
+    def _chunks(self, ticker):
+        path = os.path.join(self._ticker_dir(ticker), MANIFEST)
+        # manifest 被原子替换后 inode 会变化
+        try:
+            status = os.stat(path)
+        except OSError:
+            return []
+        stamp = (status.st_ino, status.st_mtime_ns)
+        with self._lock:
+            cached = self._manifests.get(ticker)
+            if cached is not None and cached[0] == stamp:
+                return cached[1]['chunks']
+        manifest = _read_manifest(path)
+        with self._lock:
+            self._manifests[ticker] = (stamp, manifest)
+        return manifest['chunks']
+
+    def _load(self, ticker, chunk, columns):
+        directory = os.path.join(self._ticker_dir(ticker), chunk['dir'])
+        times = np.load(os.path.join(directory, TIME_COLUMN + '.npy'), mmap_mode='r')
+        data = {}
+        for column in columns:
+            try:
+                data[column] = np.load(os.path.join(directory, column + '.npy'), mmap_mode='r')
+            except FileNotFoundError:
+                if column == 'Close' or not os.path.isdir(directory):
+                    raise
+                data[column] = np.full(len(times), np.nan)  # 数据源未提供该列
+        return pd.DataFrame(data, index=pd.DatetimeIndex(times, name='Date'), copy=False)
+
+    def _ticker_dir(self, ticker):
+        # 代码中可能有 ^ . 等字符，目录名用哈希
+        return os.path.join(self.root, hashlib.sha1(ticker.encode('utf-8')).hexdigest()[:16])
+
+    # ---- 写入 ----
+
+    @contextmanager
+    def writer_lock(self, ticker):
+        import fcntl
+        directory = self._ticker_dir(ticker)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, WRITER_LOCK), 'w') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                raise StoreLockedError(f"代码 '{ticker}' 的分钟线正由其他进程写入。")
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def write(self, ticker, df):
+        """
+        写入分钟线 (以时间为索引，至少含 Close 列)。与已有数据时间相同的行以新数据为准。
+        只改写涉及的月份，返回写入的行数。
+        """
+        df = _normalize_frame(df)
+        if df.empty:
+            return 0
+        directory = self._ticker_dir(ticker)
+        with self.writer_lock(ticker):
+            path = os.path.join(directory, MANIFEST)
+            manifest = _read_manifest(path) if os.path.exists(path) else {'ticker': ticker, 'seq': 0, 'chunks': []}
+            chunks = {chunk['month']: chunk for chunk in manifest['chunks']}
+            replaced = []
+            months = df.index.to_period('M').astype(str)
+            for month, part in df.groupby(months, sort=True):
+                old = chunks.get(month)
+                if old is not None:
+                    old_columns = os.listdir(os.path.join(directory, old['dir']))
+                    existing = self._load(ticker, old, [c for c in COLUMNS
+                                                        if c in part.columns or c + '.npy' in old_columns])
+                    part = pd.concat([existing[~existing.index.isin(part.index)], part]).sort_index()
+                    replaced.append(old['dir'])
+                manifest['seq'] += 1
+                chunk_dir = f"{month}.{manifest['seq']}"
+                os.makedirs(os.path.join(directory, chunk_dir))
+                np.save(os.path.join(directory, chunk_dir, TIME_COLUMN + '.npy'),
+                        part.index.to_numpy(dtype='datetime64[ns]'))
+                for column in part.columns:
+                    np.save(os.path.join(directory, chunk_dir, column + '.npy'), part[column].to_numpy(dtype=float))
+                chunks[month] = {'month': month, 'dir': chunk_dir, 'start': int(part.index[0].value),
+                                 'end': int(part.index[-1].value), 'bars': len(part)}
+            manifest['chunks'] = [chunks[month] for month in sorted(chunks)]
+            temporary = os.path.join(directory, f".{MANIFEST}.{os.getpid()}")
+            with open(temporary, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False)
+            os.replace(temporary, path)
+            # 已映射旧块的读取方不受删除影响，尚未打开的会重新读取 manifest
+            for chunk_dir in replaced:
+                shutil.rmtree(os.path.join(directory, chunk_dir), ignore_errors=True)
+        return len(df)
+
+
+def _normalize_frame(df):
+    df = df.rename(columns={column: column.capitalize() for column in df.columns if isinstance(column, str)})
+    if 'Close' not in df.columns:
+        raise ValueError("分钟线数据缺少 Close 列。")
+    df = df[[column for column in COLUMNS if column in df.columns]]
+    df.index = pd.DatetimeIndex(df.index).tz_localize(None)
+    df = df[~df.index.isna() & df['Close'].notna().to_numpy()]
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index()
+    return df[~df.index.duplicated(keep='last')]
+
+
+def _read_manifest(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def parse_time_bound(value, end=False):
+    """'YYYY-MM-DD' 或带时间的字符串 -> pd.Timestamp；end=True 时返回不含的上界 (只有日期时为次日零点)。"""
+    try:
+        timestamp = pd.Timestamp(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"无效的时间: '{value}'")
+    if not end:
+        return timestamp
+    return timestamp + pd.Timedelta(days=1) if len(str(value).strip()) <= 10 else timestamp + pd.Timedelta(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='导入分钟线到列式存储')
+    parser.add_argument('--store', default=None, help='存储目录，默认为 MINUTE_STORE_DIR')
+    commands = parser.add_subparsers(dest='command', required=True)
+    csv_parser = commands.add_parser('import', help='导入 CSV 文件')
+    csv_parser.add_argument('ticker')
+    csv_parser.add_argument('files', nargs='+')
+    csv_parser.add_argument('--time-column', default=None, help='时间列名，默认为第一列')
+    fetch_parser = commands.add_parser('fetch', help='从 akshare 获取')
+    fetch_parser.add_argument('ticker')
+    fetch_parser.add_argument('--start', required=True)
+    fetch_parser.add_argument('--end', required=True)
+    fetch_parser.add_argument('--period', default='1', help="分钟周期: '1', '5', '15', '30', '60'")
+    args = parser.parse_args(argv)
+
+    from utils import MINUTE_STORE_DIR
+    store = MinuteBarStore(args.store or MINUTE_STORE_DIR)
+    try:
+        if args.command == 'import':
+            total = 0
+            for file in args.files:
+                # 分段读取，大文件也只占用 IMPORT_CHUNK_ROWS 行的内存
+                for part in pd.read_csv(file, chunksize=IMPORT_CHUNK_ROWS):
+                    time_column = args.time_column or part.columns[0]
+                    total += store.write(args.ticker, part.set_index(pd.to_datetime(part.pop(time_column))))
+            print(f"已导入 {total} 根分钟线: {store.info(args.ticker)}")
+        else:
+            from utils import fetch_minute_bars_from_akshare
+            df = fetch_minute_bars_from_akshare(args.ticker, args.start, args.end, args.period)
+            print(f"已写入 {store.write(args.ticker, df)} 根分钟线: {store.info(args.ticker)}")
+    except (StoreLockedError, ValueError) as e:
+        print(e)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+# backend/optimizer.py
+"""
+参数扫描 (网格搜索)。
+价格数据只加载一次，通过进程池初始化参数传给每个工作进程 (每个进程一份，而不是每个任务一份)，
+各参数组合并行回测后按指标排序返回。
+"""
+import copy
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+import pandas as pd
+
+from utils import get_price_data_and_names
+from backtest_engine import run_backtest_on_data, run_backtest_matrix
+from strategies import get_strategy, has_signal_matrix
+
+# 这些参数属于回测配置的顶层，其余参数都视为策略参数
+TOP_LEVEL_PARAMS = ('takeProfit', 'stopLoss')
+SORTABLE_METRICS = ('totalReturn', 'annualizedReturn', 'maxDrawdown')
+MAX_COMBINATIONS = 10000
+# 支持信号矩阵的策略每个任务一次模拟多少组参数
+MATRIX_BATCH_SIZE = 64
+
+_worker_data = {}
+
+
+def expand_param_grid(param_grid):
+    """
+    把参数范围展开为参数组合列表。
+    每个参数可以是取值列表，或 {'start': a, 'stop': b, 'step': c} (包含 stop)。
+    """
+    if not param_grid:
+        raise ValueError("参数网格不能为空。")
+    names = []
+    value_lists = []
+    for name, spec in param_grid.items():
+        if isinstance(spec, dict):
+            start, stop, step = spec.get('start'), spec.get('stop'), spec.get('step', 1)
+            if start is None or stop is None or not step or step <= 0:
+                raise ValueError(f"参数 '{name}' 的范围配置无效。")
+            values = np.arange(start, stop + step / 2, step).round(10).tolist()
+            if all(isinstance(v, int) for v in (start, stop, step)):
+                values = [int(v) for v in values]
+        elif isinstance(spec, (list, tuple)):
+            values = list(spec)
+        else:
+            values = [spec]
+        if not values:
+            raise ValueError(f"参数 '{name}' 没有可选值。")
+        names.append(name)
+        value_lists.append(values)
+
+    total = int(np.prod([len(v) for v in value_lists]))
+    if total > MAX_COMBINATIONS:
+        raise ValueError(f"参数组合数量 {total} 超过上限 {MAX_COMBINATIONS}。")
+    return [dict(zip(names, combo)) for combo in itertools.product(*value_lists)]
+
+
+def apply_params(config, params):
+    """返回应用了一组参数的新配置。"""
+    new_config = copy.deepcopy(config)
+    strategy_params = new_config['strategy'].setdefault('params', {})
+    for name, value in params.items():
+        if name in TOP_LEVEL_PARAMS:
+            new_config[name] = value
+        else:
+            strategy_params[name] = value
+    return new_config
+
+
+def run_optimization(config, param_grid, max_workers=None, time_budget=None, sort_by='totalReturn', top=None,
+                     progress=None):
+    """
+    对 param_grid 中的所有组合运行回测，返回按 sort_by 降序排列的指标表。
+    max_workers: 进程数，1 表示在当前进程内顺序执行。
+    time_budget: 整次扫描的秒数上限，超时后未完成的组合被放弃，已完成的结果照常返回。
+    progress: 可选回调 progress(百分比, 阶段名)。
+    """
+    if sort_by not in SORTABLE_METRICS:
+        raise ValueError(f"不支持的排序指标: '{sort_by}'")
+    combinations = expand_param_grid(param_grid)
+    started = time.perf_counter()
+
+    if progress is not None:
+        progress(0, 'loading_data')
+    benchmark_ticker = config.get('benchmarkTicker')
+    loaded = get_price_data_and_names([config['ticker']] + ([benchmark_ticker] if benchmark_ticker else []),
+                                      config['startDate'], config['endDate'])
+    data, asset_name = loaded[0]
+    config['assetName'] = asset_name
+    benchmark_data_df = None
+    if benchmark_ticker:
+        benchmark_data_df, benchmark_name = loaded[1]
+        config['benchmarkAssetName'] = benchmark_name
+
+    deadline = started + time_budget if time_budget else None
+    max_workers = max_workers or os.cpu_count() or 1
+    batch_size = MATRIX_BATCH_SIZE if has_signal_matrix(config['strategy']['name']) else 1
+    batches = [combinations[i:i + batch_size] for i in range(0, len(combinations), batch_size)]
+    rows = []
+    timed_out = False
+
+    if max_workers == 1:
+        _init_worker(config, _pack_frame(data), _pack_frame(benchmark_data_df))
+        for batch in batches:
+            if deadline is not None and time.perf_counter() > deadline:
+                timed_out = True
+                break
+            rows.extend(_evaluate_batch(batch))
+            _report_sweep(progress, len(rows), len(combinations))
+    else:
+        executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                       initargs=(config, _pack_frame(data), _pack_frame(benchmark_data_df)))
+        try:
+            pending = {executor.submit(_evaluate_batch, batch) for batch in batches}
+            while pending:
+                timeout = None if deadline is None else max(deadline - time.perf_counter(), 0)
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    rows.extend(future.result())
+                _report_sweep(progress, len(rows), len(combinations))
+                if pending and deadline is not None and time.perf_counter() >= deadline:
+                    timed_out = True
+                    break
+        finally:
+            executor.shutdown(wait=not timed_out, cancel_futures=True)
+
+    ranked = [row for row in rows if 'error' not in row]
+    ranked.sort(key=lambda row: row['metrics'][sort_by], reverse=True)
+    return {
+        'results': ranked[:top] if top else ranked,
+        'errors': [row for row in rows if 'error' in row],
+        'evaluated': len(rows),
+        'total': len(combinations),
+        'timedOut': timed_out,
+        'elapsedSeconds': round(time.perf_counter() - started, 3),
+        'sortBy': sort_by,
+    }
+
+
+def _report_sweep(progress, evaluated, total):
+    if progress is not None:
+        progress(10 + 90 * evaluated / total, 'evaluating')
+
+
+def _pack_frame(df):
+    # 只传递日期(int64 纳秒)和收盘价两个数组，避免在进程间序列化整个 DataFrame
+    if df is None:
+        return None
+    close = df['Close']
+    if isinstance(close, pd.DataFrame):
+        close = close.iloc[:, 0]
+    return pd.DatetimeIndex(df.index).asi8.copy(), close.to_numpy(dtype=float)
+
+
+def _unpack_frame(packed):
+    if packed is None:
+        return None
+    dates, close = packed
+    return pd.DataFrame({'Close': close}, index=pd.DatetimeIndex(dates, name='Date'))
+
+
+def _init_worker(config, packed_data, packed_benchmark):
+    _worker_data['config'] = config
+    _worker_data['data'] = _unpack_frame(packed_data)
+    _worker_data['benchmark'] = _unpack_frame(packed_benchmark)
+
+
+def _evaluate_batch(param_sets):
+    # 支持信号矩阵的策略一次模拟整批参数。参数校验不通过的组合不进入批量模拟，逐组回测后记入 errors；
+    # 批量失败 (如某组周期超过数据长度) 时整批逐组回测以定位出错的组合
+    rows = {}
+    if len(param_sets) > 1:
+        valid = [i for i, params in enumerate(param_sets) if _is_valid(params)]
+        if valid:
+            try:
+                metrics = run_backtest_matrix(_worker_data['config'], _worker_data['data'],
+                                              [param_sets[i] for i in valid])
+                rows = {i: {'params': param_sets[i], 'metrics': m} for i, m in zip(valid, metrics)}
+            except ValueError:
+                pass
+    return [rows[i] if i in rows else _evaluate(params) for i, params in enumerate(param_sets)]
+
+
+def _is_valid(params):
+    config = apply_params(_worker_data['config'], params)
+    try:
+        get_strategy(config['strategy']['name']).validate(config['strategy'].get('params', {}))
+    except ValueError:
+        return False
+    return True
+
+
+def _evaluate(params):
+    config = apply_params(_worker_data['config'], params)
+    try:
+        result = run_backtest_on_data(config, _worker_data['data'], _worker_data['benchmark'], include_charts=False)
+    except ValueError as e:
+        return {'params': params, 'error': str(e)}
+    return {'params': params, 'metrics': result['metrics']}
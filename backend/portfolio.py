@@ -0,0 +1,190 @@
+# backend/portfolio.py
+"""
+多资产组合回测。
+所有成分资产先对齐成一个 (交易日 x 资产) 的收盘价矩阵，按目标权重建仓并定期再平衡。
+两次再平衡之间持仓不变，组合市值对整个矩阵一次算出，不对单个资产做 Python 循环。
+"""
+import numpy as np
+import pandas as pd
+
+from utils import get_price_data_and_names
+from backtest_engine import _commission_params, _commission_vector, _add_market_benchmark, _report
+from analysis import analyze_performance
+from execution import ExecutionModel
+
+# 再平衡频率: 每个周期的第一个交易日再平衡；None 表示只在期初建仓
+REBALANCE_FREQUENCIES = ('W', 'M', 'Q', 'Y')
+DEFAULT_PORTFOLIO_CAPITAL = 100000.0
+MAX_PORTFOLIO_ASSETS = 500
+# 再平衡时迭代求解 "目标市值 + 佣金 = 组合市值"：按比例收费时每次迭代误差缩小为原来的费率倍，
+# 剩余现金不超过组合市值的 SIZING_TOLERANCE 倍时停止
+MAX_SIZING_ITERATIONS = 50
+SIZING_TOLERANCE = 1e-9
+
+
+def run_portfolio_backtest(config, progress=None):
+    """
+    config:
+      assets: [{'ticker': '510300', 'weight': 0.6}, ...]，权重按比例归一化，缺省为等权
+      rebalance: 'W'/'M'/'Q'/'Y' 或 None，initialCapital: 期初资金，commission/benchmarkTicker 同单资产回测
+    progress: 可选回调 progress(百分比, 阶段名)。
+    """
+    assets = config.get('assets') or []
+    if not assets:
+        raise ValueError("组合回测需要至少一个资产。")
+    if len(assets) > MAX_PORTFOLIO_ASSETS:
+        raise ValueError(f"组合资产数量不能超过 {MAX_PORTFOLIO_ASSETS}。")
+    tickers = [str(asset['ticker']).strip().upper() for asset in assets]
+    if len(set(tickers)) != len(tickers):
+        raise ValueError("组合中存在重复的资产代码。")
+
+    rebalance = config.get('rebalance') or None
+    if rebalance is not None and rebalance not in REBALANCE_FREQUENCIES:
+        raise ValueError(f"不支持的再平衡频率: '{rebalance}'")
+    weights = normalize_weights([asset.get('weight') for asset in assets])
+    if not ExecutionModel.from_config(config).is_default:
+        raise ValueError("组合回测不支持成交模型 (execution)。")
+    initial_capital = float(config.get('initialCapital') or 0) or DEFAULT_PORTFOLIO_CAPITAL
+
+    _report(progress, 0, 'loading_data')
+    benchmark_ticker = config.get('benchmarkTicker')
+    dates, prices, names, benchmark = load_price_matrix(tickers, config['startDate'], config['endDate'],
+                                                        benchmark_ticker)
+    _report(progress, 50, 'simulating')
+    mask = rebalance_mask(dates, rebalance)
+    result = simulate_portfolio(prices, weights, mask, initial_capital, config.get('commission', {}))
+
+    data = pd.DataFrame(index=dates)
+    data['Close'] = result['nav']
+    data['Signal'] = mask.astype(int)
+    data['Portfolio_Value'] = result['nav'] - initial_capital  # 与单资产回测一致: 相对期初资金的盈亏
+    data['Cumulative_Investment'] = initial_capital
+    data['Asset_Benchmark_Value'] = result['buy_and_hold_nav']  # 不再平衡的同权重组合
+
+    benchmark_data_df = None
+    if benchmark is not None:
+        benchmark_data_df, config['benchmarkAssetName'] = benchmark
+    data = _add_market_benchmark(data, benchmark_data_df, initial_capital, initial_capital)
+
+    config['assetName'] = f"组合 ({len(tickers)} 个资产)"
+    config['first_investment_amount'] = initial_capital
+    _report(progress, 80, 'analyzing')
+    results = analyze_performance(data, initial_capital, config)
+
+    final_values = result['final_holdings'] * prices[-1]
+    final_weights = final_values / result['nav'][-1] if result['nav'][-1] else np.zeros(len(tickers))
+    results['portfolio'] = {
+        'assets': [{'ticker': ticker, 'name': names[j], 'targetWeight': round(float(weights[j]), 4),
+                    'finalWeight': round(float(final_weights[j]), 4)} for j, ticker in enumerate(tickers)],
+        'rebalanceCount': int(mask.sum()),
+        'totalCommission': round(float(result['commissions'].sum()), 2),
+        'turnover': round(float(result['turnover']), 4),
+    }
+    return results
+
+
+def normalize_weights(weights):
+    if all(w is None for w in weights):
+        return np.full(len(weights), 1.0 / len(weights))
+    weights = np.array([0.0 if w is None else float(w) for w in weights])
+    if (weights < 0).any() or weights.sum() <= 0:
+        raise ValueError("组合权重必须为非负数且不能全为 0。")
+    return weights / weights.sum()
+
+
+def load_price_matrix(tickers, start_date, end_date, benchmark_ticker=None):
+    """
+    返回 (日期索引, 收盘价矩阵, 名称列表, 基准的 (df, 名称) 或 None)。各资产和基准在同一批中并发获取。
+    停牌日沿用上一收盘价；矩阵从所有资产都有价格的第一天开始。
+    """
+    loaded = get_price_data_and_names(tickers + ([benchmark_ticker] if benchmark_ticker else []), start_date,
+                                      end_date)
+    benchmark = loaded.pop() if benchmark_ticker else None
+    closes = {}
+    names = []
+    for ticker, (df, name) in zip(tickers, loaded):
+        close = df['Close']
+        if isinstance(close, pd.DataFrame):
+            close = close.iloc[:, 0]
+        closes[ticker] = close
+        names.append(name)
+
+    matrix = pd.concat(closes, axis=1).sort_index().ffill()
+    complete = matrix.notna().all(axis=1).to_numpy()
+    if not complete.any():
+        raise ValueError("组合中的资产没有共同的交易区间。")
+    matrix = matrix.iloc[int(complete.argmax()):]
+    return matrix.index, matrix.to_numpy(dtype=float), names, benchmark
+
+
+def rebalance_mask(dates, frequency):
+    """再平衡日为首个交易日以及每个周期内的第一个交易日。"""
+    mask = np.zeros(len(dates), dtype=bool)
+    if len(dates):
+        mask[0] = True
+    if frequency is not None and len(dates) > 1:
+        periods = pd.DatetimeIndex(dates).to_period(frequency).asi8
+        mask[1:] = periods[1:] != periods[:-1]
+    return mask
+
+
+def simulate_portfolio(prices, weights, mask, initial_capital, commission_config):
+    """
+    prices: (交易日, 资产) 收盘价矩阵，mask: 再平衡日。
+    只在再平衡日循环 (每次对全部资产做向量运算)，其余交易日的持仓由再平衡结果向前填充。
+    佣金规则与单资产回测的 _calculate_commission 相同，按每个资产的成交额分别收取。
+    佣金从组合市值中预留: 目标持仓按 (市值 - 本次再平衡的佣金) 分配，现金不会因佣金变为负数 (不加杠杆)。
+    """
+    commission_params = _commission_params(commission_config)
+    rebalance_index = np.flatnonzero(mask)
+    holdings_history = np.zeros((len(rebalance_index), prices.shape[1]))
+    cash_history = np.zeros(len(rebalance_index))
+    commissions = np.zeros(len(rebalance_index))
+    traded_value = 0.0
+
+    holdings = np.zeros(prices.shape[1])
+    cash = initial_capital
+    for j, i in enumerate(rebalance_index):
+        price = prices[i]
+        value = cash + holdings @ price
+        target, fees = _size_rebalance(weights, holdings, price, value, commission_params)
+        trade_value = np.abs(target - holdings) * price
+        cash = value - target @ price - fees.sum()
+        holdings = target
+        holdings_history[j] = holdings
+        cash_history[j] = cash
+        commissions[j] = fees.sum()
+        traded_value += trade_value.sum()
+
+    segment = np.cumsum(mask) - 1
+    nav = np.einsum('ij,ij->i', holdings_history[segment], prices) + cash_history[segment]
+    buy_and_hold_nav = prices @ holdings_history[0] + cash_history[0] if len(rebalance_index) else nav
+    return {
+        'nav': nav,
+        'buy_and_hold_nav': buy_and_hold_nav,
+        'cash': cash_history[segment],
+        'final_holdings': holdings_history[-1] if len(rebalance_index) else holdings,
+        'commissions': commissions,
+        'turnover': traded_value / initial_capital if initial_capital else 0.0,
+    }
+
+
+def _size_rebalance(weights, holdings, price, value, commission_params):
+    """
+    返回 (目标持股数, 各资产佣金)：目标市值按 (value - 佣金) 分配，剩余现金非负且尽量少。
+    佣金依赖成交额，成交额又依赖目标持仓，因此按 可投资金额 = value - 佣金(可投资金额) 迭代到不动点。
+    """
+    investable = value
+    best = None
+    for _ in range(MAX_SIZING_ITERATIONS):
+        target = weights * max(investable, 0.0) / price
+        trade_value = np.abs(target - holdings) * price
+        fees = np.where(trade_value > 1e-9, _commission_vector(trade_value, commission_params), 0.0)
+        spare = value - target @ price - fees.sum()
+        if spare >= 0:
+            best = (target, fees)
+            if spare <= SIZING_TOLERANCE * max(value, 1.0):
+                break
+        investable += spare
+    # 未收敛时取最后一个不透支的解；佣金超过组合市值时 (资金过少) 只能透支
+    return best if best is not None else (target, fees)
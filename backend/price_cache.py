@@ -0,0 +1,387 @@
+# backend/price_cache.py
+"""
+本地价格缓存。
+每个代码的完整历史收盘价保存在一个 SQLite 文件中，按日期窗口切片返回，
+只有缺失的日期段才会向上游数据源 (akshare/yfinance) 请求。
+批量获取 (get_many) 用有界线程池并发请求多个代码；每个数据源单独限速，网络错误等暂时性的失败按指数退避重试，
+重试用尽或遇到其他错误 (如代码不存在) 时回退到下一个数据源。
+每个代码的已缓存历史在内存中保留一份只读的基础数组 (按日期升序)，各请求得到的 DataFrame 是按二分查找
+切出的视图，不再每次从 SQLite 读取并解析；基础数组在该代码的数据刷新后重新加载。
+"""
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from price_store import window_frame
+
+DEFAULT_PRICE_CACHE_PATH = os.environ.get(
+    'PRICE_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'prices.sqlite'))
+# 内存中基础数组的总 K 线数上限 (每根 16 字节)，超出时淘汰最久未使用的代码
+DEFAULT_MEMORY_BARS = int(os.environ.get('PRICE_MEMORY_BARS', 5000000))
+# 值得重试的暂时性错误: requests 的 ConnectionError/Timeout、urllib 的 URLError 和 socket 超时都是 OSError 的子类
+TRANSIENT_ERRORS = (OSError,)
+
+class RateLimiter:
+    """令牌桶: 平均每秒最多 rate 次请求，允许 burst 次突发；多个线程共用时按到达顺序排队。"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """取得一个令牌，返回等待的秒数。"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1  # 先预订令牌，后来的线程据此排在后面
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class PriceCache:
+    def __init__(self, path, providers, refresh_ttl=900, listeners=None, rate_limits=None, retries=2,
+                 retry_backoff=0.5, store=None, memory_bars=DEFAULT_MEMORY_BARS):
+        """
+        path: SQLite 文件路径。
+        providers: [(名称, fetch函数)] 列表，按顺序尝试；fetch(ticker, start_date, end_date) -> (df, name)，
+            窗口包含 start_date 和 end_date 两端 (覆盖范围按此记录)。
+        refresh_ttl: 窗口包含今天时，距离上次刷新不足该秒数则不再请求最新数据。
+        listeners: 某个代码的数据写入缓存后调用 listener(ticker)，用于让依赖该数据的结果缓存失效。
+        rate_limits: {数据源名称: 每秒请求数}，未列出的数据源不限速。
+        retries: 数据源抛出暂时性错误 (TRANSIENT_ERRORS) 时的重试次数，其他异常和空表不重试；retry_backoff: 首次重试前等待的秒数，之后逐次翻倍。
+        store: 可选的 SharedPriceStore，窗口完全在其覆盖范围内时直接从内存映射文件读取，不访问 SQLite。
+        memory_bars: 内存中基础数组的总 K 线数上限，0 表示不在内存中保留。
+        """
+        self.path = path
+        self.providers = list(providers)
+        self.refresh_ttl = refresh_ttl
+        self.listeners = listeners if listeners is not None else []
+        self.rate_limiters = {name: RateLimiter(rate) for name, rate in (rate_limits or {}).items() if rate}
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.store = store
+        self.memory_bars = memory_bars
+        self._lock = threading.Lock()
+        self._ticker_locks = {}
+        self._arrays = OrderedDict()  # 代码 -> (refreshed_at, 日期数组, 收盘价数组)
+        self._array_bars = 0
+        self._stats = {'hits': 0, 'store_hits': 0, 'memory_hits': 0, 'misses': 0, 'partial_hits': 0, 'fetches': 0,
+                       'fetch_errors': 0, 'fetch_retries': 0, 'fetch_seconds': 0.0, 'last_fetch_seconds': 0.0,
+                       'rate_limit_wait_seconds': 0.0}
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS prices ('
+                         'ticker TEXT NOT NULL, date TEXT NOT NULL, close REAL NOT NULL, '
+                         'PRIMARY KEY (ticker, date))')
+            conn.execute('CREATE TABLE IF NOT EXISTS meta ('
+                         'ticker TEXT PRIMARY KEY, name TEXT, covered_start TEXT, covered_end TEXT, '
+                         'refreshed_at REAL)')
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _ticker_lock(self, ticker):
+        with self._lock:
+            return self._ticker_locks.setdefault(ticker, threading.Lock())
+
+    def get(self, ticker, start_date, end_date):
+        """
+        返回 (DataFrame[['Close']], 名称)，DataFrame 以 Date 为索引并已排序。
+        DataFrame 是共享只读数组的视图，需要修改时应先 copy()。
+        """
+        if self.store is not None:
+            entry = self.store.entry(ticker)
+            if entry is not None and not self._gaps(entry[0], start_date, end_date):
+                self._count('hits')
+                self._count('store_hits')
+                return window_frame(entry[1], entry[2], start_date, end_date), entry[0][0] or ticker
+
+        with self._ticker_lock(ticker):
+            meta = self._read_meta(ticker)
+            if meta is None:
+                self._count('misses')
+                df, name = self._fetch(ticker, start_date, end_date)
+                self._write(ticker, df, name, start_date, self._covered_end(end_date, df))
+            else:
+                name, covered_start, covered_end, refreshed_at = meta
+                gaps = self._gaps(meta, start_date, end_date)
+
+                if not gaps:
+                    self._count('hits')
+                else:
+                    self._count('partial_hits')
+                    for gap_start, gap_end in gaps:
+                        try:
+                            df, fetched_name = self._fetch(ticker, gap_start, gap_end, allow_empty=True)
+                        except ValueError as e:
+                            # 缺口可能只是没有新的交易日，继续使用已缓存的数据
+                            print(f"增量获取 '{ticker}' {gap_start}~{gap_end} 失败，使用缓存数据: {e}")
+                            continue
+                        name = name if name and name != ticker else fetched_name
+                        self._write(ticker, df, name, min(gap_start, covered_start),
+                                    max(self._covered_end(gap_end, df), covered_end))
+                        covered_start, covered_end = self._read_meta(ticker)[1:3]
+
+            meta = self._read_meta(ticker)
+            dates, close = self._base_arrays(ticker, meta[3])
+        return window_frame(dates, close, start_date, end_date), meta[0] or ticker
+
+    def get_many(self, tickers, start_date, end_date, max_workers=8, progress=None):
+        """
+        并发获取多个代码 (重复的代码只获取一次)，返回 ({代码: (df, 名称)}, {代码: 错误信息})。
+        单个代码获取失败 (ValueError) 记入错误而不影响其他代码；progress(百分比, 'loading_data') 在每个代码完成后调用。
+        """
+        tickers = list(dict.fromkeys(tickers))
+        results, errors = {}, {}
+        if not tickers:
+            return results, errors
+
+        def load(ticker):
+            try:
+                results[ticker] = self.get(ticker, start_date, end_date)
+            except ValueError as e:
+                errors[ticker] = str(e)
+
+        if len(tickers) == 1 or max_workers <= 1:
+            for done, ticker in enumerate(tickers, 1):
+                load(ticker)
+                if progress is not None:
+                    progress(done * 100 // len(tickers), 'loading_data')
+        else:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(tickers)),
+                                    thread_name_prefix='price-fetch') as pool:
+                futures = [pool.submit(load, ticker) for ticker in tickers]
+                for done, future in enumerate(as_completed(futures), 1):
+                    future.result()  # 非 ValueError 的异常照常抛出
+                    if progress is not None:
+                        progress(done * 100 // len(tickers), 'loading_data')
+        return results, errors
+
+    def meta_snapshot(self):
+        """{代码: (名称, covered_start, covered_end, refreshed_at)}，供共享价格存储发布使用。"""
+        with self._connect() as conn:
+            rows = conn.execute('SELECT ticker, name, covered_start, covered_end, refreshed_at FROM meta').fetchall()
+        return {row[0]: tuple(row[1:]) for row in rows}
+
+    def read_all(self, ticker):
+        """该代码已缓存的全部数据 (不请求数据源，直接读取 SQLite)。"""
+        dates, close = self._read_arrays(ticker)
+        return pd.DataFrame({'Close': close}, index=pd.DatetimeIndex(dates, name='Date'), copy=False)
+
+    def hot_entries(self, max_tickers):
+        """
+        预热快照用: 最多 max_tickers 个代码的 [(代码, meta, 日期数组, 收盘价数组)]。
+        先取内存中最近使用的代码，不足时按最近刷新时间补充 SQLite 中的其他代码。
+        """
+        with self._lock:
+            tickers = list(reversed(self._arrays))[:max_tickers]
+        if len(tickers) < max_tickers:
+            with self._connect() as conn:
+                rows = conn.execute('SELECT ticker FROM meta ORDER BY refreshed_at DESC').fetchall()
+            chosen = set(tickers)
+            tickers += [row[0] for row in rows if row[0] not in chosen][:max_tickers - len(tickers)]
+        entries = []
+        for ticker in tickers:
+            meta = self._read_meta(ticker)
+            if meta is not None:
+                entries.append((ticker, meta, *self._base_arrays(ticker, meta[3])))
+        return entries
+
+    def load_entries(self, entries):
+        """
+        载入预热快照 [(代码, meta, 日期数组, 收盘价数组)]: SQLite 中没有该代码或数据比快照旧时写入快照的数据
+        (保留快照的 refreshed_at，依赖它的结果缓存键依然有效)，再把基础数组放入内存。
+        本地数据比快照新的代码跳过。返回载入的代码数。
+        """
+        loaded = 0
+        for ticker, meta, dates, close in entries:
+            with self._ticker_lock(ticker):
+                current = self._read_meta(ticker)
+                if current is not None and (current[3] or 0) > (meta[3] or 0):
+                    continue
+                if current is None or current[3] != meta[3]:
+                    self._replace(ticker, meta, dates, close)
+                self._remember(ticker, meta[3], dates, close)
+            loaded += 1
+        return loaded
+
+    def version(self, ticker):
+        """数据版本: 该代码最近一次写入缓存的时间，未缓存时为 None。"""
+        meta = self._read_meta(ticker)
+        return meta[3] if meta else None
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses'] + stats['partial_hits']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        stats['memory_tickers'] = len(self._arrays)
+        stats['memory_bars'] = self._array_bars
+        return stats
+
+    def _count(self, key, value=1):
+        with self._lock:
+            self._stats[key] += value
+
+    def _fetch(self, ticker, start_date, end_date, allow_empty=False):
+        """
+        依次尝试各数据源。allow_empty=True 用于补齐已知代码的缺口:
+        数据源正常返回空表说明该区间没有交易日，而不是获取失败。
+        """
+        errors = []
+        for provider_name, fetch in self.providers:
+            try:
+                df, name = self._fetch_with_retry(provider_name, fetch, ticker, start_date, end_date)
+            except Exception as e:
+                errors.append(f"{provider_name} 错误: {e}")
+                continue
+            if df is None or df.empty:
+                if allow_empty and df is not None:
+                    return df, name
+                self._count('fetch_errors')
+                errors.append(f"{provider_name} 错误: {provider_name} 未返回代码 '{ticker}' 的数据。")
+                continue
+            return df, name
+        raise ValueError(f"所有数据源均获取失败。{' | '.join(errors)}")
+
+    def _fetch_with_retry(self, provider_name, fetch, ticker, start_date, end_date):
+        limiter = self.rate_limiters.get(provider_name)
+        for attempt in range(self.retries + 1):
+            if limiter is not None:
+                self._count('rate_limit_wait_seconds', limiter.acquire())
+            started = time.perf_counter()
+            try:
+                return fetch(ticker, start_date, end_date)
+            except TRANSIENT_ERRORS:
+                self._count('fetch_errors')
+                if attempt == self.retries:
+                    raise
+            except Exception:
+                # 代码不存在、数据格式不对等确定性的错误重试也不会成功，直接交给下一个数据源
+                self._count('fetch_errors')
+                raise
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self._stats['fetches'] += 1
+                    self._stats['fetch_seconds'] += elapsed
+                    self._stats['last_fetch_seconds'] = elapsed
+            self._count('fetch_retries')
+            # 指数退避，加随机抖动避免并发线程同时重试
+            time.sleep(self.retry_backoff * 2 ** attempt * random.uniform(0.5, 1.0))
+
+    def _gaps(self, meta, start_date, end_date):
+        """窗口中尚未覆盖、需要向数据源请求的日期段。"""
+        _, covered_start, covered_end, refreshed_at = meta
+        gaps = []
+        if start_date < covered_start:
+            gaps.append((start_date, _previous_day(covered_start)))
+        if end_date > covered_end and not self._recently_refreshed(covered_end, refreshed_at):
+            gaps.append((_next_day(covered_end), end_date))
+        return gaps
+
+    def _covered_end(self, end_date, df):
+        # 窗口包含今天时，今天的收盘价可能尚未产生，只把覆盖范围记到已有数据的最后一天
+        today = date.today().isoformat()
+        if end_date >= today:
+            last = df.index.max().strftime('%Y-%m-%d') if not df.empty else _previous_day(today)
+            return min(last, end_date)
+        return end_date
+
+    def _recently_refreshed(self, covered_end, refreshed_at):
+        if covered_end < _previous_day(date.today().isoformat()):
+            return False
+        return refreshed_at is not None and time.time() - refreshed_at < self.refresh_ttl
+
+    def _read_meta(self, ticker):
+        with self._connect() as conn:
+            return conn.execute('SELECT name, covered_start, covered_end, refreshed_at FROM meta WHERE ticker = ?',
+                                (ticker,)).fetchone()
+
+    def _write(self, ticker, df, name, covered_start, covered_end):
+        close = df['Close']
+        if isinstance(close, pd.DataFrame):  # yfinance 可能返回多级列
+            close = close.iloc[:, 0]
+        close = close.dropna()
+        rows = list(zip([ticker] * len(close), pd.DatetimeIndex(close.index).strftime('%Y-%m-%d'),
+                        close.astype(float).tolist()))
+        with self._connect() as conn:
+            conn.executemany('INSERT OR REPLACE INTO prices (ticker, date, close) VALUES (?, ?, ?)', rows)
+            conn.execute('INSERT OR REPLACE INTO meta (ticker, name, covered_start, covered_end, refreshed_at) '
+                         'VALUES (?, ?, ?, ?, ?)', (ticker, name, covered_start, covered_end, time.time()))
+        for listener in self.listeners:
+            listener(ticker)
+
+    def _replace(self, ticker, meta, dates, close):
+        # 用快照中的完整历史替换该代码的数据，不通知 listeners (数据版本不变)
+        rows = list(zip([ticker] * len(close), pd.DatetimeIndex(dates).strftime('%Y-%m-%d'), close.tolist()))
+        with self._connect() as conn:
+            conn.execute('DELETE FROM prices WHERE ticker = ?', (ticker,))
+            conn.executemany('INSERT INTO prices (ticker, date, close) VALUES (?, ?, ?)', rows)
+            conn.execute('INSERT OR REPLACE INTO meta (ticker, name, covered_start, covered_end, refreshed_at) '
+                         'VALUES (?, ?, ?, ?, ?)', (ticker, *meta))
+
+    def _base_arrays(self, ticker, refreshed_at):
+        """该代码已缓存的全部历史 (日期数组, 收盘价数组)，与 meta 中的 refreshed_at 一致时直接复用内存中的数组。"""
+        with self._lock:
+            cached = self._arrays.get(ticker)
+            if cached is not None and cached[0] == refreshed_at:
+                self._arrays.move_to_end(ticker)
+                self._stats['memory_hits'] += 1
+                return cached[1], cached[2]
+        dates, close = self._read_arrays(ticker)
+        self._remember(ticker, refreshed_at, dates, close)
+        return dates, close
+
+    def _remember(self, ticker, refreshed_at, dates, close):
+        with self._lock:
+            previous = self._arrays.pop(ticker, None)
+            if previous is not None:
+                self._array_bars -= len(previous[1])
+            if len(dates) <= self.memory_bars:
+                self._arrays[ticker] = (refreshed_at, dates, close)
+                self._array_bars += len(dates)
+                while self._array_bars > self.memory_bars:
+                    _, (_, evicted, _) = self._arrays.popitem(last=False)
+                    self._array_bars -= len(evicted)
+
+    def _read_arrays(self, ticker):
+        # 主键 (ticker, date) 保证按日期升序读出，窗口切片依赖这一点做二分查找
+        with self._connect() as conn:
+            rows = conn.execute('SELECT date, close FROM prices WHERE ticker = ? ORDER BY date', (ticker,)).fetchall()
+        dates = np.array([row[0] for row in rows], dtype='datetime64[ns]')
+        close = np.fromiter((row[1] for row in rows), dtype=np.float64, count=len(rows))
+        dates.setflags(write=False)
+        close.setflags(write=False)
+        return dates, close
+
+
+def _next_day(day):
+    return (date.fromisoformat(day) + timedelta(days=1)).isoformat()
+
+
+def _previous_day(day):
+    return (date.fromisoformat(day) - timedelta(days=1)).isoformat()
@@ -0,0 +1,242 @@
+# backend/price_store.py
+"""
+多进程共享的只读价格存储。
+Gunicorn 的每个 worker 都从 SQLite 价格缓存读取并解析数据，各自持有一份 DataFrame。
+本存储把价格缓存导出为内存映射的 NumPy 文件 (每个代码一个日期数组和一个收盘价数组)，
+所有 worker 以只读方式映射同一份文件，数据只在操作系统页缓存中保留一份，新启动的 worker 无需预热。
+
+只有一个写入进程 (python price_store.py，用文件锁保证) 负责生成新版本:
+新版本写在临时目录中，完成后改名并原子替换 CURRENT 指针，读取方永远不会看到写了一半的数据。
+未变化的代码直接硬链接上一版本的文件，重新发布的开销只与变化的代码数量有关。
+
+目录结构:
+  <root>/CURRENT                   当前版本目录名
+  <root>/v000012/manifest.json     {代码: {name, coveredStart, coveredEnd, refreshedAt, file, bars}}
+  <root>/v000012/<file>.dates.npy  datetime64[ns]
+  <root>/v000012/<file>.close.npy  float64
+用法 (在 backend 目录下):
+  python price_store.py --store /var/lib/backtester/prices              # 发布一次
+  python price_store.py --store /var/lib/backtester/prices --interval 60  # 价格缓存有变化时每 60 秒发布
+worker 设置环境变量 PRICE_STORE_DIR 后优先从该存储读取。
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+CURRENT = 'CURRENT'
+MANIFEST = 'manifest.json'
+WRITER_LOCK = 'writer.lock'
+DEFAULT_KEEP_VERSIONS = 3
+
+
+class StoreLockedError(RuntimeError):
+    pass
+
+
+class SharedPriceStore:
+    def __init__(self, root):
+        self.root = root
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._snapshot = None  # (版本名, manifest, {代码: (日期数组, 收盘价数组)})
+
+    def entry(self, ticker):
+        """
+        返回 (meta, 日期数组, 收盘价数组)，meta 与价格缓存的 meta 相同: (名称, covered_start, covered_end, refreshed_at)。
+        该代码不在当前版本中或文件已被清理时返回 None，调用方应回退到价格缓存。
+        """
+        snapshot = self._current()
+        if snapshot is None:
+            return None
+        version, manifest, arrays = snapshot
+        item = manifest.get(ticker)
+        if item is None:
+            return None
+        if ticker not in arrays:
+            base = os.path.join(self.root, version, item['file'])
+            try:
+                arrays[ticker] = (np.load(base + '.dates.npy', mmap_mode='r'),
+                                  np.load(base + '.close.npy', mmap_mode='r'))
+            except OSError:
+                return None
+        dates, close = arrays[ticker]
+        return (item['name'], item['coveredStart'], item['coveredEnd'], item['refreshedAt']), dates, close
+
+    def version(self):
+        snapshot = self._current()
+        return snapshot[0] if snapshot else None
+
+    def _current(self):
+        # CURRENT 被原子替换后 inode 会变化，据此判断是否需要重新加载 manifest
+        try:
+            status = os.stat(os.path.join(self.root, CURRENT))
+        except OSError:
+            return None
+        stamp = (status.st_ino, status.st_mtime_ns)
+        with self._lock:
+            if stamp != self._stamp:
+                try:
+                    version = _read_text(os.path.join(self.root, CURRENT))
+                    with open(os.path.join(self.root, version, MANIFEST), encoding='utf-8') as f:
+                        manifest = json.load(f)
+                except (OSError, ValueError):
+                    return self._snapshot
+                self._snapshot = (version, manifest, {})
+                self._stamp = stamp
+            return self._snapshot
+
+    # ---- 写入 (只在发布进程中调用) ----
+
+    @contextmanager
+    def writer_lock(self):
+        """保证同一时间只有一个进程发布新版本。"""
+        import fcntl
+        os.makedirs(self.root, exist_ok=True)
+        with open(os.path.join(self.root, WRITER_LOCK), 'w') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                raise StoreLockedError(f"价格存储 {self.root} 正由其他进程写入。")
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def publish(self, price_cache, keep=DEFAULT_KEEP_VERSIONS):
+        """从价格缓存生成新版本并切换，返回新版本名；refreshed_at 未变化的代码复用上一版本的文件。"""
+        with self.writer_lock():
+            previous_version = self._read_current_version()
+            previous = self._read_manifest(previous_version) if previous_version else {}
+            number = int(previous_version[1:]) + 1 if previous_version else 1
+            version = f"v{number:06d}"
+            for name in os.listdir(self.root):
+                if name.startswith('.staging-'):  # 之前中断的发布留下的目录
+                    shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+            staging = os.path.join(self.root, f".staging-{version}-{os.getpid()}")
+            os.makedirs(staging)
+
+            manifest = {}
+            for ticker, (name, covered_start, covered_end, refreshed_at) in price_cache.meta_snapshot().items():
+                file = _file_name(ticker)
+                old = previous.get(ticker)
+                if old is None or old['refreshedAt'] != refreshed_at or not self._reuse(previous_version, file,
+                                                                                         staging):
+                    df = price_cache.read_all(ticker)
+                    np.save(os.path.join(staging, file + '.dates.npy'),
+                            df.index.to_numpy(dtype='datetime64[ns]'))
+                    np.save(os.path.join(staging, file + '.close.npy'), df['Close'].to_numpy(dtype=np.float64))
+                    bars = len(df)
+                else:
+                    bars = old['bars']
+                manifest[ticker] = {'name': name, 'coveredStart': covered_start, 'coveredEnd': covered_end,
+                                    'refreshedAt': refreshed_at, 'file': file, 'bars': bars}
+            with open(os.path.join(staging, MANIFEST), 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False)
+
+            os.rename(staging, os.path.join(self.root, version))
+            pointer = os.path.join(self.root, f".{CURRENT}.{os.getpid()}")
+            with open(pointer, 'w', encoding='utf-8') as f:
+                f.write(version)
+            os.replace(pointer, os.path.join(self.root, CURRENT))
+            self._prune(keep)
+            return version
+
+    def _reuse(self, previous_version, file, staging):
+        targets = [os.path.join(staging, file + suffix) for suffix in ('.dates.npy', '.close.npy')]
+        try:
+            for target in targets:
+                source = os.path.join(self.root, previous_version, os.path.basename(target))
+                try:
+                    os.link(source, target)
+                except OSError:
+                    shutil.copyfile(source, target)
+            return True
+        except OSError:
+            # 删掉已建立的硬链接，否则重新写入时会改写上一版本中正被读取的文件
+            for target in targets:
+                if os.path.exists(target):
+                    os.remove(target)
+            return False
+
+    def _read_current_version(self):
+        try:
+            return _read_text(os.path.join(self.root, CURRENT))
+        except OSError:
+            return None
+
+    def _read_manifest(self, version):
+        try:
+            with open(os.path.join(self.root, version, MANIFEST), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _prune(self, keep):
+        # 旧版本保留几代: 正在读取旧版本的 worker 已映射的文件即使被删除也仍然有效
+        versions = sorted(name for name in os.listdir(self.root) if name.startswith('v') and name[1:].isdigit())
+        for name in versions[:-keep]:
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+
+def window_frame(dates, close, start_date, end_date):
+    """
+    按日期窗口切片，返回与价格缓存相同格式的 DataFrame (Date 索引、Close 列)，数据不复制。
+    dates 必须按升序排列，窗口边界用二分查找定位。
+    """
+    start = np.searchsorted(dates, np.datetime64(start_date, 'ns'), side='left')
+    end = np.searchsorted(dates, np.datetime64(end_date, 'ns'), side='right')
+    return pd.DataFrame({'Close': close[start:end]}, index=pd.DatetimeIndex(dates[start:end], name='Date'),
+                        copy=False)
+
+
+def _file_name(ticker):
+    # 代码中可能有 ^ . 等字符，文件名用哈希
+    return hashlib.sha1(ticker.encode('utf-8')).hexdigest()[:16]
+
+
+def _read_text(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read().strip()
+
+
+def main(argv=None):
+    from price_cache import PriceCache, DEFAULT_PRICE_CACHE_PATH
+
+    parser = argparse.ArgumentParser(description='发布共享价格存储')
+    parser.add_argument('--store', default=os.environ.get('PRICE_STORE_DIR'), help='存储目录，默认为 PRICE_STORE_DIR')
+    parser.add_argument('--cache', default=DEFAULT_PRICE_CACHE_PATH, help='SQLite 价格缓存路径')
+    parser.add_argument('--interval', type=float, default=0, help='大于 0 时持续运行，每隔该秒数检查并发布')
+    parser.add_argument('--keep', type=int, default=DEFAULT_KEEP_VERSIONS)
+    args = parser.parse_args(argv)
+    if not args.store:
+        parser.error('需要指定 --store 或设置 PRICE_STORE_DIR。')
+
+    store = SharedPriceStore(args.store)
+    cache = PriceCache(args.cache, providers=[])  # 发布进程只读取缓存，不请求数据源
+    published_state = None
+    while True:
+        state = cache.meta_snapshot()
+        if state != published_state:
+            try:
+                version = store.publish(cache, keep=args.keep)
+            except StoreLockedError as e:
+                print(e)
+                return 1
+            published_state = state
+            print(f"已发布 {version} ({len(state)} 个代码)")
+        if args.interval <= 0:
+            return 0
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# backend/response_format.py
+"""
+回测响应的紧凑编码。
+默认的 chart_data 中四条曲线各自带一份完整的日期字符串列表；列式格式只保留一条共享日期轴
+(起始 epoch 日 + 逐日间隔)，数值可选编码为 base64 的 float32 数组，也可整体编码为 MessagePack。
+"""
+import base64
+import gzip
+import zlib
+
+import numpy as np
+
+try:
+    import msgpack
+except ImportError:  # 可选依赖，未安装时不支持 msgpack 格式
+    msgpack = None
+
+# 共享同一日期轴的曲线
+CURVE_KEYS = ('asset_price_curve', 'portfolio_curve', 'asset_benchmark_curve', 'market_benchmark_curve')
+# json: 默认格式; columnar: 共享日期轴; columnar-binary: 共享日期轴 + base64 float32;
+# msgpack: 列式 + MessagePack (曲线为 float32 二进制)
+RESPONSE_FORMATS = ('json', 'columnar', 'columnar-binary', 'msgpack')
+MSGPACK_MIMETYPE = 'application/x-msgpack'
+MIN_COMPRESS_SIZE = 1024
+
+
+def validate_format(response_format):
+    if response_format not in RESPONSE_FORMATS:
+        raise ValueError(f"不支持的响应格式: '{response_format}'")
+    if response_format == 'msgpack' and msgpack is None:
+        raise ValueError("服务器未安装 msgpack，无法使用 msgpack 响应格式。")
+
+
+def to_columnar(results, value_encoder=None):
+    """
+    把回测结果中的曲线转换为共享日期轴的列式结构；不含 chart_data 的结果原样返回。
+    value_encoder: 可选的曲线数值编码函数 (如 encode_float32)，默认保留数值列表。
+    """
+    chart_data = results.get('chart_data') if isinstance(results, dict) else None
+    if not chart_data or chart_data.get('format') == 'columnar':
+        return results
+
+    dates = next((chart_data[key]['dates'] for key in CURVE_KEYS if chart_data.get(key, {}).get('dates')), [])
+    epoch_days = np.array(dates, dtype='datetime64[D]').astype(np.int64)
+    columnar = {key: value for key, value in chart_data.items() if key not in CURVE_KEYS}
+    columnar['format'] = 'columnar'
+    columnar['axis'] = {
+        'start': int(epoch_days[0]) if len(epoch_days) else None,
+        'deltas': np.diff(epoch_days, prepend=epoch_days[:1]).tolist(),
+    }
+    columnar['series'] = {}
+    for key in CURVE_KEYS:
+        curve = chart_data.get(key)
+        if curve is None:
+            continue
+        values = curve['values']
+        if values and (len(curve['dates']) != len(dates) or curve['dates'][-1] != dates[-1]):
+            columnar[key] = curve  # 日期轴不同的曲线保留原格式
+            continue
+        columnar['series'][key] = value_encoder(values) if value_encoder else values
+    return {**results, 'chart_data': columnar}
+
+
+def encode_float32(values):
+    data = np.asarray(values, dtype='<f4').tobytes()
+    return {'dtype': 'float32', 'encoding': 'base64', 'data': base64.b64encode(data).decode('ascii')}
+
+
+def float32_bytes(values):
+    # MessagePack 原生支持二进制，曲线直接以小端 float32 字节传输
+    return np.asarray(values, dtype='<f4').tobytes()
+
+
+def decode_float32(encoded):
+    return np.frombuffer(base64.b64decode(encoded['data']), dtype='<f4')
+
+
+def format_results(results, response_format):
+    """返回 (响应体, mimetype)。json/columnar 返回可由 jsonify 序列化的对象，msgpack 返回 bytes。"""
+    if response_format == 'columnar':
+        return to_columnar(results), 'application/json'
+    if response_format == 'columnar-binary':
+        return to_columnar(results, encode_float32), 'application/json'
+    if response_format == 'msgpack':
+        return msgpack.packb(to_columnar(results, float32_bytes), default=_msgpack_default), MSGPACK_MIMETYPE
+    return results, 'application/json'
+
+
+def _msgpack_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"无法编码类型 {type(value)}")
+
+
+def compress_payload(data, accept_encoding):
+    """按 Accept-Encoding 压缩响应体，返回 (数据, 编码)；太小或客户端不支持时编码为 None。"""
+    if len(data) < MIN_COMPRESS_SIZE or not accept_encoding:
+        return data, None
+    accepted = {part.split(';')[0].strip().lower() for part in accept_encoding.split(',')}
+    if 'gzip' in accepted:
+        return gzip.compress(data, compresslevel=6), 'gzip'
+    if 'deflate' in accepted:
+        return zlib.compress(data, 6), 'deflate'
+    return data, None
@@ -0,0 +1,185 @@
+# backend/result_cache.py
+"""
+回测结果缓存。
+完整的回测响应按 "规范化配置 + 相关代码的价格数据版本" 的哈希缓存：
+内存中为有容量上限的 LRU，可选的磁盘层在重启后依然有效。
+价格缓存刷新某个代码时，依赖该代码的结果会被清除。
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+
+# 回测过程中写回 config 的派生字段，不影响结果
+DERIVED_CONFIG_KEYS = ('assetName', 'benchmarkAssetName', 'first_investment_amount')
+
+
+class ResultCache:
+    def __init__(self, max_entries=256, disk_dir=None):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (tickers, result, compute_seconds)
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0,
+                       'saved_seconds': 0.0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    def get(self, key, tickers):
+        """返回缓存的结果 (调用方不应修改)，未命中返回 None。tickers 用于定位磁盘层文件。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                self._stats['saved_seconds'] += entry[2]
+                return entry[1]
+
+        entry = self._read_disk(key, tickers)
+        with self._lock:
+            if entry is None:
+                self._stats['misses'] += 1
+                return None
+            self._stats['disk_hits'] += 1
+            self._stats['saved_seconds'] += entry[2]
+            self._store(key, entry)
+            return entry[1]
+
+    def find(self, key):
+        """只按键查找结果 (不知道相关代码时使用，例如按 resultId 取回完整结果)，不计入命中率。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry[1]
+        if not self.disk_dir or not re.fullmatch(r'[0-9a-f]{64}', key):
+            return None
+        suffix = f"__{key}.json.gz"
+        for filename in os.listdir(self.disk_dir):
+            if filename.endswith(suffix):
+                tickers = filename[:-len(suffix)].split('+')
+                entry = self._read_disk(key, tickers)
+                return entry[1] if entry else None
+        return None
+
+    def put(self, key, tickers, result, compute_seconds):
+        entry = (tuple(tickers), result, compute_seconds)
+        with self._lock:
+            self._store(key, entry)
+        self._write_disk(key, entry)
+
+    def hot_entries(self, max_entries):
+        """预热快照用: 内存中最近使用的最多 max_entries 个结果 [(键, 代码, 结果, 计算耗时)]，最近使用的在前。"""
+        with self._lock:
+            keys = list(reversed(self._entries))[:max_entries]
+            return [(key, *self._entries[key]) for key in keys]
+
+    def load_entries(self, entries):
+        """载入预热快照中的结果 (hot_entries 的格式)，已有的键不覆盖。返回载入的条目数。"""
+        loaded = 0
+        with self._lock:
+            for key, tickers, result, compute_seconds in reversed(entries):
+                if key not in self._entries:
+                    self._store(key, (tuple(tickers), result, compute_seconds))
+                    loaded += 1
+        return loaded
+
+    def invalidate_ticker(self, ticker):
+        """清除所有依赖该代码的结果 (内存和磁盘)。"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if ticker in entry[0]]
+            for key in stale:
+                del self._entries[key]
+            self._stats['invalidations'] += len(stale)
+        if self.disk_dir:
+            token = _safe_token(ticker)
+            for filename in os.listdir(self.disk_dir):
+                if token in filename.split('__')[0].split('+'):
+                    try:
+                        os.remove(os.path.join(self.disk_dir, filename))
+                    except OSError:
+                        pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def _disk_path(self, key, tickers):
+        return os.path.join(self.disk_dir, f"{'+'.join(_safe_token(t) for t in tickers)}__{key}.json.gz")
+
+    def _read_disk(self, key, tickers):
+        if not self.disk_dir:
+            return None
+        try:
+            with gzip.open(self._disk_path(key, tickers), 'rt', encoding='utf-8') as f:
+                payload = json.load(f)
+            return tuple(payload['tickers']), payload['result'], payload['compute_seconds']
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write_disk(self, key, entry):
+        if not self.disk_dir:
+            return
+        tickers, result, compute_seconds = entry
+        path = self._disk_path(key, tickers)
+        tmp_path = f"{path}.tmp{threading.get_ident()}"
+        try:
+            with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                json.dump({'tickers': list(tickers), 'result': result, 'compute_seconds': compute_seconds}, f)
+            os.replace(tmp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"写入结果缓存文件失败: {e}")
+
+
+def normalize_config(config):
+    """去掉派生字段和值为 None 的键，数字统一为浮点数，得到与键顺序无关的规范化配置。"""
+    def normalize(value):
+        if isinstance(value, dict):
+            return {k: normalize(v) for k, v in value.items() if v is not None and k not in DERIVED_CONFIG_KEYS}
+        if isinstance(value, (list, tuple)):
+            return [normalize(v) for v in value]
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return float(value)
+        return value
+    return normalize(config)
+
+
+def result_key(config, data_versions, mode='vectorized'):
+    """结果缓存键: 规范化配置、模拟模式和各代码价格数据版本的哈希。"""
+    payload = {'config': normalize_config(config), 'mode': mode, 'versions': data_versions}
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _safe_token(ticker):
+    return re.sub(r'[^0-9A-Za-z.^-]', '-', str(ticker))
+
+
+def configure_result_cache(max_entries=256, disk_dir=None):
+    global _result_cache
+    _result_cache = ResultCache(max_entries, disk_dir)
+    return _result_cache
+
+
+def get_result_cache():
+    return _result_cache
+
+
+_result_cache = ResultCache(int(os.environ.get('RESULT_CACHE_SIZE', 256)), os.environ.get('RESULT_CACHE_DIR') or None)
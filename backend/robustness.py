@@ -0,0 +1,239 @@
+# backend/robustness.py
+"""
+蒙特卡洛稳健性分析: 从已加载的价格序列重采样出大量价格路径，在每条路径上运行同一策略，
+得到收益率/年化收益率/最大回撤的分布和权益曲线的分位数带，而不只是 analyze_performance 的单个点估计。
+
+路径生成方式 (method):
+  bootstrap:    对日对数收益率做分块自助重采样 (每块 blockSize 根连续 K 线，保留短期自相关)，
+                从首日收盘价出发拼接成 horizonBars 根 K 线的路径，日期沿用原序列前 horizonBars 个交易日；
+  random_start: 在原序列中随机选取起点，截取连续 horizonBars 根 K 线作为路径。
+每条路径还可以扰动交易成本: 佣金乘以 [1 - commissionJitter, 1 + commissionJitter] 内的随机系数，
+并按成交额收取 [0, slippage] 内随机比例的滑点成本。配置了成交模型 (execution) 时，涨跌停等成交条件按每条路径的价格判断。
+
+路径按批生成，每批在 (交易日 x 路径) 矩阵上一次模拟 (backtest_engine.simulate_signal_matrix)，
+各批在进程池中并行计算。每批的随机数由 (seed, 批号) 决定，结果与进程数无关、可复现。
+"""
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+import pandas as pd
+
+from utils import get_price_data_and_names
+from backtest_engine import simulate_signal_matrix
+from analysis import performance_metrics_matrix
+from optimizer import SORTABLE_METRICS
+from strategies import get_strategy
+from trading_calendar import NS_PER_DAY
+from execution import ExecutionModel
+
+METHODS = ('bootstrap', 'random_start')
+MAX_PATHS = 20000
+PATHS_PER_BATCH = 250
+# 权益曲线分位数带的百分位和最多取样的 K 线数
+BAND_PERCENTILES = (5, 25, 50, 75, 95)
+BAND_POINTS = 250
+HISTOGRAM_BINS = 20
+# 定投的买入金额由日程决定，不能按信号矩阵模拟
+UNSUPPORTED_STRATEGIES = ('fixed_frequency',)
+
+_worker_data = {}
+
+
+def run_robustness(config, paths=1000, method='bootstrap', horizon_bars=None, block_size=20, commission_jitter=0.0,
+                   slippage=0.0, seed=0, max_workers=None, time_budget=None, progress=None):
+    """
+    config 为普通回测配置 (策略参数、止盈止损、佣金、initialCapital)。
+    horizon_bars: 每条路径的 K 线数，bootstrap 默认为整个序列，random_start 默认为序列的一半。
+    max_workers: 进程数，1 表示在当前进程内顺序执行。
+    time_budget: 秒数上限，超时后未完成的批次被放弃，按已完成的路径统计。
+    progress: 可选回调 progress(百分比, 阶段名)。
+    """
+    if method not in METHODS:
+        raise ValueError(f"不支持的路径生成方式: '{method}'")
+    if not isinstance(paths, int) or isinstance(paths, bool) or not 1 <= paths <= MAX_PATHS:
+        raise ValueError(f"paths 必须是 1 到 {MAX_PATHS} 之间的整数。")
+    if not 0 <= commission_jitter <= 1:
+        raise ValueError("commissionJitter 必须在 0 到 1 之间。")
+    if not 0 <= slippage < 1:
+        raise ValueError("slippage 必须不小于 0 且小于 1。")
+    strategy_name = config['strategy']['name']
+    strategy = get_strategy(strategy_name)
+    if strategy_name in UNSUPPORTED_STRATEGIES:
+        raise ValueError(f"策略 '{strategy_name}' 不支持稳健性分析。")
+    params = strategy.validate(config['strategy'].get('params', {}))
+    initial_capital_ref = float(config.get('initialCapital', 0))
+    started = time.perf_counter()
+
+    _report(progress, 0, 'loading_data')
+    data, asset_name = get_price_data_and_names([config['ticker']], config['startDate'], config['endDate'])[0]
+    config['assetName'] = asset_name
+    bars = len(data)
+    if horizon_bars is None:
+        horizon_bars = bars if method == 'bootstrap' else bars // 2
+    longest = bars if method == 'bootstrap' else bars - 1
+    if not isinstance(horizon_bars, int) or not 2 <= horizon_bars <= longest:
+        raise ValueError(f"horizonBars 必须是 2 到 {longest} 之间的整数。")
+    if method == 'bootstrap' and (not isinstance(block_size, int) or not 1 <= block_size < bars):
+        raise ValueError(f"blockSize 必须是 1 到 {bars - 1} 之间的整数。")
+
+    close = data['Close'].to_numpy(dtype=float).reshape(bars)
+    dates = pd.DatetimeIndex(data.index).asi8.copy()
+    # 买入金额与 _simulate_vectorized 相同: 买入并持有在设置了基准资金时投入全部基准资金
+    buy_amount = params['amount']
+    if strategy_name == 'buy_and_hold' and initial_capital_ref > 0:
+        buy_amount = initial_capital_ref
+    band_rows = np.unique(np.linspace(0, horizon_bars - 1, min(BAND_POINTS, horizon_bars)).round().astype(np.int64))
+    worker_args = (close, dates, strategy_name, params, float(buy_amount), config.get('takeProfit'),
+                   config.get('stopLoss'), config.get('commission', {}), initial_capital_ref, method, horizon_bars,
+                   block_size, commission_jitter, slippage, seed, band_rows, ExecutionModel.from_config(config))
+    # 在原序列上生成一次信号，参数错误 (如均线周期超过路径长度) 在启动进程池前报告
+    _path_signals(close[:horizon_bars, None], strategy_name, params)
+
+    _report(progress, 10, 'simulating')
+    batches = [(number, min(PATHS_PER_BATCH, paths - start))
+               for number, start in enumerate(range(0, paths, PATHS_PER_BATCH))]
+    deadline = started + time_budget if time_budget else None
+    max_workers = min(max_workers or os.cpu_count() or 1, len(batches))
+    results = {}
+    timed_out = False
+    if max_workers == 1:
+        _init_worker(*worker_args)
+        for number, count in batches:
+            if deadline is not None and time.perf_counter() > deadline:
+                timed_out = True
+                break
+            results[number] = _simulate_batch(number, count)
+            _report(progress, 10 + 85 * len(results) / len(batches), 'simulating')
+    else:
+        executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=worker_args)
+        try:
+            pending = {executor.submit(_simulate_batch, number, count): number for number, count in batches}
+            while pending:
+                timeout = None if deadline is None else max(deadline - time.perf_counter(), 0)
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+                _report(progress, 10 + 85 * len(results) / len(batches), 'simulating')
+                if pending and deadline is not None and time.perf_counter() >= deadline:
+                    timed_out = True
+                    break
+        finally:
+            executor.shutdown(wait=not timed_out, cancel_futures=True)
+
+    _report(progress, 95, 'analyzing')
+    completed = [results[number] for number in sorted(results)]
+    summary = {
+        'paths': sum(len(batch['totalReturn']) for batch in completed),
+        'requested': paths,
+        'method': method,
+        'horizonBars': horizon_bars,
+        'timedOut': timed_out,
+    }
+    if completed:
+        metrics = {name: np.concatenate([batch[name] for batch in completed]) for name in SORTABLE_METRICS}
+        curves = np.concatenate([batch['curves'] for batch in completed], axis=1)
+        summary['metrics'] = {name: _distribution(values) for name, values in metrics.items()}
+        summary['probabilityOfLoss'] = round(float((metrics['totalReturn'] < 0).mean()), 4)
+        summary['equityBands'] = _equity_bands(curves, band_rows, data.index if method == 'bootstrap' else None)
+    summary['elapsedSeconds'] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def _report(progress, percent, stage):
+    if progress is not None:
+        progress(percent, stage)
+
+
+def _distribution(values):
+    finite = values[np.isfinite(values)]
+    if len(finite) == 0:
+        return {'mean': None, 'percentiles': {}, 'histogram': {'edges': [], 'counts': []}}
+    counts, edges = np.histogram(finite, bins=HISTOGRAM_BINS)
+    percentiles = np.percentile(finite, BAND_PERCENTILES)
+    return {
+        'mean': round(float(finite.mean()), 2),
+        'percentiles': {f"p{p}": round(float(v), 2) for p, v in zip(BAND_PERCENTILES, percentiles)},
+        'histogram': {'edges': np.round(edges, 2).tolist(), 'counts': counts.tolist()},
+    }
+
+
+def _equity_bands(curves, band_rows, index):
+    """curves: (取样的 K 线, 路径) 的收益率百分比。"""
+    bands = np.round(np.percentile(curves, BAND_PERCENTILES, axis=1), 2)
+    result = {'bars': band_rows.tolist()}
+    if index is not None:
+        result['dates'] = index[band_rows].strftime('%Y-%m-%d').tolist()
+    for p, values in zip(BAND_PERCENTILES, bands):
+        result[f"p{p}"] = values.tolist()
+    return result
+
+
+def _path_signals(closes, strategy_name, params):
+    """closes: (交易日, 路径)，返回同形状的信号矩阵。"""
+    strategy = get_strategy(strategy_name)
+    signals = np.empty(closes.shape, dtype=np.int8)
+    for j in range(closes.shape[1]):
+        if strategy.signal_matrix is not None:
+            signals[:, j] = strategy.signal_matrix(closes[:, j], [params])[:, 0]
+        else:
+            frame = pd.DataFrame({'Close': closes[:, j]})
+            signals[:, j] = strategy.generate(frame, params)['Signal'].to_numpy()
+    return signals
+
+
+def _init_worker(close, dates, strategy_name, params, buy_amount, take_profit, stop_loss, commission,
+                 initial_capital, method, horizon_bars, block_size, commission_jitter, slippage, seed, band_rows,
+                 execution):
+    _worker_data.update(close=close, dates=dates, strategy_name=strategy_name, params=params, buy_amount=buy_amount,
+                        take_profit=take_profit, stop_loss=stop_loss, commission=commission,
+                        initial_capital=initial_capital, method=method, horizon_bars=horizon_bars,
+                        block_size=block_size, commission_jitter=commission_jitter, slippage=slippage, seed=seed,
+                        band_rows=band_rows, execution=execution)
+
+
+def _generate_paths(rng, count):
+    """返回 (价格路径 (horizon, count), 每条路径的自然日跨度)。"""
+    close = _worker_data['close']
+    dates = _worker_data['dates']
+    horizon = _worker_data['horizon_bars']
+    if _worker_data['method'] == 'random_start':
+        starts = rng.integers(0, len(close) - horizon + 1, size=count)
+        rows = starts[None, :] + np.arange(horizon)[:, None]
+        return close[rows], (dates[starts + horizon - 1] - dates[starts]) // NS_PER_DAY
+
+    block = _worker_data['block_size']
+    returns = np.diff(np.log(close))
+    blocks = math.ceil((horizon - 1) / block)
+    starts = rng.integers(0, len(returns) - block + 1, size=(blocks, count))
+    rows = (starts[:, None, :] + np.arange(block)[None, :, None]).reshape(blocks * block, count)[:horizon - 1]
+    log_paths = np.vstack([np.zeros((1, count)), np.cumsum(returns[rows], axis=0)])
+    days = (dates[horizon - 1] - dates[0]) // NS_PER_DAY
+    return close[0] * np.exp(log_paths), np.full(count, days)
+
+
+def _simulate_batch(number, count):
+    rng = np.random.default_rng([_worker_data['seed'], number])
+    closes, days = _generate_paths(rng, count)
+    jitter = _worker_data['commission_jitter']
+    commission_scale = rng.uniform(1 - jitter, 1 + jitter, size=count) if jitter else None
+    slippage = rng.uniform(0, _worker_data['slippage'], size=count) if _worker_data['slippage'] else None
+
+    signals = _path_signals(closes, _worker_data['strategy_name'], _worker_data['params'])
+    result = simulate_signal_matrix(closes, signals, _worker_data['buy_amount'], _worker_data['commission'],
+                                    _worker_data['take_profit'], _worker_data['stop_loss'],
+                                    commission_scale=commission_scale, slippage=slippage,
+                                    execution=_worker_data['execution'])
+    initial_capital = _worker_data['initial_capital']
+    metrics = performance_metrics_matrix(result['portfolio_value'], result['cumulative_investment'],
+                                         result['first_investment'], days, initial_capital)
+
+    # 权益曲线以收益率百分比表示，口径与 totalReturn 相同 (基准资金，未设置时为截至当日的累计投入)
+    rows = _worker_data['band_rows']
+    values = result['portfolio_value'][rows]
+    base = np.full(values.shape, initial_capital) if initial_capital > 0 else result['cumulative_investment'][rows]
+    curves = np.zeros(values.shape)
+    np.divide(values, base, out=curves, where=base > 0)
+    return {**metrics, 'curves': curves * 100}
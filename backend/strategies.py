@@ -1,16 +1,133 @@
 # backend/strategies.py
+import inspect
+import math
+
 import pandas as pd
 import numpy as np
 from pandas.tseries.offsets import Day, BusinessDay, WeekOfMonth
 
+from kernels import trailing_stop_kernel
+from trading_calendar import SCHEDULE_FREQUENCIES, get_calendar
 
-def generate_signals(data, strategy_name, params):
-    strategy_function = globals().get(f"strategy_{strategy_name}")
-    if not strategy_function:
+# 策略注册表: 名称 -> Strategy
+STRATEGIES = {}
+# 所有信号型策略的买入金额都由 amount 指定 (由模拟器使用，不传给信号函数)
+AMOUNT_PARAM = {'type': 'number', 'default': 1000, 'min': 0, 'label': '每次买入金额'}
+
+
+class Strategy:
+    """
+    注册的策略。信号由以下两者之一生成:
+      signals: 向量化信号函数 (data, **params) -> data，写入 Signal (定投还有 InvestmentAmount) 列；
+      kernel: kernels.jit 编译的逐根 K 线信号内核 (close, *params, out_signal)，用于路径依赖的策略，
+              参数按 params 声明的顺序传入。
+    params: {参数名: 参数声明}，声明包含 type ('int' | 'number' | 'choice')、default、可选的 min/max/
+    exclusiveMin/choices/nullable/label。signal_matrix: 可选的批量信号函数，供参数扫描使用。
+    """
+
+    def __init__(self, name, label, params, signals=None, kernel=None, signal_matrix=None):
+        self.name = name
+        self.label = label
+        self.params = params
+        self.signals = signals
+        self.kernel = kernel
+        self.signal_matrix = signal_matrix
+        # 信号函数不接受的参数 (如 amount) 只由模拟器使用
+        if signals is not None:
+            self._signal_params = set(inspect.signature(signals).parameters) - {'data'}
+        else:
+            self._signal_params = set(params) - {'amount'}
+
+    def validate(self, params):
+        """校验并规范化参数，未提供的参数取默认值；参数无效时抛出 ValueError。"""
+        params = params or {}
+        unknown = set(params) - set(self.params)
+        if unknown:
+            raise ValueError(f"策略 '{self.name}' 不支持参数: {', '.join(sorted(unknown))}")
+        return {name: _validate_param(self.name, name, spec, params.get(name, spec.get('default')))
+                for name, spec in self.params.items()}
+
+    def generate(self, data, params):
+        if self.kernel is not None:
+            close = data['Close'].to_numpy(dtype=float).reshape(len(data))
+            signal = np.zeros(len(data), dtype=np.int64)
+            self.kernel(close, *[params[name] for name in self.params if name in self._signal_params], signal)
+            data['Signal'] = signal
+            return data
+        return self.signals(data, **{name: value for name, value in params.items() if name in self._signal_params})
+
+    def describe(self):
+        return {'name': self.name, 'label': self.label, 'params': self.params, 'kernel': self.kernel is not None,
+                'signalMatrix': self.signal_matrix is not None}
+
+
+def register_strategy(name, label, params=None):
+    """注册向量化信号函数。"""
+    def decorator(function):
+        STRATEGIES[name] = Strategy(name, label, params or {}, signals=function)
+        return function
+    return decorator
+
+
+def register_kernel_strategy(name, label, params, kernel):
+    """注册逐根 K 线的信号内核 (kernels.jit)；params 中除 amount 外的参数依次传给内核。"""
+    STRATEGIES[name] = Strategy(name, label, params, kernel=kernel)
+    return STRATEGIES[name]
+
+
+def register_signal_matrix(name):
+    """为已注册的策略登记批量信号函数。"""
+    def decorator(function):
+        get_strategy(name).signal_matrix = function
+        return function
+    return decorator
+
+
+def get_strategy(strategy_name):
+    strategy = STRATEGIES.get(strategy_name)
+    if strategy is None:
         raise ValueError(f"未知的策略名称: '{strategy_name}'")
-    return strategy_function(data.copy(), **params)
+    return strategy
+
+
+def describe_strategies():
+    """各策略的名称和参数声明，供前端生成参数表单。"""
+    return [strategy.describe() for strategy in STRATEGIES.values()]
+
+
+def generate_signals(data, strategy_name, params):
+    strategy = get_strategy(strategy_name)
+    return strategy.generate(data.copy(), strategy.validate(params))
 
 
+def _validate_param(strategy_name, name, spec, value):
+    label = f"策略 '{strategy_name}' 的参数 '{name}'"
+    if value is None or value == '':
+        if spec.get('nullable') or spec.get('default') is None:
+            return None
+        raise ValueError(f"{label} 不能为空。")
+    if spec['type'] == 'choice':
+        if value not in spec['choices']:
+            raise ValueError(f"{label} 必须是 {', '.join(map(str, spec['choices']))} 之一。")
+        return value
+    try:
+        number = float(value) if isinstance(value, str) else value
+        if isinstance(number, bool) or not isinstance(number, (int, float)) or not math.isfinite(number):
+            raise TypeError
+    except (TypeError, ValueError):
+        raise ValueError(f"{label} 必须是数字。")
+    if spec['type'] == 'int':
+        if number != int(number):
+            raise ValueError(f"{label} 必须是整数。")
+        number = int(number)
+    if 'min' in spec and (number <= spec['min'] if spec.get('exclusiveMin') else number < spec['min']):
+        raise ValueError(f"{label} 必须{'大于' if spec.get('exclusiveMin') else '不小于'} {spec['min']}。")
+    if 'max' in spec and number > spec['max']:
+        raise ValueError(f"{label} 不能大于 {spec['max']}。")
+    return number
+
+
+@register_strategy('buy_and_hold', '买入并持有', {'amount': AMOUNT_PARAM})
 def strategy_buy_and_hold(data):
     data['Signal'] = 0
     if not data.empty:
@@ -18,13 +135,21 @@ def strategy_buy_and_hold(data):
     return data
 
 
+@register_strategy('fixed_frequency', '定期定额', {
+    'frequency': {'type': 'choice', 'default': 'M', 'choices': ['W', '2W', 'M', 'Q', 'Y'], 'label': '投资频率'},
+    'amount': {**AMOUNT_PARAM, 'label': '每次金额'},
+    'day_of_week': {'type': 'int', 'default': None, 'min': 0, 'max': 6, 'nullable': True, 'label': '周几买入 (0-6)'},
+    'day_of_month': {'type': 'int', 'default': None, 'min': 1, 'max': 31, 'nullable': True,
+                     'label': '几号买入 (1-31)'},
+})
 def strategy_fixed_frequency(data, frequency='M', amount=1000, day_of_week=None, day_of_month=None):
     """
     定投策略.
-    frequency: 'W' (每周), 'M' (每月)
-    day_of_week: 0-6 (周一至周日), for 'W' frequency. If None, uses first trading day of week.
-    day_of_month: 1-31, for 'M' frequency. If None, uses first trading day of month.
+    frequency: 'W' (每周), '2W' (每两周), 'M' (每月), 'Q' (每季度)
+    day_of_week: 0-6 (周一至周日), for 'W'/'2W' frequency. If None, uses first trading day of week.
+    day_of_month: 1-31, for 'M'/'Q' frequency. If None, uses first trading day of month.
                   If day_of_month > days in month, uses last trading day of month.
+    买入日的具体规则见 trading_calendar。
     """
     data['Signal'] = 0
     data['InvestmentAmount'] = 0  # Initialize investment amount column
@@ -36,104 +161,30 @@ def strategy_fixed_frequency(data, frequency='M', amount=1000, day_of_week=None,
     if day_of_week is not None: day_of_week = int(day_of_week)
     if day_of_month is not None: day_of_month = int(day_of_month)
 
-    buy_dates = []
-
-    # Generate potential investment dates based on frequency
-    if frequency == 'W':
-        # Get all unique weeks in the data's index
-        potential_weeks = data.index.to_period('W').unique()
-        for week_start_period in potential_weeks:
-            week_start_date = week_start_period.start_time  # Monday of that week
-            if day_of_week is not None:
-                # Target specific day of the week
-                target_date = week_start_date + pd.Timedelta(days=day_of_week)
-            else:
-                # Default to first day of the week (Monday)
-                target_date = week_start_date
-
-            # Find the first actual trading day on or after the target_date within that week
-            # Ensure the target date is within the data's range
-            if target_date < data.index.min() or target_date > data.index.max() + pd.Timedelta(
-                    days=7):  # give some buffer for week end
-                continue
-
-            # Get trading days within the week of the target_date
-            days_in_week_of_target = data.loc[target_date.strftime('%Y-%m-%d'): (
-                        target_date + pd.Timedelta(days=6 - target_date.weekday())).strftime('%Y-%m-%d')].index
-
-            actual_buy_date = None
-            if not days_in_week_of_target.empty:
-                # Find the first trading day >= target_date
-                future_dates = days_in_week_of_target[days_in_week_of_target >= target_date]
-                if not future_dates.empty:
-                    actual_buy_date = future_dates.min()
-
-            if actual_buy_date:
-                buy_dates.append(actual_buy_date)
-
-    elif frequency == 'M':
-        potential_months = data.index.to_period('M').unique()
-        for month_start_period in potential_months:
-            month_start_date = month_start_period.start_time  # First day of the month
-
-            if day_of_month is not None:
-                try:
-                    # Construct target date: year, month, day_of_month
-                    target_date = pd.Timestamp(year=month_start_date.year, month=month_start_date.month,
-                                               day=day_of_month)
-                except ValueError:  # Invalid date (e.g., Feb 30th)
-                    # Use last day of the month
-                    target_date = month_start_date + pd.offsets.MonthEnd(0)
-            else:
-                # Default to first day of the month
-                target_date = month_start_date
-
-            if target_date < data.index.min() or target_date > data.index.max() + pd.Timedelta(
-                    days=31):  # buffer for month end
-                continue
-
-            # Get trading days within the month of the target_date
-            days_in_month_of_target = data.loc[
-                                      target_date.strftime('%Y-%m-01'): (target_date + pd.offsets.MonthEnd(0)).strftime(
-                                          '%Y-%m-%d')].index
-
-            actual_buy_date = None
-            if not days_in_month_of_target.empty:
-                future_dates = days_in_month_of_target[days_in_month_of_target >= target_date]
-                if not future_dates.empty:
-                    actual_buy_date = future_dates.min()
-                else:  # If target_day is past all trading days in month (e.g. 31st but last trading day is 28th)
-                    # Use last trading day of this month if it's not before the original target day
-                    if not days_in_month_of_target.empty:
-                        last_trading_day_of_month = days_in_month_of_target.max()
-                        if last_trading_day_of_month >= target_date:  # should not happen if future_dates is empty
-                            actual_buy_date = last_trading_day_of_month
-                        elif target_date.day > last_trading_day_of_month.day:  # e.g. target 31st, last trade day 28th
-                            actual_buy_date = last_trading_day_of_month
-
-            if actual_buy_date:
-                buy_dates.append(actual_buy_date)
+    if frequency in SCHEDULE_FREQUENCIES:
+        buy_positions = get_calendar(data.index).schedule(frequency, day_of_week, day_of_month)
     else:  # Default for other frequencies (e.g., 'Y' or custom, though not fully supported with day selection here)
-        freq_map = {'W': 'W-FRI', 'M': 'ME', 'Y': 'YE'}  # Simplified for original logic
+        freq_map = {'Y': 'YE'}  # Simplified for original logic
         actual_frequency = freq_map.get(frequency, frequency)
         resampled_dates = data.resample(actual_frequency).first().index
         # Intersect with actual trading days in data
-        buy_dates_pd = data.index.intersection(resampled_dates)
-        buy_dates = buy_dates_pd.tolist()
-
-    # Remove duplicates and sort, then filter by data range again
-    # And ensure they are actual trading days present in the data.index
-    valid_buy_dates = sorted(list(set(buy_dates)))
-    valid_buy_dates = [d for d in valid_buy_dates if
-                       d >= data.index.min() and d <= data.index.max() and d in data.index]
-
-    if valid_buy_dates:
-        data.loc[valid_buy_dates, 'Signal'] = 1
-        data.loc[valid_buy_dates, 'InvestmentAmount'] = amount
+        buy_positions = np.flatnonzero(data.index.isin(resampled_dates))
 
+    signal = np.zeros(len(data), dtype=np.int64)
+    signal[buy_positions] = 1
+    # 与按标签赋值时 pandas 的类型规则一致: 只有实际写入非整数金额时才变为浮点列
+    fractional = len(buy_positions) > 0 and float(amount) != int(amount)
+    investment = np.zeros(len(data), dtype=np.float64 if fractional else np.int64)
+    investment[buy_positions] = amount
+    data['Signal'] = signal
+    data['InvestmentAmount'] = investment
     return data
 
 
+@register_strategy('sma_cross', '单均线策略', {
+    'period': {'type': 'int', 'default': 20, 'min': 1, 'label': '均线周期'},
+    'amount': AMOUNT_PARAM,
+})
 def strategy_sma_cross(data, period=20):
     if period > len(data): raise ValueError("数据长度小于均线周期。")
     data['MA'] = data['Close'].rolling(window=int(period)).mean()
@@ -146,6 +197,11 @@ def strategy_sma_cross(data, period=20):
     return data
 
 
+@register_strategy('dma_cross', '双均线策略', {
+    'fast': {'type': 'int', 'default': 10, 'min': 1, 'label': '快线'},
+    'slow': {'type': 'int', 'default': 30, 'min': 1, 'label': '慢线'},
+    'amount': AMOUNT_PARAM,
+})
 def strategy_dma_cross(data, fast=10, slow=30):
     if slow > len(data) or fast > len(data): raise ValueError("数据长度小于均线周期。")
     data['SMA_fast'] = data['Close'].rolling(window=int(fast)).mean()
@@ -156,4 +212,72 @@ def strategy_dma_cross(data, fast=10, slow=30):
     data.loc[data['SMA_fast'] < data['SMA_slow'], 'Signal'] = -1
     # Avoid trading on NaNs
     data.loc[data['SMA_fast'].isnull() | data['SMA_slow'].isnull(), 'Signal'] = 0
-    return data
\ No newline at end of file
+    return data
+
+
+register_kernel_strategy('trailing_stop', '均线突破 + 移动止损', {
+    'period': {'type': 'int', 'default': 20, 'min': 1, 'label': '均线周期'},
+    'trail': {'type': 'number', 'default': 0.1, 'min': 0, 'max': 1, 'exclusiveMin': True, 'label': '回撤止损比例'},
+    'amount': AMOUNT_PARAM,
+}, trailing_stop_kernel)
+
+
+def generate_signal_matrix(data, strategy_name, param_sets):
+    """
+    批量生成信号矩阵: 行为交易日，列为 param_sets 中的各组策略参数。
+    使用注册表中为该策略登记的批量信号函数。每组参数先按与单次回测相同的参数声明校验，任一组无效时抛出 ValueError。
+    """
+    strategy = get_strategy(strategy_name)
+    if not strategy.signal_matrix:
+        raise ValueError(f"策略 '{strategy_name}' 不支持批量信号生成。")
+    param_sets = [strategy.validate(params) for params in param_sets]
+    close = data['Close'].to_numpy(dtype=float).reshape(len(data))
+    return strategy.signal_matrix(close, param_sets)
+
+
+def has_signal_matrix(strategy_name):
+    strategy = STRATEGIES.get(strategy_name)
+    return strategy is not None and strategy.signal_matrix is not None
+
+
+def rolling_means(close, windows):
+    """
+    一次累加和计算多个窗口的简单移动平均，返回 (交易日 x 窗口) 矩阵，不足窗口长度的位置为 NaN。
+    累加前先减去首个价格，降低长序列累加和的舍入误差。
+    """
+    windows = np.asarray(windows, dtype=np.int64)
+    offset = close[0] if len(close) else 0.0
+    csum = np.concatenate(([0.0], np.cumsum(close - offset)))
+    end = np.arange(1, len(close) + 1)[:, None]
+    begin = end - windows[None, :]
+    valid = begin >= 0
+    means = (csum[end] - csum[np.where(valid, begin, 0)]) / windows[None, :] + offset
+    means[~valid] = np.nan
+    return means
+
+
+def _cross_signals(fast, slow):
+    # fast > slow 为 1, fast < slow 为 -1, 相等或任一为 NaN 为 0
+    return np.where(fast > slow, 1, np.where(fast < slow, -1, 0)).astype(np.int8)
+
+
+@register_signal_matrix('sma_cross')
+def signal_matrix_sma_cross(close, param_sets):
+    periods = [int(params.get('period', 20)) for params in param_sets]
+    if max(periods) > len(close): raise ValueError("数据长度小于均线周期。")
+    windows = sorted(set(periods))
+    means = rolling_means(close, windows)
+    columns = [windows.index(period) for period in periods]
+    return _cross_signals(close[:, None], means[:, columns])
+
+
+@register_signal_matrix('dma_cross')
+def signal_matrix_dma_cross(close, param_sets):
+    fasts = [int(params.get('fast', 10)) for params in param_sets]
+    slows = [int(params.get('slow', 30)) for params in param_sets]
+    if max(slows) > len(close) or max(fasts) > len(close): raise ValueError("数据长度小于均线周期。")
+    windows = sorted(set(fasts) | set(slows))
+    means = rolling_means(close, windows)
+    fast_columns = [windows.index(fast) for fast in fasts]
+    slow_columns = [windows.index(slow) for slow in slows]
+    return _cross_signals(means[:, fast_columns], means[:, slow_columns])
@@ -0,0 +1,64 @@
+# backend/tests/conftest.py
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# 后端模块按顶层模块导入 (from utils import ...)
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+import kernels  # noqa: E402
+
+
+def make_prices(bars=400, seed=7, start='2021-01-04'):
+    """可复现的日线收盘价 (几何布朗运动)，以 Date 为索引。"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, bars)))
+    return pd.DataFrame({'Close': close}, index=pd.bdate_range(start, periods=bars, name='Date'))
+
+
+@pytest.fixture
+def prices():
+    return make_prices()
+
+
+@pytest.fixture(params=['jit', 'python'])
+def kernel_mode(request, monkeypatch):
+    """分别用 numba 编译的内核和纯 Python 内核 (与 BACKTEST_JIT=0 相同) 运行。"""
+    if request.param == 'jit':
+        if not kernels.JIT_ENABLED:
+            pytest.skip('numba 未安装或 BACKTEST_JIT=0')
+        return request.param
+    for kernel in (kernels.position_kernel, kernels.trailing_stop_kernel):
+        monkeypatch.setattr(kernel, 'compiled', None)
+    import backtest_engine
+    monkeypatch.setattr(backtest_engine, 'JIT_ENABLED', False)
+    return request.param
+
+
+def fake_provider(ticker, start_date, end_date):
+    """离线数据源: 每个代码一条固定的价格序列 (按代码选择随机种子)，返回 [start_date, end_date] 内的交易日。"""
+    prices = make_prices(bars=800, seed=sum(map(ord, ticker)), start='2020-01-01')
+    return prices[(prices.index >= start_date) & (prices.index <= end_date)], ticker
+
+
+@pytest.fixture
+def offline_prices(tmp_path, monkeypatch):
+    """把全局价格缓存替换为临时 SQLite 文件和离线数据源。"""
+    import utils
+    from price_cache import PriceCache
+    cache = PriceCache(str(tmp_path / 'prices.db'), [('fake', fake_provider)], retries=0,
+                       listeners=utils._refresh_listeners)
+    monkeypatch.setattr(utils, '_price_cache', cache)
+    return cache
+
+
+@pytest.fixture
+def client(offline_prices):
+    pytest.importorskip('flask')
+    from app import app
+    return app.test_client()
@@ -0,0 +1,97 @@
+# backend/tests/test_incremental.py
+"""增量回测与普通回测使用同一套参数校验，结果一致。"""
+import pytest
+
+from incremental import IncrementalBacktest
+from intraday import run_intraday_backtest
+
+CONFIG = {'ticker': 'TEST', 'startDate': '2020-01-01', 'endDate': '2022-12-31',
+          'commission': {'type': 'percentage', 'rate': 0.001, 'min_fee': 5.0}}
+
+
+def _config(params, strategy='sma_cross'):
+    return {**CONFIG, 'strategy': {'name': strategy, 'params': params}}
+
+
+@pytest.mark.parametrize('params', [{'period': -5}, {'period': 20.5}, {'period': 0}, {'period': 'abc'},
+                                    {'period': 20, 'bogus': 1}])
+def test_invalid_params_are_rejected_like_a_normal_backtest(client, params):
+    normal = client.post('/api/backtest', json=_config(params))
+    incremental = client.post('/api/backtest/incremental', json=_config(params))
+    assert normal.status_code == incremental.status_code == 400
+    assert incremental.get_json()['error'] == normal.get_json()['error']
+
+
+@pytest.mark.parametrize('params', [{'period': 0}, {'period': 'abc'}])
+def test_intraday_validates_params(params):
+    with pytest.raises(ValueError, match="参数 'period'"):
+        run_intraday_backtest(_config(params))
+
+
+@pytest.mark.parametrize('strategy, params', [
+    ('sma_cross', {}),
+    ('sma_cross', {'period': '30', 'amount': 2000}),
+    ('dma_cross', {'fast': 5.0}),
+    ('fixed_frequency', {'frequency': 'W'}),
+])
+def test_incremental_matches_normal_backtest(client, strategy, params):
+    normal = client.post('/api/backtest', json=_config(params, strategy))
+    incremental = client.post('/api/backtest/incremental', json=_config(params, strategy))
+    assert normal.status_code == incremental.status_code == 200
+    assert incremental.get_json()['metrics'] == {name: normal.get_json()['metrics'][name]
+                                                 for name in incremental.get_json()['metrics']}
+
+
+def test_schema_defaults_come_from_the_registry():
+    engine = IncrementalBacktest(_config({}, 'dma_cross'))
+    assert engine.windows == [10, 30]
+    assert engine.buy_amount == 1000.0
+
+
+def _checkpoint(client, strategy='dma_cross'):
+    response = client.post('/api/backtest/incremental', json={**_config({}, strategy), 'endDate': '2021-06-30'})
+    assert response.status_code == 200
+    return response.get_json()['checkpoint']
+
+
+@pytest.mark.parametrize('strategy', ['dma_cross', 'fixed_frequency'])
+def test_resumed_checkpoint_matches_full_run(client, strategy):
+    checkpoint = _checkpoint(client, strategy)
+    resumed = client.post('/api/backtest/incremental', json={**_config({}, strategy), 'checkpoint': checkpoint})
+    full = client.post('/api/backtest/incremental', json=_config({}, strategy))
+    assert resumed.get_json()['resumed'] and not full.get_json()['resumed']
+    assert resumed.get_json()['metrics'] == full.get_json()['metrics']
+
+
+def _without(mapping, key):
+    return {k: v for k, v in mapping.items() if k != key}
+
+
+@pytest.mark.parametrize('corrupt', [
+    lambda c: _without(c, 'state'),
+    lambda c: _without(c, 'periodVolumes'),
+    lambda c: {**c, 'state': _without(c['state'], 'cash')},
+    lambda c: {**c, 'state': {**c['state'], 'cash': 'abc'}},
+    lambda c: {**c, 'stats': [1, 2]},
+    lambda c: {**c, 'bars': -1},
+    lambda c: {**c, 'lastBar': ['not a date', 1.0]},
+    lambda c: {**c, 'lastBar': None},
+    lambda c: {**c, 'rolling': c['rolling'][:1]},
+    lambda c: {**c, 'rolling': [_without(c['rolling'][0], 'sum')] + c['rolling'][1:]},
+    lambda c: {**c, 'rolling': [{**c['rolling'][0], 'values': 'abc'}] + c['rolling'][1:]},
+])
+def test_malformed_checkpoint_is_a_client_error(client, corrupt):
+    checkpoint = corrupt(_checkpoint(client))
+    response = client.post('/api/backtest/incremental', json={**_config({}, 'dma_cross'), 'checkpoint': checkpoint})
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('检查点格式无效')
+
+
+def test_unknown_checkpoint_fields_are_ignored(client):
+    checkpoint = _checkpoint(client)
+    checkpoint['rolling'] = [{**state, 'push': 1, 'extra': 2} for state in checkpoint['rolling']]
+    checkpoint['state'] = {**checkpoint['state'], 'extra': 1}
+    engine = IncrementalBacktest.from_checkpoint(checkpoint, _config({}, 'dma_cross'))
+    rolling = next(iter(engine.rolling.values()))
+    assert callable(rolling.push) and not hasattr(rolling, 'extra')
+    assert 'extra' not in engine.state
@@ -0,0 +1,60 @@
+# backend/tests/test_optimizer.py
+"""参数扫描: 信号矩阵批量回测与逐组回测的指标一致。"""
+import pytest
+
+import optimizer
+from backtest_engine import run_backtest_matrix, run_backtest_on_data
+from optimizer import apply_params, expand_param_grid
+
+METRICS = ('totalReturn', 'annualizedReturn', 'maxDrawdown')
+BASE_CONFIG = {
+    'commission': {'type': 'percentage', 'rate': 0.001, 'min_fee': 5.0},
+    'initialCapital': 0,
+}
+
+
+def _single_run_metrics(config, prices, params):
+    metrics = run_backtest_on_data(apply_params(config, params), prices, include_charts=False)['metrics']
+    return {name: metrics[name] for name in METRICS}
+
+
+@pytest.mark.parametrize('strategy, grid', [
+    ('sma_cross', {'period': [10, 20, 50], 'amount': [1000, 50000]}),
+    ('dma_cross', {'fast': [5, 10], 'slow': [30, 60], 'amount': [1000, 50000], 'takeProfit': [None, 0.1]}),
+])
+def test_matrix_matches_single_runs(prices, strategy, grid):
+    config = {**BASE_CONFIG, 'strategy': {'name': strategy, 'params': {'amount': 1000}}}
+    combinations = expand_param_grid(grid)
+    batched = run_backtest_matrix(config, prices, combinations)
+    for params, metrics in zip(combinations, batched):
+        assert {name: metrics[name] for name in METRICS} == pytest.approx(
+            _single_run_metrics(config, prices, params)), params
+
+
+def test_amount_changes_batched_metrics(prices):
+    config = {**BASE_CONFIG, 'strategy': {'name': 'sma_cross', 'params': {}}}
+    small, large = run_backtest_matrix(config, prices, [{'period': 20, 'amount': 1000},
+                                                        {'period': 20, 'amount': 50000}])
+    assert small['totalReturn'] != large['totalReturn']
+
+
+def test_invalid_combinations_are_reported_as_errors(prices, monkeypatch):
+    config = {**BASE_CONFIG, 'strategy': {'name': 'dma_cross', 'params': {}}}
+    monkeypatch.setattr(optimizer, 'get_price_data_and_names', lambda tickers, start, end: [(prices, 'TEST')])
+    result = optimizer.run_optimization({**config, 'ticker': 'TEST', 'startDate': '2021-01-01',
+                                         'endDate': '2022-12-31'},
+                                        {'fast': [0, 5, 5.5], 'slow': [30, 60]}, max_workers=1)
+    assert result['evaluated'] == result['total'] == 6
+    assert sorted(row['params']['fast'] for row in result['errors']) == [0, 0, 5.5, 5.5]
+    assert all('fast' in row['error'] for row in result['errors'])
+    assert [row['params']['fast'] for row in result['results']] == [5, 5]
+    for row in result['results']:
+        assert row['metrics'] == pytest.approx(_single_run_metrics(config, prices, row['params']))
+
+
+def test_unknown_parameter_is_reported_as_error(prices):
+    optimizer._init_worker({**BASE_CONFIG, 'strategy': {'name': 'sma_cross', 'params': {}}},
+                           optimizer._pack_frame(prices), None)
+    rows = optimizer._evaluate_batch([{'period': 10}, {'period': 20, 'bogus': 1}])
+    assert 'metrics' in rows[0]
+    assert 'bogus' in rows[1]['error']
@@ -0,0 +1,58 @@
+# backend/tests/test_portfolio.py
+"""组合回测: 再平衡的佣金从组合市值中预留，不加杠杆。"""
+import numpy as np
+import pytest
+
+from conftest import make_prices
+from portfolio import rebalance_mask, run_portfolio_backtest, simulate_portfolio
+
+COMMISSIONS = {
+    'percentage_min_fee': {'type': 'percentage', 'rate': 0.0003, 'min_fee': 5.0},
+    'percentage': {'type': 'percentage', 'rate': 0.01, 'min_fee': 0.0},
+    'fixed': {'type': 'fixed', 'fee': 5.0},
+}
+
+
+def _price_matrix(assets, bars=300):
+    frames = [make_prices(bars=bars, seed=seed) for seed in range(assets)]
+    return frames[0].index, np.column_stack([frame['Close'].to_numpy() for frame in frames])
+
+
+@pytest.mark.parametrize('commission', COMMISSIONS)
+@pytest.mark.parametrize('frequency', ['W', 'M'])
+def test_rebalancing_never_borrows_for_fees(commission, frequency):
+    dates, prices = _price_matrix(200)
+    weights = np.full(prices.shape[1], 1.0 / prices.shape[1])
+    mask = rebalance_mask(dates, frequency)
+    result = simulate_portfolio(prices, weights, mask, 100000.0, COMMISSIONS[commission])
+
+    assert result['cash'].min() >= -1e-6
+    assert result['commissions'].sum() > 0
+    # 建仓当天: 市值 = 期初资金 - 佣金，几乎全部投入
+    assert result['nav'][0] == pytest.approx(100000.0 - result['commissions'][0])
+    assert result['cash'][0] < 1.0
+
+
+def test_execution_model_is_rejected(offline_prices):
+    config = {'assets': [{'ticker': 'AAA'}, {'ticker': 'BBB'}], 'startDate': '2020-01-01',
+              'endDate': '2021-12-31', 'execution': {'market': 'cn_a'}}
+    with pytest.raises(ValueError, match='execution'):
+        run_portfolio_backtest(config)
+
+
+def test_benchmark_is_loaded_in_the_same_batch(offline_prices, monkeypatch):
+    import portfolio
+    batches = []
+    load = portfolio.get_price_data_and_names
+
+    def recording(tickers, start_date, end_date):
+        batches.append(list(tickers))
+        return load(tickers, start_date, end_date)
+
+    monkeypatch.setattr(portfolio, 'get_price_data_and_names', recording)
+    config = {'assets': [{'ticker': 'AAA'}, {'ticker': 'BBB'}], 'startDate': '2020-01-01',
+              'endDate': '2021-12-31', 'rebalance': 'M', 'benchmarkTicker': 'IDX'}
+    results = run_portfolio_backtest(config)
+    assert batches == [['AAA', 'BBB', 'IDX']]
+    assert config['benchmarkAssetName'] == 'IDX'
+    assert results['portfolio']['rebalanceCount'] > 1
@@ -0,0 +1,145 @@
+# backend/tests/test_price_cache.py
+"""价格缓存的窗口边界: 使用离线的假数据源，不访问网络。"""
+import sys
+import types
+
+import pandas as pd
+import pytest
+
+from price_cache import PriceCache
+from utils import fetch_from_yfinance
+
+TRADING_DAYS = pd.bdate_range('2020-01-01', '2021-12-31', name='Date')
+
+
+def _frame(days):
+    return pd.DataFrame({'Close': [float(day.toordinal()) for day in days]}, index=days)
+
+
+class FakeProvider:
+    """按数据源约定返回 [start, end] (包含两端) 内的交易日，并记录请求的窗口。"""
+
+    def __init__(self):
+        self.requests = []
+
+    def __call__(self, ticker, start_date, end_date):
+        self.requests.append((start_date, end_date))
+        return _frame(TRADING_DAYS[(TRADING_DAYS >= start_date) & (TRADING_DAYS <= end_date)]), ticker
+
+
+@pytest.fixture
+def fake_yfinance(monkeypatch):
+    """假的 yfinance 模块: download 与真实接口相同，end 不含当天。"""
+    requests = []
+
+    def download(ticker, start, end, **kwargs):
+        requests.append((start, end))
+        return _frame(TRADING_DAYS[(TRADING_DAYS >= start) & (TRADING_DAYS < end)])
+
+    module = types.SimpleNamespace(download=download, Ticker=lambda ticker: types.SimpleNamespace(info={}))
+    monkeypatch.setitem(sys.modules, 'yfinance', module)
+    return requests
+
+
+def _cache(tmp_path, fetch, name='fake'):
+    return PriceCache(str(tmp_path / 'prices.db'), [(name, fetch)], retries=0)
+
+
+def _expected(start_date, end_date):
+    return list(TRADING_DAYS[(TRADING_DAYS >= start_date) & (TRADING_DAYS <= end_date)])
+
+
+@pytest.mark.parametrize('provider', ['fake', 'yfinance'])
+def test_window_edges_are_cached(tmp_path, fake_yfinance, provider):
+    cache = _cache(tmp_path, FakeProvider() if provider == 'fake' else fetch_from_yfinance, provider)
+    # 2021-03-02 为周二: 头部缺口结束于周一 03-01，尾部以周五 03-26/04-30 结束
+    df, _ = cache.get('QQQ', '2021-03-02', '2021-03-26')
+    assert list(df.index) == _expected('2021-03-02', '2021-03-26')
+
+    df, _ = cache.get('QQQ', '2021-02-01', '2021-04-30')
+    assert list(df.index) == _expected('2021-02-01', '2021-04-30')
+    assert list(cache.read_all('QQQ').index) == _expected('2021-02-01', '2021-04-30')
+
+
+def test_covered_window_is_not_refetched(tmp_path):
+    provider = FakeProvider()
+    cache = _cache(tmp_path, provider)
+    cache.get('QQQ', '2021-03-02', '2021-03-26')
+    cache.get('QQQ', '2021-02-01', '2021-04-30')
+    assert provider.requests == [('2021-03-02', '2021-03-26'), ('2021-02-01', '2021-03-01'),
+                                 ('2021-03-27', '2021-04-30')]
+    df, _ = cache.get('QQQ', '2021-02-15', '2021-04-15')
+    assert len(provider.requests) == 3
+    assert list(df.index) == _expected('2021-02-15', '2021-04-15')
+
+
+def test_yfinance_end_date_is_inclusive(fake_yfinance):
+    df, _ = fetch_from_yfinance('QQQ', '2021-03-01', '2021-03-05')
+    assert fake_yfinance == [('2021-03-01', '2021-03-06')]
+    assert df.index[-1] == pd.Timestamp('2021-03-05')
+
+
+class CountingProvider:
+    """依次抛出 errors 中的异常，之后返回 FakeProvider 的数据；记录调用次数。"""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self, ticker, start_date, end_date):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return FakeProvider()(ticker, start_date, end_date)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    recorded = []
+    monkeypatch.setattr('price_cache.time.sleep', recorded.append)
+    return recorded
+
+
+def _retrying_cache(tmp_path, *providers):
+    return PriceCache(str(tmp_path / 'prices.db'), [(f'p{i}', fetch) for i, fetch in enumerate(providers)],
+                      retries=2, retry_backoff=0.5)
+
+
+def test_unknown_ticker_is_not_retried(tmp_path, sleeps):
+    first = CountingProvider(ValueError('unknown'), ValueError('unknown'), ValueError('unknown'))
+    second = CountingProvider(KeyError('date'), KeyError('date'), KeyError('date'))
+    cache = _retrying_cache(tmp_path, first, second)
+    with pytest.raises(ValueError, match='所有数据源均获取失败'):
+        cache.get('NOPE', '2021-03-01', '2021-03-31')
+    assert (first.calls, second.calls) == (1, 1)
+    assert sleeps == []
+    assert cache.stats()['fetch_retries'] == 0
+
+
+def test_deterministic_error_falls_through_to_next_provider(tmp_path, sleeps):
+    first = CountingProvider(ValueError('not an A-share code'))
+    second = CountingProvider()
+    df, _ = _retrying_cache(tmp_path, first, second).get('QQQ', '2021-03-01', '2021-03-31')
+    assert (first.calls, second.calls) == (1, 1)
+    assert list(df.index) == _expected('2021-03-01', '2021-03-31')
+    assert sleeps == []
+
+
+def test_transient_errors_are_retried_with_backoff(tmp_path, sleeps):
+    first = CountingProvider(ConnectionError('reset'), TimeoutError('slow'))
+    second = CountingProvider()
+    cache = _retrying_cache(tmp_path, first, second)
+    df, _ = cache.get('QQQ', '2021-03-01', '2021-03-31')
+    assert (first.calls, second.calls) == (3, 0)
+    assert len(df) == len(_expected('2021-03-01', '2021-03-31'))
+    # 指数退避: retry_backoff * 2 ** attempt，乘以 0.5-1.0 的随机抖动
+    assert 0.25 <= sleeps[0] <= 0.5 and 0.5 <= sleeps[1] <= 1.0
+    assert cache.stats()['fetch_retries'] == 2
+
+
+def test_transient_errors_fall_through_after_retries(tmp_path, sleeps):
+    first = CountingProvider(*[ConnectionError('down')] * 3)
+    second = CountingProvider()
+    _retrying_cache(tmp_path, first, second).get('QQQ', '2021-03-01', '2021-03-31')
+    assert (first.calls, second.calls) == (3, 1)
+    assert len(sleeps) == 2
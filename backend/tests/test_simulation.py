@@ -0,0 +1,46 @@
+# backend/tests/test_simulation.py
+"""数组内核 (vectorized) 与逐行参考实现 (reference) 逐日逐列一致。"""
+import pandas as pd
+import pytest
+
+from backtest_engine import simulate_strategy
+from kernels import TRADE_TAKE_PROFIT, TRADE_STOP_LOSS
+from strategies import STRATEGIES
+
+STRATEGY_PARAMS = {
+    'buy_and_hold': {'amount': 5000},
+    'fixed_frequency': {'frequency': 'W', 'amount': 500, 'day_of_week': 2},
+    'sma_cross': {'period': 20, 'amount': 1000},
+    'dma_cross': {'fast': 5, 'slow': 30, 'amount': 1000},
+    'trailing_stop': {'period': 20, 'trail': 0.08, 'amount': 1000},
+}
+COMMISSIONS = {
+    'none': {},
+    'percentage': {'type': 'percentage', 'rate': 0.001, 'min_fee': 5.0},
+    'fixed': {'type': 'fixed', 'fee': 3.0},
+}
+EXITS = {
+    'no_exit': {},
+    'tp_sl': {'takeProfit': 0.05, 'stopLoss': 0.04},
+}
+
+
+def test_every_strategy_is_covered():
+    assert set(STRATEGY_PARAMS) == set(STRATEGIES)
+
+
+@pytest.mark.parametrize('exits', EXITS)
+@pytest.mark.parametrize('commission', COMMISSIONS)
+@pytest.mark.parametrize('strategy', STRATEGY_PARAMS)
+def test_vectorized_matches_reference(prices, kernel_mode, strategy, commission, exits):
+    config = {'strategy': {'name': strategy, 'params': STRATEGY_PARAMS[strategy]},
+              'commission': COMMISSIONS[commission], 'initialCapital': 0, **EXITS[exits]}
+    vectorized, first_vectorized = simulate_strategy(config, prices, mode='vectorized')
+    reference, first_reference = simulate_strategy(config, prices, mode='reference')
+
+    assert first_vectorized == first_reference
+    assert list(vectorized.columns) == list(reference.columns)
+    pd.testing.assert_frame_equal(vectorized, reference, check_dtype=False, check_exact=True)
+    assert (vectorized['Trade_Action'] != 0).any()
+    if exits == 'tp_sl' and strategy != 'fixed_frequency':
+        assert vectorized['Trade_Action'].isin([TRADE_TAKE_PROFIT, TRADE_STOP_LOSS]).any()
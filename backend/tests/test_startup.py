@@ -0,0 +1,20 @@
+# backend/tests/test_startup.py
+"""启动耗时预算: 在新的解释器中导入模块 (见 benchmarks/bench_startup.py)。"""
+import importlib.util
+
+import pytest
+
+from benchmarks.bench_startup import DEFAULT_BUDGET, LAZY_MODULES, measure
+
+REPEAT = 3
+
+
+@pytest.mark.parametrize('module', ['app', 'backtest_engine'])
+def test_import_skips_data_sources_and_stays_within_budget(module):
+    if module == 'app' and importlib.util.find_spec('flask') is None:
+        pytest.skip('flask 未安装')
+    runs = [measure(module)[0] for _ in range(REPEAT)]
+    for run in runs:
+        assert not set(run['loaded']) & set(LAZY_MODULES), f"import {module} 加载了 {run['loaded']}"
+    best = min(run['seconds'] for run in runs)
+    assert best <= DEFAULT_BUDGET, f"import {module} 耗时 {best:.3f} 秒，超过预算 {DEFAULT_BUDGET} 秒"
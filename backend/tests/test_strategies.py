@@ -0,0 +1,33 @@
+# backend/tests/test_strategies.py
+"""批量信号矩阵与单次回测使用同一套参数校验。"""
+import numpy as np
+import pytest
+
+from strategies import generate_signal_matrix, generate_signals
+
+INVALID_PARAMS = [
+    ('sma_cross', {'period': 5.5}),
+    ('sma_cross', {'period': 0}),
+    ('dma_cross', {'fast': 5.5, 'slow': 30}),
+    ('dma_cross', {'fast': 0, 'slow': 30}),
+    ('dma_cross', {'fast': 5, 'slow': 30, 'bogus': 1}),
+]
+
+
+@pytest.mark.parametrize('strategy, params', INVALID_PARAMS)
+def test_signal_matrix_rejects_what_single_run_rejects(prices, strategy, params):
+    with pytest.raises(ValueError) as single:
+        generate_signals(prices, strategy, params)
+    with pytest.raises(ValueError) as batched:
+        generate_signal_matrix(prices, strategy, [{}, params])
+    assert str(batched.value) == str(single.value)
+
+
+@pytest.mark.parametrize('strategy, param_sets', [
+    ('sma_cross', [{'period': 10}, {'period': '20'}, {}]),
+    ('dma_cross', [{'fast': 5, 'slow': 30}, {'fast': 10.0, 'slow': 60}, {}]),
+])
+def test_signal_matrix_matches_single_signals(prices, strategy, param_sets):
+    matrix = generate_signal_matrix(prices, strategy, param_sets)
+    for j, params in enumerate(param_sets):
+        np.testing.assert_array_equal(matrix[:, j], generate_signals(prices, strategy, params)['Signal'].to_numpy())
@@ -0,0 +1,46 @@
+# backend/tests/test_trade_ledger.py
+"""成交记录与逐笔统计的边界情况。"""
+import json
+import math
+
+import numpy as np
+import pandas as pd
+
+from kernels import TRADE_BUY, TRADE_SIGNAL_SELL
+from trade_ledger import build_trade_ledger, concat_events, ledger_columns, trade_events, trade_statistics
+
+TIMES = pd.bdate_range('2021-01-04', periods=6)
+
+
+def _is_negative_zero(value):
+    return value == 0 and math.copysign(1.0, value) < 0
+
+
+def test_statistics_without_trades():
+    ledger = build_trade_ledger(concat_events([]), last_index=0, last_price=100.0)
+    stats = trade_statistics(ledger, capital_base=0.0)
+    assert stats['trades'] == stats['openTrades'] == 0
+    assert stats['winRate'] is None and stats['profitFactor'] is None and stats['turnover'] is None
+    for name in ('grossProfit', 'grossLoss', 'totalCommission'):
+        assert stats[name] == 0.0 and not _is_negative_zero(stats[name])
+    assert '-0.0' not in json.dumps(stats)
+    assert all(values == [] for values in ledger_columns(ledger).values())
+
+
+def test_statistics_with_only_winning_trades():
+    # 两个持仓周期: 100 买入 110 卖出，105 买入 120 卖出
+    close = np.array([100.0, 110.0, 108.0, 105.0, 120.0, 121.0])
+    action = np.array([TRADE_BUY, TRADE_SIGNAL_SELL, 0, TRADE_BUY, TRADE_SIGNAL_SELL, 0])
+    shares = np.array([10.0, 0.0, 0.0, 10.0, 0.0, 0.0])
+    cash = np.array([-1000.0, 100.0, 100.0, -950.0, 250.0, 250.0])
+    events = trade_events(TIMES, action, close, cash, shares, np.zeros(len(close)))
+    ledger = build_trade_ledger(events, last_index=len(close) - 1, last_price=close[-1])
+
+    np.testing.assert_allclose(ledger['pnl'], [100.0, 150.0])
+    stats = trade_statistics(ledger, capital_base=2050.0)
+    assert stats['trades'] == 2 and stats['openTrades'] == 0
+    assert stats['winRate'] == 100.0
+    assert stats['grossProfit'] == 250.0
+    assert stats['grossLoss'] == 0.0 and not _is_negative_zero(stats['grossLoss'])
+    assert stats['profitFactor'] is None
+    assert '-0.0' not in json.dumps(stats)
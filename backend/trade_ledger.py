@@ -0,0 +1,201 @@
+# backend/trade_ledger.py
+"""
+成交记录 (trade ledger)。
+模拟内核逐根 K 线输出成交类型和佣金 (kernels.TRADE_*)；这里把有成交的 K 线取出为稀疏的成交事件，
+再按持仓周期 (从空仓买入到全部卖出) 汇总为列式的成交记录，逐笔统计也在数组上按列计算。
+一个持仓周期内可以有多次买入 (定投、信号反复)，入场价为各次买入的成交量加权均价；回测结束时未平仓的记录
+按最后一根 K 线的收盘价估值，reason 为 open。
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+from kernels import TRADE_BUY, TRADE_SIGNAL_SELL, TRADE_TAKE_PROFIT, TRADE_STOP_LOSS
+
+EXIT_REASONS = {TRADE_SIGNAL_SELL: 'signal', TRADE_TAKE_PROFIT: 'takeProfit', TRADE_STOP_LOSS: 'stopLoss'}
+OPEN_REASON = 'open'
+LEDGER_COLUMNS = ('entryIndex', 'exitIndex', 'entryDate', 'exitDate', 'entryPrice', 'exitPrice', 'shares', 'fills',
+                  'cost', 'proceeds', 'commission', 'pnl', 'returnPct', 'bars', 'reason')
+EXPORT_FORMATS = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 5000
+NS_PER_DAY = 86400 * 10 ** 9
+
+_EVENT_KEYS = ('index', 'time', 'action', 'price', 'amount', 'shares', 'commission')
+
+
+def trade_events(times, action, close, cash, shares, commission, initial_cash=0.0, initial_shares=0.0, offset=0):
+    """
+    从逐根 K 线的模拟输出中取出有成交的 K 线。
+    amount 为现金变动的绝对值 (买入含佣金的支出，卖出扣除佣金后的所得)，shares 为成交股数。
+    initial_cash/initial_shares 为第一根 K 线之前的状态，offset 为第一根 K 线在整段序列中的下标。
+    """
+    action = np.asarray(action)
+    index = np.flatnonzero(action)
+    cash = np.asarray(cash, dtype=float)
+    shares = np.asarray(shares, dtype=float)
+    previous_cash = np.where(index > 0, cash[index - 1], initial_cash)
+    previous_shares = np.where(index > 0, shares[index - 1], initial_shares)
+    return {
+        'index': index + offset,
+        'time': np.asarray(times, dtype='datetime64[ns]')[index],
+        'action': action[index].astype(np.int8),
+        'price': np.asarray(close, dtype=float)[index],
+        'amount': np.abs(cash[index] - previous_cash),
+        'shares': np.abs(shares[index] - previous_shares),
+        'commission': np.asarray(commission, dtype=float)[index],
+    }
+
+
+def concat_events(events):
+    if not events:
+        dtypes = {'index': np.int64, 'time': 'datetime64[ns]', 'action': np.int8}
+        return {key: np.empty(0, dtype=dtypes.get(key, float)) for key in _EVENT_KEYS}
+    return {key: np.concatenate([part[key] for part in events]) for key in _EVENT_KEYS}
+
+
+def truncate_events(events, start_time):
+    """去掉 start_time 及之后的成交事件 (这些 K 线将被重新模拟)。"""
+    keep = events['time'] < np.datetime64(start_time, 'ns')
+    return {key: values[keep] for key, values in events.items()}
+
+
+def build_trade_ledger(events, last_index, last_price):
+    """按持仓周期汇总成交事件，返回列式记录 {列名: ndarray}。last_* 为最后一根 K 线，用于未平仓记录的估值。"""
+    action = events['action']
+    buy = action == TRADE_BUY
+    # 回测从空仓开始，卖出总是清仓: 第一笔成交和卖出之后的第一笔买入开始新的持仓周期
+    opens = buy & np.concatenate(([True], ~buy[:-1]))[:len(buy)]
+    position = np.cumsum(opens) - 1
+    count = int(opens.sum())
+    buy_position = position[buy]
+    sell = ~buy
+    sell_position = position[sell]
+
+    shares = _sum_by(buy_position, events['shares'][buy], count)
+    notional = _sum_by(buy_position, events['shares'][buy] * events['price'][buy], count)
+    cost = _sum_by(buy_position, events['amount'][buy], count)
+    commission = _sum_by(buy_position, events['commission'][buy], count)
+    commission[sell_position] += events['commission'][sell]
+
+    exit_index = np.full(count, -1, dtype=np.int64)
+    exit_index[sell_position] = events['index'][sell]
+    exit_time = np.full(count, np.datetime64('NaT'), dtype='datetime64[ns]')
+    exit_time[sell_position] = events['time'][sell]
+    exit_price = np.full(count, float(last_price))
+    exit_price[sell_position] = events['price'][sell]
+    # 未平仓: 按最后收盘价估值，不计卖出佣金
+    proceeds = shares * exit_price
+    proceeds[sell_position] = events['amount'][sell]
+    reason = np.full(count, OPEN_REASON, dtype=object)
+    for code, name in EXIT_REASONS.items():
+        reason[sell_position[events['action'][sell] == code]] = name
+
+    entry_index = events['index'][opens]
+    pnl = proceeds - cost
+    return {
+        'entryIndex': entry_index,
+        'exitIndex': exit_index,
+        'entryDate': events['time'][opens],
+        'exitDate': exit_time,
+        'entryPrice': np.divide(notional, shares, out=np.zeros(count), where=shares > 0),
+        'exitPrice': exit_price,
+        'shares': shares,
+        'fills': np.bincount(buy_position, minlength=count),
+        'cost': cost,
+        'proceeds': proceeds,
+        'commission': commission,
+        'pnl': pnl,
+        'returnPct': np.divide(pnl, cost, out=np.zeros(count), where=cost > 0) * 100,
+        'bars': np.where(exit_index >= 0, exit_index, last_index) - entry_index,
+        'reason': reason,
+    }
+
+
+def _sum_by(position, values, count):
+    # 没有成交时 bincount 返回整数数组，统一为浮点数
+    return np.bincount(position, values, minlength=count).astype(float, copy=False)
+
+
+def trade_statistics(ledger, capital_base):
+    """
+    逐笔统计 (只统计已平仓的记录): 胜率、平均收益率、平均持仓 K 线数和天数、盈亏比 (总盈利 / 总亏损)；
+    换手率为买入和卖出的成交额之和除以 capital_base (参考资金，未设置时为累计投入)。
+    """
+    closed = ledger['exitIndex'] >= 0
+    pnl = ledger['pnl'][closed]
+    gross_profit = float(pnl[pnl > 0].sum())
+    gross_loss = abs(float(pnl[pnl < 0].sum()))  # 没有亏损时为 0.0 而不是 -0.0
+    held_ns = (ledger['exitDate'][closed] - ledger['entryDate'][closed]).astype(np.int64)
+    traded = float((ledger['shares'] * ledger['entryPrice']).sum()
+                   + (ledger['shares'][closed] * ledger['exitPrice'][closed]).sum())
+    has_closed = bool(closed.any())
+    return {
+        'trades': int(closed.sum()),
+        'openTrades': int((~closed).sum()),
+        'winRate': round(float((pnl > 0).mean() * 100), 2) if has_closed else None,
+        'avgReturn': round(float(ledger['returnPct'][closed].mean()), 2) if has_closed else None,
+        'avgHoldingBars': round(float(ledger['bars'][closed].mean()), 2) if has_closed else None,
+        'avgHoldingDays': round(float(held_ns.mean() / NS_PER_DAY), 2) if has_closed else None,
+        'profitFactor': round(gross_profit / gross_loss, 4) if gross_loss > 0 else None,
+        'grossProfit': round(gross_profit, 2),
+        'grossLoss': round(gross_loss, 2),
+        'totalCommission': round(float(ledger['commission'].sum()), 2),
+        'turnover': round(traded / capital_base, 4) if capital_base > 0 else None,
+    }
+
+
+def ledger_columns(ledger, date_format='%Y-%m-%d'):
+    """转换为可 JSON 序列化的列式结构 {列名: 列表}；未平仓记录的 exitIndex/exitDate 为 None。"""
+    open_positions = ledger['exitIndex'] < 0
+    columns = {}
+    for name in LEDGER_COLUMNS:
+        values = ledger[name]
+        if name in ('exitIndex', 'exitDate'):
+            values = (pd.DatetimeIndex(values).strftime(date_format).to_numpy(dtype=object) if name == 'exitDate'
+                      else values.astype(object))
+            values[open_positions] = None
+            columns[name] = values.tolist()
+        elif name == 'entryDate':
+            columns[name] = pd.DatetimeIndex(values).strftime(date_format).tolist()
+        elif values.dtype.kind == 'f':
+            columns[name] = np.round(values, 4 if name in ('entryPrice', 'exitPrice', 'shares') else 2).tolist()
+        else:
+            columns[name] = values.tolist()
+    return columns
+
+
+def page_trades(trades, offset=0, limit=DEFAULT_PAGE_SIZE):
+    """列式成交记录的一页: {'total', 'offset', 'limit', 'columns'}。"""
+    total = len(trades['entryIndex'])
+    offset = min(max(int(offset), 0), total)
+    limit = min(max(int(limit), 1), MAX_PAGE_SIZE)
+    return {'total': total, 'offset': offset, 'limit': limit,
+            'columns': {name: values[offset:offset + limit] for name, values in trades.items()}}
+
+
+def with_trade_page(results, limit=DEFAULT_PAGE_SIZE):
+    """
+    响应中的成交记录只保留第一页，完整记录通过 /api/results/<resultId>/trades 分页或导出。
+    没有 resultId (结果未进入结果缓存，无法再取回) 时返回完整记录。
+    """
+    trades = results.get('trades') if isinstance(results, dict) else None
+    if not trades or 'columns' in trades or 'resultId' not in results:
+        return results
+    return {**results, 'trades': page_trades(trades, 0, limit)}
+
+
+def export_trades(trades, export_format):
+    """导出为 CSV 或 Parquet，返回 (bytes, mimetype)。Parquet 需要 pyarrow (可选依赖)。"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: '{export_format}'")
+    frame = pd.DataFrame(trades, columns=list(LEDGER_COLUMNS))
+    if export_format == 'csv':
+        return frame.to_csv(index=False).encode('utf-8'), EXPORT_FORMATS['csv']
+    buffer = io.BytesIO()
+    try:
+        frame.to_parquet(buffer, index=False)
+    except ImportError:
+        raise ValueError("服务器未安装 pyarrow，无法导出 Parquet 格式。")
+    return buffer.getvalue(), EXPORT_FORMATS['parquet']
@@ -0,0 +1,128 @@
+# backend/trading_calendar.py
+"""
+交易日历索引，用于定投策略解析买入日。
+每个价格序列的日历只构建一次 (按时间戳内容缓存，同一代码、同一区间的重复请求和参数扫描直接复用)，
+买入日的解析对所有周期一次 searchsorted 完成，不再逐周期按字符串切片。
+
+买入规则 (与原 strategy_fixed_frequency 一致):
+  目标日早于第一根 K 线的周期跳过；
+  W / 2W: 周期内第一个不早于目标日的交易日，没有则该周期不买入；
+  M / Q:  周期内第一个不早于目标日的交易日，没有则取周期内最后一个交易日。
+周期与目标日:
+  W:  每周 (周一至周日)，目标日为周一 + day_of_week；
+  2W: 每两周，从 1970-01-05 (周一) 起每 14 天为一个周期，目标日为周期第一个周一 + day_of_week；
+  M:  每月，目标日为 day_of_month 号，超过当月天数时为月末；
+  Q:  每季度，目标日为季度第一个月的 day_of_month 号 (同样按月末截断)。
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+NS_PER_DAY = 86400 * 10 ** 9
+SCHEDULE_FREQUENCIES = ('W', '2W', 'M', 'Q')
+CALENDAR_CACHE_SIZE = 64
+# 1970-01-05 是周一，1970-01-01 起的天数对 7 取模加 3 即为星期 (周一为 0)
+_EPOCH_MONDAY = 4
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class TradingCalendar:
+    def __init__(self, index):
+        self.stamps = np.asarray(index.asi8, dtype=np.int64)
+        self.days = np.floor_divide(self.stamps, NS_PER_DAY)
+        self._schedules = {}
+
+    def __len__(self):
+        return len(self.stamps)
+
+    def schedule(self, frequency, day_of_week=None, day_of_month=None):
+        """返回买入日在索引中的位置 (升序，只读)。"""
+        key = (frequency, day_of_week, day_of_month)
+        positions = self._schedules.get(key)
+        if positions is None:
+            positions = self._resolve(frequency, day_of_week, day_of_month)
+            positions.setflags(write=False)
+            self._schedules[key] = positions
+        return positions
+
+    def _resolve(self, frequency, day_of_week, day_of_month):
+        if frequency not in SCHEDULE_FREQUENCIES:
+            raise ValueError(f"不支持的定投频率: '{frequency}'")
+        if len(self.stamps) == 0:
+            return np.zeros(0, dtype=np.int64)
+        periods = period_ids(self.days, frequency)
+        firsts = np.flatnonzero(np.concatenate(([True], periods[1:] != periods[:-1])))
+        period = periods[firsts]
+
+        if frequency in ('W', '2W'):
+            weeks = 1 if frequency == 'W' else 2
+            start = period * 7 * weeks + _EPOCH_MONDAY
+            target = start + (day_of_week or 0)
+            end = start + 7 * weeks
+            return self._first_on_or_after(target, end, fallback=False)
+
+        months = 1 if frequency == 'M' else 3
+        first_month = period * months
+        start = _month_start_day(first_month)
+        days_in_month = _month_start_day(first_month + 1) - start
+        target = start + (np.minimum(day_of_month, days_in_month) - 1 if day_of_month is not None else 0)
+        end = _month_start_day(first_month + months)
+        return self._first_on_or_after(target, end, fallback=True)
+
+    def _first_on_or_after(self, target_day, end_day, fallback):
+        target = target_day * NS_PER_DAY
+        end = end_day * NS_PER_DAY
+        positions = np.searchsorted(self.stamps, target, side='left')
+        found = positions < len(self.stamps)
+        found[found] = self.stamps[positions[found]] < end[found]
+        if fallback:
+            # 目标日之后本周期没有交易日: 取本周期最后一个交易日
+            positions = np.where(found, positions, np.searchsorted(self.stamps, end, side='left') - 1)
+            chosen = target >= self.stamps[0]
+        else:
+            chosen = found & (target >= self.stamps[0])
+        return positions[chosen].astype(np.int64)
+
+
+def period_ids(days, frequency):
+    """days: 1970-01-01 起的天数数组。"""
+    if frequency == 'W':
+        return np.floor_divide(days - _EPOCH_MONDAY, 7)
+    if frequency == '2W':
+        return np.floor_divide(days - _EPOCH_MONDAY, 14)
+    months = np.asarray(days).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    if frequency == 'M':
+        return months
+    if frequency == 'Q':
+        return np.floor_divide(months, 3)
+    raise ValueError(f"不支持的定投频率: '{frequency}'")
+
+
+def period_id(timestamp, frequency):
+    """单个时间戳所在周期的编号，与 period_ids 相同。"""
+    return int(period_ids(np.array([timestamp.value // NS_PER_DAY]), frequency)[0])
+
+
+def get_calendar(index):
+    """按时间戳内容缓存的交易日历。"""
+    stamps = np.ascontiguousarray(index.asi8, dtype=np.int64)
+    key = (len(stamps), hashlib.blake2b(stamps, digest_size=16).digest())
+    with _cache_lock:
+        calendar = _cache.get(key)
+        if calendar is not None:
+            _cache.move_to_end(key)
+            return calendar
+    calendar = TradingCalendar(index)
+    with _cache_lock:
+        _cache[key] = calendar
+        while len(_cache) > CALENDAR_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return calendar
+
+
+def _month_start_day(months):
+    return np.asarray(months).astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
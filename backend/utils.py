@@ -1,12 +1,88 @@
 # backend/utils.py
+import os
 import pandas as pd
-import akshare as ak
-import yfinance as yf
-from functools import lru_cache
+from price_cache import PriceCache, DEFAULT_PRICE_CACHE_PATH, DEFAULT_MEMORY_BARS
+from price_store import SharedPriceStore
+from minute_store import MinuteBarStore
+
+# 设置后优先从共享的内存映射价格存储读取 (由 price_store.py 发布)
+PRICE_STORE_DIR = os.environ.get('PRICE_STORE_DIR') or None
+# 分钟线列式存储目录 (由 minute_store.py 导入数据)
+MINUTE_STORE_DIR = os.environ.get(
+    'MINUTE_STORE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'minute'))
+# 批量获取的并发线程数；各数据源每秒请求数上限 (避免被上游限流)
+PRICE_FETCH_WORKERS = int(os.environ.get('PRICE_FETCH_WORKERS', 8))
+DEFAULT_RATE_LIMITS = {
+    'akshare': float(os.environ.get('AKSHARE_RATE_LIMIT', 3)),
+    'yfinance': float(os.environ.get('YFINANCE_RATE_LIMIT', 2)),
+}
+
 
-@lru_cache(maxsize=128)
 def get_price_data_and_name(ticker, start_date, end_date): # Renamed function
-    print(f"尝试为代码 '{ticker}' 获取数据和名称...")
+    """
+    从本地价格缓存中按窗口取数据，缺失的日期段才会请求 akshare/yfinance。
+    返回的 DataFrame 是共享只读数组的视图，需要修改时应先 copy()。
+    """
+    return _price_cache.get(ticker, start_date, end_date)
+
+
+def get_price_data_many(tickers, start_date, end_date, max_workers=None, progress=None):
+    """
+    并发获取多个代码 (如选股时的成分股)，结果同样写入价格缓存。
+    返回 ({代码: (df, 名称)}, {代码: 错误信息})，个别代码失败不影响其他代码。
+    """
+    return _price_cache.get_many(tickers, start_date, end_date, max_workers or PRICE_FETCH_WORKERS, progress)
+
+
+def get_price_data_and_names(tickers, start_date, end_date):
+    """并发获取多个代码，返回与 tickers 顺序对应的 [(df, 名称)]；任一代码失败时按顺序抛出第一个错误。"""
+    results, errors = get_price_data_many(tickers, start_date, end_date)
+    for ticker in tickers:
+        if ticker in errors:
+            raise ValueError(errors[ticker])
+    return [results[ticker] for ticker in tickers]
+
+
+def configure_price_cache(path=DEFAULT_PRICE_CACHE_PATH, providers=None, refresh_ttl=900, rate_limits=None,
+                          retries=2, retry_backoff=0.5, store_dir=None, memory_bars=DEFAULT_MEMORY_BARS):
+    """替换全局价格缓存，例如在测试中指向临时文件并使用离线的假数据源。"""
+    global _price_cache
+    _price_cache = PriceCache(path, providers if providers is not None else DEFAULT_PROVIDERS, refresh_ttl,
+                              listeners=_refresh_listeners,
+                              rate_limits=rate_limits if rate_limits is not None else DEFAULT_RATE_LIMITS,
+                              retries=retries, retry_backoff=retry_backoff,
+                              store=SharedPriceStore(store_dir) if store_dir else None, memory_bars=memory_bars)
+    return _price_cache
+
+
+def get_price_cache():
+    return _price_cache
+
+
+def get_price_data_version(ticker):
+    return _price_cache.version(ticker)
+
+
+def get_minute_store():
+    return _minute_store
+
+
+def configure_minute_store(root=MINUTE_STORE_DIR):
+    """替换全局分钟线存储，例如在测试中指向临时目录。"""
+    global _minute_store
+    _minute_store = MinuteBarStore(root)
+    return _minute_store
+
+
+def add_price_refresh_listener(listener):
+    """注册 listener(ticker)，在任意代码的价格数据刷新后调用 (替换价格缓存后依然有效)。"""
+    _refresh_listeners.append(listener)
+
+
+# akshare/yfinance 导入很慢，只在第一次向数据源请求时导入，从缓存提供数据的进程不加载它们
+def fetch_from_akshare(ticker, start_date, end_date):
+    import akshare as ak
+    print(f"尝试通过 akshare 为代码 '{ticker}' 获取数据和名称...")
     ak_start_date = start_date.replace('-', '')
     ak_end_date = end_date.replace('-', '')
     ak_code = ticker.replace('.SS', '').replace('.SZ', '').replace('.SH', '')
@@ -54,49 +130,91 @@ def get_price_data_and_name(ticker, start_date, end_date): # Renamed function
 
 
         if df.empty:
-            raise ValueError(f"akshare 未返回代码 '{ticker}' 的数据。")
+            # 空结果交给价格缓存判断: 首次获取视为失败，补齐缺口时表示该区间没有交易日
+            return pd.DataFrame(columns=['Close'], index=pd.DatetimeIndex([], name='Date')), stock_name
 
-        df['Date'] = pd.to_datetime(df['Date'])
+        # 只保留需要的列；指数接口忽略日期参数、返回全部历史，先按日期过滤再排序
+        df = df[['Date', 'Close']]
+        dates = pd.to_datetime(df['Date'])
+        df = df[(dates >= start_date) & (dates <= end_date)].assign(Date=dates)
         df = df.set_index('Date')
-        df = df.sort_index()
-        df = df.loc[start_date:end_date] # Filter by date *after* setting index
+        if not df.index.is_monotonic_increasing:
+            df = df.sort_index()
 
         print(f"成功通过 akshare 获取到 '{ticker}' ({stock_name}) 的数据。")
-        return df[['Close']], stock_name
+        return df, stock_name
 
     except Exception as e_ak:
         print(f"使用 akshare 获取 '{ticker}' 数据失败: {e_ak}。正在尝试备用方案 yfinance...")
-        try:
-            yf_ticker = ticker
-            # yfinance doesn't easily provide Chinese names, so we'll use ticker for name
-            stock_name = ticker # Or try to get from yf.Ticker(yf_ticker).info['shortName']
-            try:
-                ticker_info = yf.Ticker(yf_ticker).info
-                stock_name = ticker_info.get('shortName', ticker_info.get('longName', ticker))
-            except Exception:
-                print(f"无法通过 yfinance Ticker info 获取 {yf_ticker} 的名称。")
-
-
-            if yf_ticker == '000300': yf_ticker = '000300.SS'
-            elif ticker.endswith('.SZ') or ticker.endswith('.SS') or ticker.startswith('^'): # Already yf format
-                 pass
-            elif ticker.startswith('6'): # Shanghai stock
-                yf_ticker = f"{ticker}.SS"
-            elif ticker.startswith('0') or ticker.startswith('3'): # Shenzhen stock
-                yf_ticker = f"{ticker}.SZ"
-
-
-            data_yf = yf.download(yf_ticker, start=start_date, end=end_date, auto_adjust=True, progress=False) # Renamed to data_yf
-            if data_yf.empty: raise ValueError(f"yfinance 未能获取 '{yf_ticker}'")
-
-            print(f"成功通过备用方案 yfinance 获取到 '{yf_ticker}' ({stock_name}) 的数据。")
-            return data_yf[['Close']], stock_name
-        except Exception as e_yf:
-            raise ValueError(f"所有数据源均获取失败。akshare 错误: {e_ak} | yfinance 错误: {e_yf}")
+        raise
+
+
+def fetch_from_yfinance(ticker, start_date, end_date):
+    import yfinance as yf
+    yf_ticker = ticker
+    # yfinance doesn't easily provide Chinese names, so we'll use ticker for name
+    stock_name = ticker # Or try to get from yf.Ticker(yf_ticker).info['shortName']
+    try:
+        ticker_info = yf.Ticker(yf_ticker).info
+        stock_name = ticker_info.get('shortName', ticker_info.get('longName', ticker))
+    except Exception:
+        print(f"无法通过 yfinance Ticker info 获取 {yf_ticker} 的名称。")
+
+
+    if yf_ticker == '000300': yf_ticker = '000300.SS'
+    elif ticker.endswith('.SZ') or ticker.endswith('.SS') or ticker.startswith('^'): # Already yf format
+         pass
+    elif ticker.startswith('6'): # Shanghai stock
+        yf_ticker = f"{ticker}.SS"
+    elif ticker.startswith('0') or ticker.startswith('3'): # Shenzhen stock
+        yf_ticker = f"{ticker}.SZ"
+
+
+    # yfinance 的 end 不含当天，数据源约定的窗口包含两端，因此请求到 end_date 的下一天
+    end_exclusive = (pd.Timestamp(end_date) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+    data_yf = yf.download(yf_ticker, start=start_date, end=end_exclusive, auto_adjust=True, progress=False) # Renamed to data_yf
+    if data_yf.empty: raise ValueError(f"yfinance 未能获取 '{yf_ticker}'")
+
+    print(f"成功通过备用方案 yfinance 获取到 '{yf_ticker}' ({stock_name}) 的数据。")
+    return data_yf[['Close']], stock_name
+
+
+def fetch_minute_bars_from_akshare(ticker, start_time, end_time, period='1'):
+    """
+    从 akshare 获取分钟线 (东方财富接口，1 分钟线通常只提供最近几个交易日，更长的历史需要 5/15/30/60 分钟线)。
+    返回以时间为索引、含 Open/High/Low/Close/Volume 列的 DataFrame。
+    """
+    import akshare as ak
+    ak_code = ticker.replace('.SS', '').replace('.SZ', '').replace('.SH', '')
+    start_time = str(pd.Timestamp(start_time))
+    end_time = str(pd.Timestamp(end_time))
+    if ak_code in ('000300', '399006'):
+        df = ak.index_zh_a_hist_min_em(symbol=ak_code, period=period, start_date=start_time, end_date=end_time)
+    elif ak_code.startswith('5') or ak_code.startswith('1'): # Typically ETFs
+        df = ak.fund_etf_hist_min_em(symbol=ak_code, period=period, adjust='', start_date=start_time,
+                                     end_date=end_time)
+    else:
+        df = ak.stock_zh_a_hist_min_em(symbol=ak_code, period=period, adjust='', start_date=start_time,
+                                       end_date=end_time)
+    if df.empty:
+        raise ValueError(f"akshare 未返回代码 '{ticker}' 的分钟线。")
+    df = df.rename(columns={'时间': 'Date', '开盘': 'Open', '最高': 'High', '最低': 'Low', '收盘': 'Close',
+                            '成交量': 'Volume'})
+    df = df[['Date'] + [column for column in ('Open', 'High', 'Low', 'Close', 'Volume') if column in df.columns]]
+    return df.set_index(pd.to_datetime(df.pop('Date')))
+
+
+# 数据源按顺序尝试: akshare 失败后回退到 yfinance
+DEFAULT_PROVIDERS = [('akshare', fetch_from_akshare), ('yfinance', fetch_from_yfinance)]
+_refresh_listeners = []
+_price_cache = PriceCache(DEFAULT_PRICE_CACHE_PATH, DEFAULT_PROVIDERS, listeners=_refresh_listeners,
+                          rate_limits=DEFAULT_RATE_LIMITS,
+                          store=SharedPriceStore(PRICE_STORE_DIR) if PRICE_STORE_DIR else None)
+_minute_store = MinuteBarStore(MINUTE_STORE_DIR)
+
 
 # Keep the old function if other parts of your code still use it directly,
 # or update them to use the new one and handle the tuple return.
-@lru_cache(maxsize=128)
 def get_price_data(ticker, start_date, end_date):
     df, _ = get_price_data_and_name(ticker, start_date, end_date)
     return df
\ No newline at end of file
@@ -0,0 +1,246 @@
+# backend/walkforward.py
+"""
+走步分析 (walk-forward): 把历史按 K 线数切成连续的样本内/样本外窗口，
+在每个样本内窗口上对参数网格做扫描，用最优参数回测紧随其后的样本外窗口，检验参数选择在样本外是否依然有效。
+
+价格只加载一次。参数网格中每组参数的信号只在完整序列上生成一次 (均线等滚动统计量随之只计算一次)，
+各窗口直接按行切片复用: 信号只依赖当日及之前的价格，切片不会引入未来数据，样本外窗口开头的均线也已由之前的数据预热。
+每个窗口从空仓开始独立模拟，各窗口在进程池中并行计算。
+窗口划分:
+  rolling (默认): 样本内窗口长度固定为 trainBars，随窗口一起向前滚动；
+  anchored: 样本内窗口始终从第一根 K 线开始，逐步变长。
+每次向前移动 stepBars (默认等于 testBars)；最后一个样本外窗口可能不足 testBars。
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import numpy as np
+import pandas as pd
+
+from utils import get_price_data_and_names
+from backtest_engine import simulate_signal_matrix, _fill_arrays
+from analysis import performance_metrics_matrix
+from optimizer import TOP_LEVEL_PARAMS, SORTABLE_METRICS, expand_param_grid
+from strategies import get_strategy, generate_signals, generate_signal_matrix, has_signal_matrix
+from trading_calendar import NS_PER_DAY
+from execution import ExecutionModel, slice_fills
+
+MAX_WINDOWS = 500
+# 这些策略的买入金额不由信号决定 (定投按日程投入，买入并持有投入初始资金)，不能按信号矩阵模拟
+UNSUPPORTED_STRATEGIES = ('buy_and_hold', 'fixed_frequency')
+
+_worker_data = {}
+
+
+def walk_forward_windows(bars, train_bars, test_bars, step_bars=None, anchored=False):
+    """返回 [(样本内起点, 样本内终点, 样本外起点, 样本外终点)]，终点不含。"""
+    step_bars = step_bars or test_bars
+    for name, value in (('trainBars', train_bars), ('testBars', test_bars), ('stepBars', step_bars)):
+        if not isinstance(value, int) or isinstance(value, bool) or value < 2:
+            raise ValueError(f"{name} 必须是不小于 2 的整数。")
+    windows = []
+    start = 0
+    while start + train_bars + 2 <= bars:
+        test_start = start + train_bars
+        windows.append((0 if anchored else start, test_start, test_start, min(test_start + test_bars, bars)))
+        start += step_bars
+    if not windows:
+        raise ValueError(f"数据只有 {bars} 根 K 线，不足一个样本内窗口加样本外窗口。")
+    if len(windows) > MAX_WINDOWS:
+        raise ValueError(f"窗口数量 {len(windows)} 超过上限 {MAX_WINDOWS}，请增大 stepBars。")
+    return windows
+
+
+def run_walk_forward(config, param_grid, train_bars, test_bars, step_bars=None, anchored=False,
+                     sort_by='totalReturn', max_workers=None, time_budget=None, progress=None):
+    """
+    config 为普通回测配置，param_grid 与参数扫描相同 (takeProfit/stopLoss 也可作为参数)。
+    每个样本内窗口按 sort_by 选出最优参数 (并列时取网格中靠前的一组)。
+    max_workers: 进程数，1 表示在当前进程内顺序执行。
+    time_budget: 秒数上限，超时后未完成的窗口被放弃，已完成的窗口照常返回。
+    progress: 可选回调 progress(百分比, 阶段名)。
+    """
+    if sort_by not in SORTABLE_METRICS:
+        raise ValueError(f"不支持的排序指标: '{sort_by}'")
+    strategy_name = config['strategy']['name']
+    strategy = get_strategy(strategy_name)
+    if strategy_name in UNSUPPORTED_STRATEGIES:
+        raise ValueError(f"策略 '{strategy_name}' 不支持走步分析。")
+    combinations = expand_param_grid(param_grid)
+    base_params = config['strategy'].get('params', {})
+    # 校验每组参数并补全默认值
+    strategy_param_sets = [strategy.validate({**base_params, **{k: v for k, v in params.items()
+                                                                 if k not in TOP_LEVEL_PARAMS}})
+                           for params in combinations]
+    started = time.perf_counter()
+
+    if progress is not None:
+        progress(0, 'loading_data')
+    data, asset_name = get_price_data_and_names([config['ticker']], config['startDate'], config['endDate'])[0]
+    config['assetName'] = asset_name
+    windows = walk_forward_windows(len(data), train_bars, test_bars, step_bars, anchored)
+
+    if progress is not None:
+        progress(10, 'generating_signals')
+    signals = _signal_columns(data, strategy_name, strategy_param_sets)
+    close = data['Close'].to_numpy(dtype=float).reshape(len(data))
+    amounts = np.array([float(params['amount']) for params in strategy_param_sets])
+    # 成交条件 (涨跌停、成交价) 在完整序列上按每种买入金额各计算一次，各窗口按行切片
+    execution = ExecutionModel.from_config(config)
+    fills = {amount: _fill_arrays(execution, data, close, amount) for amount in np.unique(amounts)}
+    worker_args = (
+        pd.DatetimeIndex(data.index).asi8.copy(),
+        close,
+        signals,
+        amounts,
+        _column_values(combinations, config, 'takeProfit'),
+        _column_values(combinations, config, 'stopLoss'),
+        config.get('commission', {}),
+        float(config.get('initialCapital', 0)),
+        sort_by,
+        execution,
+        fills,
+    )
+
+    deadline = started + time_budget if time_budget else None
+    max_workers = min(max_workers or os.cpu_count() or 1, len(windows))
+    results = {}
+    timed_out = False
+    if max_workers == 1:
+        _init_worker(*worker_args)
+        for number, window in enumerate(windows):
+            if deadline is not None and time.perf_counter() > deadline:
+                timed_out = True
+                break
+            results[number] = _evaluate_window(window)
+            _report_windows(progress, len(results), len(windows))
+    else:
+        executor = ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=worker_args)
+        try:
+            pending = {executor.submit(_evaluate_window, window): number for number, window in enumerate(windows)}
+            while pending:
+                timeout = None if deadline is None else max(deadline - time.perf_counter(), 0)
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[pending.pop(future)] = future.result()
+                _report_windows(progress, len(results), len(windows))
+                if pending and deadline is not None and time.perf_counter() >= deadline:
+                    timed_out = True
+                    break
+        finally:
+            executor.shutdown(wait=not timed_out, cancel_futures=True)
+
+    dates = data.index.strftime('%Y-%m-%d').tolist()
+    completed = []
+    for number in sorted(results):
+        train_start, train_end, test_start, test_end = windows[number]
+        best, in_sample, out_of_sample = results[number]
+        completed.append({
+            'train': _span(dates, train_start, train_end),
+            'test': _span(dates, test_start, test_end),
+            'params': combinations[best],
+            'inSample': in_sample,
+            'outOfSample': out_of_sample,
+        })
+    return {
+        'windows': completed,
+        'summary': _summarize(completed),
+        'mode': 'anchored' if anchored else 'rolling',
+        'combinations': len(combinations),
+        'evaluated': len(completed),
+        'total': len(windows),
+        'timedOut': timed_out,
+        'elapsedSeconds': round(time.perf_counter() - started, 3),
+        'sortBy': sort_by,
+    }
+
+
+def _signal_columns(data, strategy_name, strategy_param_sets):
+    """完整序列上的信号矩阵 (交易日 x 参数组合)。"""
+    if has_signal_matrix(strategy_name):
+        return generate_signal_matrix(data, strategy_name, strategy_param_sets).astype(np.int8, copy=False)
+    # 其他策略逐组生成；只有止盈止损不同的组合共用同一列信号
+    signals = np.empty((len(data), len(strategy_param_sets)), dtype=np.int8)
+    generated = {}
+    for j, params in enumerate(strategy_param_sets):
+        key = tuple(sorted(params.items()))
+        if key not in generated:
+            generated[key] = generate_signals(data, strategy_name, params)['Signal'].to_numpy()
+        signals[:, j] = generated[key]
+    return signals
+
+
+def _column_values(combinations, config, name):
+    values = [params.get(name, config.get(name)) for params in combinations]
+    return np.array([np.nan if value is None else float(value) for value in values])
+
+
+def _report_windows(progress, evaluated, total):
+    if progress is not None:
+        progress(20 + 80 * evaluated / total, 'evaluating')
+
+
+def _span(dates, start, end):
+    return {'startDate': dates[start], 'endDate': dates[end - 1], 'bars': end - start}
+
+
+def _summarize(windows):
+    if not windows:
+        return {}
+    in_sample = np.array([window['inSample']['annualizedReturn'] for window in windows])
+    out_of_sample = np.array([window['outOfSample']['annualizedReturn'] for window in windows])
+    returns = np.array([window['outOfSample']['totalReturn'] for window in windows])
+    changes = sum(windows[i]['params'] != windows[i - 1]['params'] for i in range(1, len(windows)))
+    mean_in_sample = float(in_sample.mean())
+    return {
+        # 各样本外窗口收益率依次复利
+        'compoundedOutOfSampleReturn': round(float((np.prod(1 + returns / 100) - 1) * 100), 2),
+        'meanInSampleAnnualizedReturn': round(mean_in_sample, 2),
+        'meanOutOfSampleAnnualizedReturn': round(float(out_of_sample.mean()), 2),
+        # 走步效率: 样本外与样本内平均年化收益之比，样本内平均年化收益不为正时无意义
+        'efficiency': round(float(out_of_sample.mean()) / mean_in_sample, 4) if mean_in_sample > 0 else None,
+        'profitableWindows': int((returns > 0).sum()),
+        'parameterChanges': int(changes),
+    }
+
+
+def _init_worker(dates, close, signals, amounts, take_profit, stop_loss, commission, initial_capital, sort_by,
+                 execution, fills):
+    _worker_data.update(dates=dates, close=close, signals=signals, amounts=amounts, take_profit=take_profit,
+                        stop_loss=stop_loss, commission=commission, initial_capital=initial_capital,
+                        sort_by=sort_by, execution=execution, fills=fills)
+
+
+def _evaluate_window(window):
+    """返回 (最优组合的下标, 样本内指标, 样本外指标)。"""
+    train_start, train_end, test_start, test_end = window
+    columns = np.arange(_worker_data['signals'].shape[1])
+    in_sample = _window_metrics(train_start, train_end, columns)
+    score = in_sample[_worker_data['sort_by']]
+    best = int(np.argmax(np.where(np.isnan(score), -np.inf, score)))
+    out_of_sample = _window_metrics(test_start, test_end, np.array([best]))
+    return (best, {name: float(values[best]) for name, values in in_sample.items()},
+            {name: float(values[0]) for name, values in out_of_sample.items()})
+
+
+def _window_metrics(start, end, columns):
+    """在 [start, end) 上从空仓开始模拟 columns 中的各组参数，返回 {指标名: 每列的值}。"""
+    close = _worker_data['close'][start:end]
+    signals = _worker_data['signals'][start:end]
+    days = int((_worker_data['dates'][end - 1] - _worker_data['dates'][start]) // NS_PER_DAY)
+    amounts = _worker_data['amounts'][columns]
+    metrics = {name: np.zeros(len(columns)) for name in SORTABLE_METRICS}
+    # 买入金额不同的组合分开模拟 (信号矩阵模拟器的买入金额对所有列相同)
+    for amount in np.unique(amounts):
+        group = np.flatnonzero(amounts == amount)
+        selected = columns[group]
+        result = simulate_signal_matrix(close, signals[:, selected], amount, _worker_data['commission'],
+                                        _worker_data['take_profit'][selected], _worker_data['stop_loss'][selected],
+                                        execution=_worker_data['execution'],
+                                        fills=slice_fills(_worker_data['fills'][amount], start, end))
+        group_metrics = performance_metrics_matrix(result['portfolio_value'], result['cumulative_investment'],
+                                                   result['first_investment'], days, _worker_data['initial_capital'])
+        for name, values in group_metrics.items():
+            metrics[name][group] = values
+    return metrics
@@ -0,0 +1,133 @@
+# backend/warm_start.py
+"""
+预热快照: 把价格缓存和结果缓存中最常用的部分保存为一个 .npz 文件，新启动的进程 (如 Gunicorn 新拉起的 worker)
+启动时载入，第一批请求不必向数据源请求，命中的回测也不必重新计算。
+各代码的价格保存为日期和收盘价两个数组，代码的 meta 与结果缓存条目保存为 JSON，整个文件不使用 pickle。
+设置 WARM_START_SNAPSHOT 后 app 启动时自动载入；运行中的服务可通过 POST /api/cache/snapshot 用内存中的热数据生成快照。
+用法 (在 backend 目录下):
+  python warm_start.py save [--path cache/warm_start.npz] [--tickers 200]   # 从本地价格缓存 (SQLite) 生成快照
+  python warm_start.py info [--path cache/warm_start.npz]
+命令行生成的快照只包含价格 (结果缓存只存在于服务进程的内存中)。
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+SNAPSHOT_VERSION = 1
+DEFAULT_SNAPSHOT_PATH = os.environ.get('WARM_START_SNAPSHOT') or None
+# 快照中最多的代码数和结果数
+DEFAULT_MAX_TICKERS = int(os.environ.get('WARM_START_TICKERS', 200))
+DEFAULT_MAX_RESULTS = int(os.environ.get('WARM_START_RESULTS', 256))
+
+
+def save_snapshot(path, price_cache, result_cache, max_tickers=DEFAULT_MAX_TICKERS, max_results=DEFAULT_MAX_RESULTS):
+    """写入快照 (先写临时文件再原子替换)，返回 {'tickers', 'results', 'bytes'}。"""
+    prices = price_cache.hot_entries(max_tickers) if max_tickers > 0 else []
+    results = []
+    for key, tickers, result, compute_seconds in (result_cache.hot_entries(max_results) if max_results > 0 else []):
+        try:
+            json.dumps(result)
+        except (TypeError, ValueError):
+            continue  # 与结果缓存的磁盘层相同，不能序列化为 JSON 的结果不保存
+        results.append({'key': key, 'tickers': list(tickers), 'result': result, 'computeSeconds': compute_seconds})
+    manifest = {
+        'version': SNAPSHOT_VERSION,
+        'createdAt': time.time(),
+        'tickers': [{'ticker': ticker, 'meta': list(meta)} for ticker, meta, _, _ in prices],
+        'results': results,
+    }
+    arrays = {'manifest': np.frombuffer(json.dumps(manifest, ensure_ascii=False).encode('utf-8'), dtype=np.uint8)}
+    for i, (_, _, dates, close) in enumerate(prices):
+        arrays[f'dates_{i}'] = np.asarray(dates, dtype='datetime64[ns]').view(np.int64)
+        arrays[f'close_{i}'] = np.asarray(close, dtype=np.float64)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    try:
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return {'tickers': len(prices), 'results': len(results), 'bytes': os.path.getsize(path)}
+
+
+def read_snapshot(path):
+    """返回 (manifest, [(代码, meta, 日期数组, 收盘价数组)])，数组为只读。"""
+    with np.load(path, allow_pickle=False) as snapshot:
+        manifest = json.loads(snapshot['manifest'].tobytes().decode('utf-8'))
+        if manifest.get('version') != SNAPSHOT_VERSION:
+            raise ValueError(f"预热快照版本不兼容: {manifest.get('version')}")
+        entries = []
+        for i, item in enumerate(manifest['tickers']):
+            dates = snapshot[f'dates_{i}'].view('datetime64[ns]')
+            close = snapshot[f'close_{i}']
+            dates.setflags(write=False)
+            close.setflags(write=False)
+            entries.append((item['ticker'], tuple(item['meta']), dates, close))
+    return manifest, entries
+
+
+def load_snapshot(path, price_cache, result_cache):
+    """载入快照到价格缓存和结果缓存 (先载入价格，结果依赖的数据版本随之就绪)，返回载入的数量。"""
+    manifest, entries = read_snapshot(path)
+    tickers = price_cache.load_entries(entries)
+    results = result_cache.load_entries([(item['key'], item['tickers'], item['result'], item['computeSeconds'])
+                                         for item in manifest['results']])
+    return {'tickers': tickers, 'results': results, 'createdAt': manifest['createdAt']}
+
+
+def warm_start(path=DEFAULT_SNAPSHOT_PATH):
+    """
+    启动时载入快照到全局的价格缓存和结果缓存。未配置或文件不存在时跳过；载入失败只打印错误，不影响启动。
+    返回 {'tickers', 'results', 'createdAt', 'seconds'} 或 None。
+    """
+    if not path or not os.path.exists(path):
+        return None
+    from utils import get_price_cache
+    from result_cache import get_result_cache
+    started = time.perf_counter()
+    try:
+        summary = load_snapshot(path, get_price_cache(), get_result_cache())
+    except (OSError, ValueError, KeyError) as e:
+        print(f"载入预热快照 {path} 失败: {e}")
+        return None
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    print(f"已载入预热快照 {path}: {summary['tickers']} 个代码, {summary['results']} 个结果, "
+          f"耗时 {summary['seconds']} 秒")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='预热快照')
+    commands = parser.add_subparsers(dest='command', required=True)
+    save_parser = commands.add_parser('save', help='从本地价格缓存生成快照')
+    save_parser.add_argument('--path', default=DEFAULT_SNAPSHOT_PATH)
+    save_parser.add_argument('--tickers', type=int, default=DEFAULT_MAX_TICKERS)
+    info_parser = commands.add_parser('info', help='查看快照内容')
+    info_parser.add_argument('--path', default=DEFAULT_SNAPSHOT_PATH)
+    args = parser.parse_args(argv)
+    if not args.path:
+        parser.error('需要 --path 或环境变量 WARM_START_SNAPSHOT')
+
+    if args.command == 'save':
+        from utils import get_price_cache
+        from result_cache import get_result_cache
+        summary = save_snapshot(args.path, get_price_cache(), get_result_cache(), args.tickers, 0)
+        print(f"已写入 {args.path}: {summary['tickers']} 个代码, {summary['bytes']} 字节")
+    else:
+        manifest, entries = read_snapshot(args.path)
+        created = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(manifest['createdAt']))
+        print(f"创建时间: {created}, {len(entries)} 个代码 ({sum(len(entry[2]) for entry in entries)} 根 K 线), "
+              f"{len(manifest['results'])} 个结果")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
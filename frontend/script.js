@@ -14,6 +14,7 @@ document.addEventListener('DOMContentLoaded', () => {
     const stopLossInput = document.getElementById('stopLossInput');
     const runButton = document.getElementById('runButton');
     const loadingDiv = document.getElementById('loading');
+    const loadingMessage = document.getElementById('loading-message');
     const errorDiv = document.getElementById('error-alert');
     const errorMessageSpan = document.getElementById('error-message');
     const resultsDiv = document.getElementById('results');
@@ -22,6 +23,18 @@ document.addEventListener('DOMContentLoaded', () => {
     const periodicReturnsChartDiv = document.getElementById('periodic-returns-chart');
     const chartTitleElement = document.getElementById('chartTitle');
 
+    const API_BASE = 'http://127.0.0.1:5001';
+    const JOB_POLL_INTERVAL_MS = 500;
+    // 结果以共享日期轴 + float32 数组的紧凑格式传输，在 decodeResults 中还原
+    const RESULT_FORMAT = 'columnar-binary';
+    // 图表曲线的最大点数，服务端按 LTTB 降采样 (保留买卖点与最大回撤区间)
+    const CHART_MAX_POINTS = 2000;
+    const JOB_STAGE_LABELS = {
+        queued: '排队中', running: '计算中', loading_data: '获取行情数据', checking_cache: '检查结果缓存',
+        generating_signals: '生成交易信号', simulating: '模拟交易', analyzing: '计算绩效指标',
+        evaluating: '参数扫描', done: '完成'
+    };
+
     const portfolioChart = echarts.init(portfolioChartDiv);
     const periodicReturnsChart = echarts.init(periodicReturnsChartDiv);
 
@@ -117,16 +130,7 @@ document.addEventListener('DOMContentLoaded', () => {
         setLoading(true);
         const config = buildConfigFromUI();
         try {
-            const response = await fetch('http://127.0.0.1:5001/api/backtest', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify(config)
-            });
-            if (!response.ok) {
-                const errorData = await response.json();
-                throw new Error(errorData.error || `服务器错误: ${response.status}`);
-            }
-            const results = await response.json();
+            const results = await runJob('backtest', config);
             renderResults(results, config);
         } catch (error) {
             console.error("回测完整错误:", error);
@@ -136,6 +140,67 @@ document.addEventListener('DOMContentLoaded', () => {
         }
      }
 
+    // 提交异步任务并轮询，直到任务完成或失败
+    async function runJob(type, config) {
+        const response = await fetch(`${API_BASE}/api/jobs`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ type: type, config: config })
+        });
+        let job = await response.json();
+        if (!response.ok) {
+            throw new Error(job.error || `服务器错误: ${response.status}`);
+        }
+        while (job.status === 'queued' || job.status === 'running') {
+            showProgress(job);
+            await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+            const pollResponse = await fetch(`${API_BASE}/api/jobs/${job.id}?format=${RESULT_FORMAT}&maxPoints=${CHART_MAX_POINTS}`);
+            const pollData = await pollResponse.json();
+            if (!pollResponse.ok) {
+                throw new Error(pollData.error || `服务器错误: ${pollResponse.status}`);
+            }
+            job = pollData;
+        }
+        if (job.status === 'failed') {
+            throw new Error(job.error || '任务执行失败');
+        }
+        return decodeResults(job.result);
+    }
+
+    // 把列式 chart_data 还原为每条曲线 {dates, values} 的结构，供 ECharts 直接使用
+    function decodeResults(results) {
+        const chartData = results && results.chart_data;
+        if (!chartData || chartData.format !== 'columnar') return results;
+        const dates = [];
+        let day = chartData.axis.start;
+        chartData.axis.deltas.forEach(delta => {
+            day += delta;
+            dates.push(new Date(day * 86400000).toISOString().slice(0, 10));
+        });
+        const decoded = { ...chartData };
+        delete decoded.format;
+        delete decoded.axis;
+        delete decoded.series;
+        for (const key in chartData.series) {
+            decoded[key] = { dates: dates, values: decodeValues(chartData.series[key]) };
+        }
+        return { ...results, chart_data: decoded };
+    }
+
+    function decodeValues(series) {
+        if (Array.isArray(series)) return series;
+        const binary = atob(series.data);
+        const bytes = new Uint8Array(binary.length);
+        for (let i = 0; i < binary.length; i++) bytes[i] = binary.charCodeAt(i);
+        // float32 精度约 7 位有效数字，还原为两位小数与默认格式一致
+        return Array.from(new Float32Array(bytes.buffer), v => Math.round(v * 100) / 100);
+    }
+
+    function showProgress(job) {
+        const stageLabel = JOB_STAGE_LABELS[job.stage] || job.stage;
+        loadingMessage.textContent = `正在进行深度计算，请稍候... ${stageLabel} (${job.progress}%)`;
+    }
+
     function buildConfigFromUI() { /* ... same, initialCapitalInput value is passed as is ... */
         const period = periodSelect.value;
         const endDate = new Date();
@@ -371,13 +436,15 @@ document.addEventListener('DOMContentLoaded', () => {
                 <div class="col-md-3"><label class="form-label">投资频率</label>
                     <select id="param-frequency" class="form-select">
                         <option value="W">每周</option>
+                        <option value="2W">每两周</option>
                         <option value="M" selected>每月</option>
+                        <option value="Q">每季度</option>
                     </select>
                 </div>
                 <div class="col-md-3"><label class="form-label">每次金额</label><input type="number" id="param-amount" class="form-control" value="1000"></div>
                 <div class="col-md-3"><label class="form-label">周几买入 (0-6)</label><input type="number" id="param-day_of_week" class="form-control" placeholder="留空则周一"></div>
                 <div class="col-md-3"><label class="form-label">几号买入 (1-31)</label><input type="number" id="param-day_of_month" class="form-control" placeholder="留空则1号"></div>
-                <div class="col-12"><small class="form-text text-muted">选择频率后，填写对应的“周几”或“几号”。如不填，则默认为每周一或每月1号附近的交易日。</small></div>
+                <div class="col-12"><small class="form-text text-muted">选择频率后，填写对应的“周几”或“几号”。如不填，则默认为每周一或每月1号附近的交易日；每季度在季度首月的该日期买入。</small></div>
             `;
         } else if (strategy === 'sma_cross') {
             html = `<div class="col-md-3"><label class="form-label">均线周期</label><input type="number" id="param-period" class="form-control" value="20"></div>`;
@@ -386,6 +453,12 @@ document.addEventListener('DOMContentLoaded', () => {
                 <div class="col-md-3"><label class="form-label">快线</label><input type="number" id="param-fast" class="form-control" value="10"></div>
                 <div class="col-md-3"><label class="form-label">慢线</label><input type="number" id="param-slow" class="form-control" value="30"></div>
             `;
+        } else if (strategy === 'trailing_stop') {
+            html = `
+                <div class="col-md-3"><label class="form-label">均线周期</label><input type="number" id="param-period" class="form-control" value="20"></div>
+                <div class="col-md-3"><label class="form-label">回撤止损比例</label><input type="number" id="param-trail" class="form-control" value="0.1" step="0.01"></div>
+                <div class="col-12"><small class="form-text text-muted">收盘价上穿均线时买入，从持仓期间最高价回落超过该比例或跌破均线时卖出。</small></div>
+            `;
         } else if (strategy === 'buy_and_hold') {
              html = `<div class="col-md-6"><small class="form-text text-muted">买入并持有策略将在回测期初投入“回报计算基准资金”全额（如果大于0），或首次定投金额（如果基准资金为0）。</small></div>`
         }
@@ -408,6 +481,7 @@ document.addEventListener('DOMContentLoaded', () => {
         runButton.disabled = isLoading;
         if (isLoading) {
             runButton.innerHTML = `<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span> 回测中...`;
+            loadingMessage.textContent = '正在进行深度计算，请稍候...';
             loadingDiv.style.display = 'block';
             resultsDiv.style.display = 'none';
             errorDiv.style.display = 'none';